@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                benchParse compares XMLParser.parse (single-pass compiled path dispatch)
+#                with the original findall-then-iter implementation, on a large
+#                synthetic library.
+#
+#                Usage: python benchmarks/benchParse.py [numEvents] [clipsPerEvent]
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import sys
+import time
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element, fromstring
+
+# (so that fcpxml can be imported from this checkout, wherever this is run from)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fcpxml import XMLParser
+
+from synthetic import makeLibrary
+
+def oldParse(
+    root: Element,
+    callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]]
+) -> bool:
+    # the original implementation: one findall per key, then a walk of every element
+    elementsToCallback: dict[Element, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {}
+    for key, value in callbacks.items():
+        for el in root.findall(key):
+            elementsToCallback[el] = value
+    for el in root.iter('*'):
+        if el in elementsToCallback:
+            callback, refcon = elementsToCallback[el]
+            if not callback(refcon, el):
+                return True
+    return True
+
+def countCallback(counts: list[int], el: Element) -> bool:
+    counts[0] += 1
+    return True
+
+def stopCallback(counts: list[int], el: Element) -> bool:
+    counts[0] += 1
+    return counts[0] < 10
+
+def bestOf(func: t.Callable[[], t.Any], repeat: int = 5) -> float:
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    numEvents: int = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    clipsPerEvent: int = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    root: Element = fromstring(makeLibrary(numEvents, clipsPerEvent))
+    parser = XMLParser(root)
+    numElements: int = sum(1 for _ in root.iter('*'))
+    print(f'{numElements} elements, {numEvents * clipsPerEvent} asset-clips')
+
+    scenarios: list[tuple[str, dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]]]] = [
+        ('asset-clips', {'./library/event/asset-clip': (countCallback, [0])}),
+        ('asset-clips + formats', {
+            './library/event/asset-clip': (countCallback, [0]),
+            './resources/format': (countCallback, [0]),
+        }),
+        ('all keywords', {'.//keyword': (countCallback, [0])}),
+        ('stop after 10 clips', {'./library/event/asset-clip': (stopCallback, [0])}),
+    ]
+    for name, callbacks in scenarios:
+        def resetCounts():
+            for _, refcon in callbacks.values():
+                refcon[0] = 0
+
+        oldTime: float = bestOf(lambda: (resetCounts(), oldParse(root, callbacks)))
+        newTime: float = bestOf(lambda: (resetCounts(), parser.parse(callbacks)))
+        print(
+            f'{name:24} old: {oldTime * 1000:9.2f}ms  new: {newTime * 1000:9.2f}ms'
+            f'  speedup: {oldTime / newTime:6.1f}x'
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                benchSuite measures wall time, throughput and peak (Python) memory of
+#                XMLParser construction, XMLParser.parse, AssetClipsCSV.writeCSV and
+#                AssetClipsReport.writeReport on synthetic libraries of increasing size,
+#                and saves the results as JSON, so that versions can be compared.
+#
+#                Usage: python benchmarks/benchSuite.py [--sizes 1000,10000,100000,1000000]
+#                           [--encoding UTF-8] [--repeat 3] [--output results.json]
+#                           [--compare baseline.json]
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+# (so that fcpxml can be imported from this checkout, wherever this is run from)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fcpxml import XMLParser, AssetClipsCSV, AssetClipsReport
+
+import synthetic
+
+RESULTS_FORMAT_VERSION: int = 1
+CLIPS_PER_EVENT: int = 100
+KEYWORDS_PER_CLIP: int = 10
+
+def countCallback(counts: list[int], el: Element) -> bool:
+    counts[0] += 1
+    return True
+
+def benchmarks(
+    xmlPath: Path,
+    outputDir: Path
+) -> list[tuple[str, t.Callable[[], t.Any], t.Callable[[t.Any], t.Any]]]:
+    # (name, setup, run): setup's result is passed to run (setup isn't measured)
+    def parse(parser: XMLParser):
+        counts: list[int] = [0]
+        parser.parse({'./library/event/asset-clip/keyword': (countCallback, counts)})
+
+    return [
+        ('XMLParser()', lambda: None, lambda _: XMLParser(xmlPath)),
+        ('XMLParser.parse', lambda: XMLParser(xmlPath), parse),
+        ('XMLParser.parse (streaming)', lambda: XMLParser(xmlPath, streaming=True), parse),
+        (
+            'AssetClipsCSV.writeCSV',
+            lambda: None,
+            lambda _: AssetClipsCSV(xmlPath).writeCSV(outputDir / 'bench.csv')
+        ),
+        (
+            'AssetClipsReport.writeReport',
+            lambda: None,
+            lambda _: AssetClipsReport(xmlPath).writeReport(outputDir / 'bench.txt')
+        ),
+    ]
+
+def measure(
+    setup: t.Callable[[], t.Any],
+    run: t.Callable[[t.Any], t.Any],
+    repeat: int
+) -> tuple[float, int]:
+    # returns (best wall time in seconds, peak traced memory in bytes).  The peak is
+    # measured in a separate run, since tracemalloc slows everything down a lot.
+    best: float = float('inf')
+    for _ in range(repeat):
+        state: t.Any = setup()
+        start: float = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+        del state
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def runSuite(sizes: list[int], encoding: str, repeat: int) -> dict[str, t.Any]:
+    results: list[dict[str, t.Any]] = []
+    with tempfile.TemporaryDirectory() as tempDir:
+        for size in sizes:
+            numClips: int = max(1, size // KEYWORDS_PER_CLIP)
+            numEvents: int = max(1, numClips // CLIPS_PER_EVENT)
+            clipsPerEvent: int = numClips // numEvents
+            numKeywordRanges: int = numEvents * clipsPerEvent * KEYWORDS_PER_CLIP
+
+            xmlPath: Path = Path(tempDir) / f'Info-{size}.fcpxml'
+            fileSize: int = synthetic.writeLibrary(
+                xmlPath, numEvents, clipsPerEvent, KEYWORDS_PER_CLIP, encoding=encoding
+            )
+            print(f'{numKeywordRanges} keyword ranges ({fileSize / (1 << 20):.1f}MB):')
+
+            for name, setup, run in benchmarks(xmlPath, Path(tempDir)):
+                seconds, peak = measure(setup, run, repeat)
+                results.append({
+                    'benchmark': name,
+                    'keywordRanges': numKeywordRanges,
+                    'fileBytes': fileSize,
+                    'seconds': seconds,
+                    'keywordRangesPerSecond': numKeywordRanges / seconds,
+                    'megabytesPerSecond': fileSize / (1 << 20) / seconds,
+                    'peakMemoryBytes': peak,
+                })
+                print(
+                    f'  {name:30} {seconds * 1000:10.2f}ms'
+                    f'  {numKeywordRanges / seconds:12.0f} ranges/s'
+                    f'  {fileSize / (1 << 20) / seconds:8.1f}MB/s'
+                    f'  peak: {peak / (1 << 20):8.1f}MB'
+                )
+            xmlPath.unlink()
+
+    return {
+        'formatVersion': RESULTS_FORMAT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'encoding': encoding,
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare(baseline: dict[str, t.Any], current: dict[str, t.Any]):
+    # prints current time (and peak memory) as a ratio of the baseline's, for each
+    # benchmark/size that is in both
+    baselineResults: dict[tuple[str, int], dict[str, t.Any]] = {
+        (result['benchmark'], result['keywordRanges']): result
+        for result in baseline['results']
+    }
+    print('compared with baseline (< 1.00 is better):')
+    for result in current['results']:
+        old: dict[str, t.Any] | None = baselineResults.get(
+            (result['benchmark'], result['keywordRanges'])
+        )
+        if old is None:
+            continue
+        print(
+            f'  {result["benchmark"]:30} {result["keywordRanges"]:9}'
+            f'  time: {result["seconds"] / old["seconds"]:5.2f}x'
+            f'  peak: {result["peakMemoryBytes"] / max(1, old["peakMemoryBytes"]):5.2f}x'
+        )
+
+def main():
+    argParser = argparse.ArgumentParser(description='fcpxml scaling benchmarks')
+    argParser.add_argument(
+        '--sizes',
+        default='1000,10000,100000,1000000',
+        help='comma-separated numbers of keyword ranges'
+    )
+    argParser.add_argument('--encoding', default='UTF-8')
+    argParser.add_argument('--repeat', type=int, default=3)
+    argParser.add_argument('--output', help='where to save the results (JSON)')
+    argParser.add_argument('--compare', help='results (JSON) from an earlier run')
+    args = argParser.parse_args()
+
+    sizes: list[int] = [int(size) for size in args.sizes.split(',')]
+    results: dict[str, t.Any] = runSuite(sizes, args.encoding, args.repeat)
+    if args.output:
+        with open(args.output, 'wt', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'rt', encoding='utf-8') as f:
+            compare(json.load(f), results)
+
+if __name__ == '__main__':
+    main()
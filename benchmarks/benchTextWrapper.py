@@ -0,0 +1,140 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                benchTextWrapper compares Utils.TextWrapper (incremental wrapping with
+#                buffered output) with the original textwrap.wrap-per-write implementation,
+#                writing a synthetic report the way AssetClipsReport does, and checks
+#                that both write exactly the same text.
+#
+#                Usage: python benchmarks/benchTextWrapper.py [numClips] [rangesPerClip]
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import io
+import sys
+import textwrap
+import time
+import typing as t
+from pathlib import Path
+
+# (so that fcpxml can be imported from this checkout, wherever this is run from)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fcpxml import Utils
+
+class OldTextWrapper:
+    # the original implementation (with the column fix for multi-line writes)
+    def __init__(self, filewt, wrapAt: int = 80, wrapIndent: int = 4, tab: int = 4):
+        self.filewt = filewt
+        self.wrapAt = wrapAt
+        self.wrapIndent = wrapIndent
+        self.tab = tab
+        self._currLinePos = 0
+
+    def write(self, text: str):
+        lines: list[str] = self._split(text)
+        numLines: int = len(lines)
+        if numLines == 0:
+            return
+
+        for i, line in enumerate(lines):
+            if i == numLines - 1:
+                print(line, end='', file=self.filewt)
+                continue
+            print(line, file=self.filewt)
+
+        if lines[-1][-1] == '\n':
+            self._currLinePos = 0
+        elif numLines == 1:
+            self._currLinePos += len(lines[-1])
+        else:
+            self._currLinePos = len(lines[-1])
+
+    def writeLine(self, text: str):
+        if text:
+            self.write(text)
+        print(file=self.filewt)
+        self._currLinePos = 0
+
+    def flush(self):
+        pass
+
+    def _split(self, text: str) -> list[str]:
+        initialIndent: str = ' ' * self._currLinePos
+        output: list[str] = textwrap.wrap(
+            text,
+            width=self.wrapAt,
+            initial_indent=initialIndent,
+            subsequent_indent=' ' * self.wrapIndent,
+            tabsize=self.tab,
+            break_long_words=False,
+        )
+        if output:
+            output[0] = output[0][self._currLinePos:]
+        elif text:
+            output.append(text)
+        return output
+
+def writeReport(out: t.Any, numClips: int, rangesPerClip: int):
+    # the same sequence of writes as AssetClipsReport.writeAssetClips
+    timeRanges: list[str] = [
+        f'\t{Utils.formatSeconds(k * 7)} - {Utils.formatSeconds(k * 7 + 5)}:'
+        for k in range(rangesPerClip)
+    ]
+    for c in range(numClips):
+        out.writeLine(f'Clip {c}:')
+        for k in range(rangesPerClip):
+            out.write(timeRanges[k])
+            out.write(' ')
+            out.write('Jun')
+            out.write(' ')
+            out.write('1998')
+            out.write(':')
+            out.write(' ')
+            if k % 3 == 0:
+                out.write(
+                    f'note {k}: a somewhat longer note, that will have to be wrapped onto'
+                    ' a second (and maybe a third) line of the report, at the wrap indent'
+                )
+            elif k % 3 == 1:
+                out.write(f'note {k}')
+            out.writeLine('')
+    out.flush()
+
+def bestOf(func: t.Callable[[], t.Any], repeat: int = 5) -> float:
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    numClips: int = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rangesPerClip: int = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    oldOutput = io.StringIO()
+    writeReport(OldTextWrapper(oldOutput, wrapIndent=25), numClips, rangesPerClip)
+    newOutput = io.StringIO()
+    writeReport(Utils.TextWrapper(newOutput, wrapIndent=25), numClips, rangesPerClip)
+    if oldOutput.getvalue() != newOutput.getvalue():
+        print('ERROR: TextWrapper output differs from the original implementation')
+        sys.exit(1)
+    numLines: int = newOutput.getvalue().count('\n')
+    print(f'{numClips * rangesPerClip} keyword ranges, {numLines} lines (identical output)')
+
+    oldTime: float = bestOf(lambda: writeReport(
+        OldTextWrapper(io.StringIO(), wrapIndent=25), numClips, rangesPerClip
+    ))
+    newTime: float = bestOf(lambda: writeReport(
+        Utils.TextWrapper(io.StringIO(), wrapIndent=25), numClips, rangesPerClip
+    ))
+    print(
+        f'report  old: {oldTime * 1000:9.2f}ms  new: {newTime * 1000:9.2f}ms'
+        f'  speedup: {oldTime / newTime:6.1f}x'
+    )
+
+if __name__ == '__main__':
+    main()
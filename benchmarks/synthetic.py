@@ -0,0 +1,151 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                synthetic generates deterministic synthetic Info.fcpxml libraries (the
+#                same arguments always generate the same bytes), for benchmarks.
+#
+#                Usage: python benchmarks/synthetic.py outputPath [numEvents] [clipsPerEvent]
+#                           [keywordsPerClip] [noteLength] [encoding]
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import random
+import sys
+import typing as t
+from pathlib import Path
+
+# keywords are drawn from these (the dates are what AssetClipsReport looks for)
+KEYWORDS: tuple[str, ...] = (
+    '1998', '2001', '2003', 'June', 'March', 'December', 'Jan', 'Sept',
+    'beach', 'birthday', 'Grandma', 'Café Lumière', 'school play', 'holiday', 'dog', 'snow',
+)
+NOTE_WORDS: tuple[str, ...] = (
+    'the', 'kids', 'on', 'at', 'with', 'and', 'a', 'long', 'walk', 'pier', 'cake', 'crème',
+    'brûlée', 'after', 'dinner', '"best"', 'shot,', 'ever', 'Bob', 'Alice', 'near', 'water',
+)
+
+def generateLibrary(
+    numEvents: int,
+    clipsPerEvent: int,
+    keywordsPerClip: int = 10,
+    noteLength: int = 40,
+    encoding: str = 'UTF-8',
+    seed: int = 1
+) -> t.Iterator[str]:
+    # Yields the library's text, a piece at a time (so huge libraries never have to
+    # be in memory all at once).  noteLength is the average note length in characters
+    # (0 means no notes); a quarter of the keyword ranges have no note.  encoding is
+    # only used for the XML declaration.
+    rand = random.Random(seed)
+    yield (
+        f'<?xml version="1.0" encoding="{encoding}"?>\n'
+        '<!DOCTYPE fcpxml>\n\n'
+        '<fcpxml version="1.10">\n'
+        '    <resources>\n'
+        '        <format id="r1" name="FFVideoFormat1080p2997" frameDuration="1001/30000s"'
+        ' width="1920" height="1080" colorSpace="1-1-1 (Rec. 709)"/>\n'
+    )
+    numClips: int = numEvents * clipsPerEvent
+    for i in range(numClips):
+        yield (
+            f'        <asset id="r{i + 2}" name="Clip {i:06}" uid="{rand.getrandbits(128):032X}"'
+            f' start="0s" duration="{rand.randint(300, 90000) * 1001}/30000s" hasVideo="1"'
+            ' format="r1" hasAudio="1" audioSources="1" audioChannels="2" audioRate="48000">\n'
+            f'            <media-rep kind="original-media" sig="{rand.getrandbits(128):032X}"'
+            f' src="file:///Volumes/Media/Library/Clip%20{i:06}.mov"/>\n'
+            '        </asset>\n'
+        )
+    yield '    </resources>\n    <library location="file:///Volumes/Media/Synthetic.fcpbundle/">\n'
+
+    for e in range(numEvents):
+        parts: list[str] = [
+            f'        <event name="Event {e}" uid="{rand.getrandbits(128):032X}">\n'
+        ]
+        for c in range(clipsPerEvent):
+            i: int = e * clipsPerEvent + c
+            parts.append(
+                f'            <asset-clip ref="r{i + 2}" offset="0s" name="Clip {i:06}"'
+                ' duration="90090/30000s" format="r1" tcFormat="NDF">\n'
+            )
+            for _ in range(keywordsPerClip):
+                start: int = rand.randint(0, 50000) * 1001
+                duration: int = rand.randint(1, 3000) * 1001
+                value: str = ', '.join(rand.sample(KEYWORDS, rand.randint(1, 4)))
+                keyword: str = (
+                    f'                <keyword start="{start}/30000s"'
+                    f' duration="{duration}/30000s" value="{value}"'
+                )
+                if noteLength > 0 and rand.random() >= 0.25:
+                    keyword += f' note="{_note(rand, noteLength)}"'
+                parts.append(keyword + '/>\n')
+            parts.append('            </asset-clip>\n')
+        parts.append('        </event>\n')
+        yield ''.join(parts)
+
+    yield '    </library>\n</fcpxml>\n'
+
+def makeLibrary(
+    numEvents: int,
+    clipsPerEvent: int,
+    keywordsPerClip: int = 10,
+    noteLength: int = 40,
+    seed: int = 1
+) -> str:
+    # the whole library as a str
+    return ''.join(
+        generateLibrary(numEvents, clipsPerEvent, keywordsPerClip, noteLength, seed=seed)
+    )
+
+def writeLibrary(
+    path: str | Path,
+    numEvents: int,
+    clipsPerEvent: int,
+    keywordsPerClip: int = 10,
+    noteLength: int = 40,
+    encoding: str = 'UTF-8',
+    seed: int = 1
+) -> int:
+    # writes the library to path in encoding (e.g. 'UTF-8', 'UTF-16', 'ISO-8859-1'),
+    # and returns the size of the file in bytes
+    with open(path, 'wt', encoding=encoding.lower(), newline='\n') as f:
+        for piece in generateLibrary(
+                numEvents, clipsPerEvent, keywordsPerClip, noteLength, encoding, seed):
+            f.write(piece)
+    return Path(path).stat().st_size
+
+def _note(rand: random.Random, noteLength: int) -> str:
+    # somewhere between half and one and a half times noteLength
+    targetLength: int = rand.randint(noteLength // 2, noteLength + noteLength // 2)
+    words: list[str] = []
+    length: int = 0
+    while length < targetLength:
+        word: str = rand.choice(NOTE_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words).replace('"', '&quot;')
+
+def main():
+    if len(sys.argv) < 2:
+        print(
+            'Usage: python benchmarks/synthetic.py outputPath [numEvents] [clipsPerEvent]'
+            ' [keywordsPerClip] [noteLength] [encoding]',
+            file=sys.stderr
+        )
+        sys.exit(1)
+    numEvents: int = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    clipsPerEvent: int = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    keywordsPerClip: int = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    noteLength: int = int(sys.argv[5]) if len(sys.argv) > 5 else 40
+    encoding: str = sys.argv[6] if len(sys.argv) > 6 else 'UTF-8'
+    size: int = writeLibrary(
+        sys.argv[1], numEvents, clipsPerEvent, keywordsPerClip, noteLength, encoding
+    )
+    print(
+        f'{sys.argv[1]}: {numEvents * clipsPerEvent * keywordsPerClip} keyword ranges,'
+        f' {size} bytes'
+    )
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,20 @@
 # ------------------------------------------------------------------------------
 
 from .utils import Utils
+from .stats import Stats, CallbackStats
 from .xmlparser import XMLParser
-from .asset_clips_csv import AssetClipsCSV
-from .asset_clips_report import AssetClipsReport
+from .resource_index import ResourceIndex, AssetResource, FormatResource
+from .asset_clips import AssetClip, KeywordRange, AssetClipExtractor, AssetClipsSource
+from .asset_clips import AssetClipSelector, AssetClipRecords, AssetClipSink
+from .library_cache import LibraryCache
+from .asset_clips_csv import AssetClipsCSV, CSVRowWriter, CSVSink
+from .asset_clips_sqlite import AssetClipsSQLite, SQLiteRowWriter, SQLiteSink
+from .asset_clips_report import AssetClipsReport, ReportSink
+from .asset_clips_outputs import AssetClipsOutputs
+from .asset_clips_diff import AssetClipsDiff, KeywordRangeChange
+from .keyword_index import KeywordIndex
+from .clip_table import ClipTable, ClipTableView
+from .batch import AssetClipsBatch
+from .asset_clips_async import AssetClipsAsync, ParseProgress
+from .asset_clips_watch import AssetClipsWatcher, RenderedAssetClip
+from .timeline_metadata import TimelineExtractor, TimelineItem
@@ -0,0 +1,148 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                This is the command line interface:
+#                    python -m fcpxml diff old.fcpxml new.fcpxml diff.txt
+#                    python -m fcpxml batch --output-dir out lib1.fcpxml lib2.fcpxml ...
+#                    python -m fcpxml query Info.fcpxml --keyword beach --year 1998
+#                    python -m fcpxml watch Info.fcpxml --csv Info.csv --report Info.txt
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import argparse
+import sys
+
+from fcpxml import AssetClipsDiff
+from fcpxml import AssetClipsBatch
+from fcpxml import AssetClipsWatcher
+from fcpxml import KeywordIndex, KeywordRange
+
+def main(argv: list[str] | None = None) -> int:
+    argParser = argparse.ArgumentParser(prog='fcpxml', description='Final Cut Pro XML Utilities')
+    subparsers = argParser.add_subparsers(dest='command', required=True)
+
+    diffParser = subparsers.add_parser(
+        'diff',
+        help='report the keyword ranges and notes that changed between two library exports'
+    )
+    diffParser.add_argument('oldXml', help='the older Info.fcpxml')
+    diffParser.add_argument('newXml', help='the newer Info.fcpxml')
+    diffParser.add_argument('output', help='where to write the diff report')
+
+    batchParser = subparsers.add_parser(
+        'batch',
+        help='generate CSVs and reports for many libraries, in parallel'
+    )
+    batchParser.add_argument('xmls', nargs='+', help='the Info.fcpxml files')
+    batchParser.add_argument('-j', '--workers', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)')
+    batchParser.add_argument('--output-dir',
+        help='write <name>.csv and <name>.txt for each library into this folder')
+    batchParser.add_argument('--merged-csv', help='write one CSV for all libraries')
+    batchParser.add_argument('--merged-report', help='write one report for all libraries')
+
+    queryParser = subparsers.add_parser(
+        'query',
+        help='find keyword ranges by keyword, year and month, or by asset and time range'
+    )
+    queryParser.add_argument('xml', nargs='?',
+        help='the Info.fcpxml (not needed if --index has already been saved)')
+    queryParser.add_argument('--index',
+        help='keyword index file: saved here if xml is given, otherwise loaded from here')
+    queryParser.add_argument('--keyword', help='keyword ranges with this keyword')
+    queryParser.add_argument('--year', type=int, help='keyword ranges in this year')
+    queryParser.add_argument('--month', help='keyword ranges in this month (e.g. June)')
+    queryParser.add_argument('--asset', help='keyword ranges of this asset (needs --from/--to)')
+    queryParser.add_argument('--from', dest='fromTime', help='start time, e.g. 0:12:00')
+    queryParser.add_argument('--to', dest='toTime', help='end time, e.g. 0:15:00')
+
+    watchParser = subparsers.add_parser(
+        'watch',
+        help='regenerate the CSV and/or report whenever the library is exported again'
+    )
+    watchParser.add_argument('xml', help='the Info.fcpxml')
+    watchParser.add_argument('--csv', help='the CSV to keep up to date')
+    watchParser.add_argument('--report', help='the report to keep up to date')
+    watchParser.add_argument('--interval', type=float, default=AssetClipsWatcher.DEFAULT_INTERVAL,
+        help='seconds between checks for a new export (default: %(default)s)')
+    watchParser.add_argument('--debounce', type=float, default=AssetClipsWatcher.DEFAULT_DEBOUNCE,
+        help='seconds a new export must be left alone before regenerating'
+            ' (default: %(default)s)')
+
+    args = argParser.parse_args(argv)
+    success: bool = False
+    if args.command == 'diff':
+        success = AssetClipsDiff(args.oldXml, args.newXml).writeDiff(args.output)
+    elif args.command == 'batch':
+        if not (args.output_dir or args.merged_csv or args.merged_report):
+            batchParser.error('nothing to do: use --output-dir, --merged-csv or --merged-report')
+        batch = AssetClipsBatch(args.xmls, workers=args.workers)
+        success = True
+        if args.output_dir:
+            success = batch.writeOutputs(args.output_dir) and success
+        if args.merged_csv:
+            success = batch.writeMergedCSV(args.merged_csv) and success
+        if args.merged_report:
+            success = batch.writeMergedReport(args.merged_report) and success
+    elif args.command == 'query':
+        success = _query(queryParser, args)
+    elif args.command == 'watch':
+        success = _watch(watchParser, args)
+
+    return 0 if success else 1
+
+def _query(queryParser: argparse.ArgumentParser, args: argparse.Namespace) -> bool:
+    # prints one line per keyword range: asset name, time range, keywords, note (tab-separated)
+    if args.xml is None and args.index is None:
+        queryParser.error('need an xml file or an --index file')
+    if args.asset is not None and (args.fromTime is None or args.toTime is None):
+        queryParser.error('--asset needs --from and --to')
+
+    index: KeywordIndex | None
+    if args.xml is not None:
+        index = KeywordIndex.fromXML(args.xml)
+        if index is not None and args.index is not None and not index.save(args.index):
+            return False
+    else:
+        index = KeywordIndex.load(args.index)
+    if index is None:
+        return False
+
+    if args.asset is not None:
+        for keywordRange in index.overlapping(args.asset, args.fromTime, args.toTime):
+            print(_queryLine(args.asset, keywordRange))
+    elif args.keyword is not None or args.year is not None or args.month is not None:
+        for assetClip, keywordRange in index.find(args.keyword, args.year, args.month):
+            print(_queryLine(assetClip.name, keywordRange))
+    return True
+
+def _queryLine(assetName: str, keywordRange: KeywordRange) -> str:
+    return '\t'.join(
+        (assetName, keywordRange.timeRange, ', '.join(keywordRange.keywords), keywordRange.note)
+    )
+
+def _watch(watchParser: argparse.ArgumentParser, args: argparse.Namespace) -> bool:
+    # prints a line per regeneration, until interrupted
+    if args.csv is None and args.report is None:
+        watchParser.error('nothing to do: use --csv and/or --report')
+
+    def onRegenerate(watcher: AssetClipsWatcher, success: bool):
+        if success:
+            print(
+                f'regenerated: {watcher.numRendered} asset-clips changed,'
+                f' {watcher.numReused} unchanged', flush=True
+            )
+
+    watcher = AssetClipsWatcher(
+        args.xml, args.csv, args.report, interval=args.interval, debounce=args.debounce
+    )
+    try:
+        watcher.watch(onRegenerate)
+    except KeyboardInterrupt:
+        pass
+    return True
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,453 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClip and KeywordRange are the compact records that all the
+#                asset-clip outputs (CSV, report, etc) are generated from, and
+#                AssetClipExtractor extracts them from a library's asset-clip elements.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import abc
+import fnmatch
+import math
+import os
+import re
+import time
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+from fcpxml.resource_index import AssetResource, ResourceIndex
+from fcpxml.stats import Stats
+
+if t.TYPE_CHECKING:
+    from fcpxml.library_cache import LibraryCache, LibraryKey
+
+class KeywordRange:
+    # A keyword element of an asset-clip: a time range with its keywords and note.
+    # start and duration are exact: they are integer counts of 1/timescale seconds.
+    __slots__ = ('start', 'duration', 'timescale', 'keywords', 'note')
+
+    def __init__(
+        self,
+        start: int,
+        duration: int,
+        timescale: int,
+        keywords: tuple[str, ...],
+        note: str
+    ):
+        self.start: int = start
+        self.duration: int = duration
+        self.timescale: int = timescale
+        self.keywords: tuple[str, ...] = keywords
+        self.note: str = note
+
+    @property
+    def timeRange(self) -> str:
+        return Utils.formatTimeRange(self.start, self.duration, self.timescale)
+
+    def __repr__(self) -> str:
+        return (
+            f'KeywordRange({self.start}/{self.timescale}s, {self.duration}/{self.timescale}s,'
+            f' {self.keywords!r}, {self.note!r})'
+        )
+
+
+class AssetClip:
+    # An asset-clip in a library event, with its keyword ranges (in document order).
+    # ref is the id of its asset, and asset is that asset's resource (None if it isn't
+    # in the library's resources).  digest is a hash of the asset-clip element's subtree
+    # (see Utils.elementDigest), if the extractor was asked to compute it.
+    __slots__ = ('name', 'keywordRanges', 'digest', 'ref', 'asset')
+
+    def __init__(
+        self,
+        name: str,
+        keywordRanges: list[KeywordRange],
+        digest: bytes | None = None,
+        ref: str = '',
+        asset: AssetResource | None = None
+    ):
+        self.name: str = name
+        self.keywordRanges: list[KeywordRange] = keywordRanges
+        self.digest: bytes | None = digest
+        self.ref: str = ref
+        self.asset: AssetResource | None = asset
+
+    @property
+    def mediaPath(self) -> str:
+        return self.asset.mediaPath if self.asset is not None else ''
+
+    @property
+    def mediaDuration(self) -> str:
+        return self.asset.durationText if self.asset is not None else ''
+
+    def __repr__(self) -> str:
+        return f'AssetClip({self.name!r}, {len(self.keywordRanges)} keyword ranges)'
+
+
+class AssetClipRecords(abc.ABC):
+    # Anything that already has asset-clip records (e.g. a ClipTable), and so can be
+    # passed to AssetClipsSource (and the outputs) instead of XML.
+    @abc.abstractmethod
+    def assetClips(self) -> t.Iterator[AssetClip]:
+        # the asset-clips, in document order
+        ...
+
+
+class AssetClipSink(abc.ABC):
+    # An output that asset-clips are written to one at a time, in document order (see
+    # AssetClipsOutputs, which can write any number of them from a single parse).
+    # open() is called before the first asset-clip, and close() after the last one
+    # (success is False if parsing, or this sink, failed).  All three are called from
+    # the same thread, though not necessarily the one that created the sink.  Failures
+    # are raised (e.g. OSError).  name identifies the sink in error messages.
+    # Subclasses must implement writeAssetClip; open and close do nothing by default.
+    # Sinks that write a file should write it to tempPath(path), and finish it with
+    # replaceFile(path, success) when they close, so that a failed write never leaves
+    # half a file behind (or destroys the one that was already there).
+    def __init__(self, name: str):
+        self.name: str = name
+        self.rowsWritten: int = 0
+        self.linesWritten: int = 0
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def writeAssetClip(self, assetClip: AssetClip):
+        ...
+
+    def close(self, success: bool):
+        pass
+
+    @staticmethod
+    def tempPath(path: Path) -> Path:
+        return path.with_name(path.name + '.tmp')
+
+    @staticmethod
+    def replaceFile(path: Path, success: bool):
+        # renames tempPath(path) to path if success, and deletes it otherwise
+        tempPath: Path = AssetClipSink.tempPath(path)
+        if not success:
+            tempPath.unlink(missing_ok=True)
+            return
+        try:
+            os.replace(tempPath, path)
+        except OSError:
+            tempPath.unlink(missing_ok=True)
+            raise
+
+
+class AssetClipExtractor:
+    # AssetClipExtractor turns asset-clip elements into AssetClip records.  Repeated
+    # strings (keywords, keyword lists, names) are shared between records, so that
+    # millions of keyword ranges don't each carry their own copies.
+    # Asset-clips are joined to their assets in resources (a ResourceIndex, which
+    # extract fills in during the same parse).
+    ASSET_CLIP_PATH: str = './library/event/asset-clip'
+
+    def __init__(self, computeDigests: bool = False, resources: ResourceIndex | None = None):
+        self.computeDigests: bool = computeDigests
+        self.resources: ResourceIndex = resources if resources is not None else ResourceIndex()
+        self._strings: dict[str, str] = {}
+        # keyword element 'value' attribute -> keywords tuple
+        self._keywordLists: dict[str, tuple[str, ...]] = {'': ()}
+
+    def intern(self, string: str) -> str:
+        return self._strings.setdefault(string, string)
+
+    def keywords(self, keywordValue: str) -> tuple[str, ...]:
+        # keywordValue is a ', '-delimited list of keywords
+        keywords: tuple[str, ...] | None = self._keywordLists.get(keywordValue)
+        if keywords is None:
+            keywords = tuple(self.intern(kw) for kw in keywordValue.split(', '))
+            self._keywordLists[keywordValue] = keywords
+        return keywords
+
+    def assetClip(self, assetClipEl: Element) -> AssetClip:
+        assetName: str = self.intern(assetClipEl.get('name', ''))
+        ref: str = self.intern(assetClipEl.get('ref', ''))
+        keywordRanges: list[KeywordRange] = []
+        for kwEl in assetClipEl.findall('keyword'):
+            startNum, startDen = Utils.parseTime(kwEl.get('start', ''))
+            durNum, durDen = Utils.parseTime(kwEl.get('duration', ''))
+            timescale: int = startDen
+            if durDen != startDen:
+                timescale = math.lcm(startDen, durDen)
+                startNum *= timescale // startDen
+                durNum *= timescale // durDen
+            keywordRanges.append(KeywordRange(
+                startNum,
+                durNum,
+                timescale,
+                self.keywords(kwEl.get('value', '')),
+                kwEl.get('note', '')
+            ))
+        digest: bytes | None = None
+        if self.computeDigests:
+            digest = Utils.elementDigest(assetClipEl)
+        return AssetClip(assetName, keywordRanges, digest, ref, self.resources.asset(ref))
+
+    def extract(self, parser: XMLParser) -> list[AssetClip] | None:
+        # returns all the library's asset-clips in document order (None if parsing failed)
+        def assetClipCallback(assetClips: list[AssetClip], assetClipEl: Element) -> bool:
+            assetClips.append(self.assetClip(assetClipEl))
+            return True  # please keep feeding me Elements
+
+        assetClips: list[AssetClip] = []
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+            **self.resources.callbacks(),
+            self.ASSET_CLIP_PATH: (assetClipCallback, assetClips)
+        }
+        if not parser.parse(callbacks):
+            return None
+        return assetClips
+
+
+class AssetClipSelector:
+    # AssetClipSelector picks the asset-clips (and keyword ranges) an output gets:
+    #   eventNames          only asset-clips in these events
+    #   assetNamePattern    only asset-clips whose names match this (fnmatch-style, e.g.
+    #                       'Clip 1-*', case-sensitive)
+    #   year, month         only keyword ranges with these date keywords (as in
+    #                       KeywordIndex: a range of years like '1998-2001' is in each year)
+    #   withNotes           only keyword ranges that have a note
+    #   limit               at most this many asset-clips
+    # Asset-clips left without keyword ranges (by year, month or withNotes) are dropped.
+    # The parser skips the events that aren't selected (see filters), and parsing stops
+    # as soon as the limit is reached, or the next event starts after all the selected
+    # ones have been seen (event names are unique in a library).
+    EVENT_PATH: str = './library/event'
+
+    def __init__(
+        self,
+        eventNames: t.Iterable[str] | None = None,
+        assetNamePattern: str | None = None,
+        year: int | str | None = None,
+        month: str | None = None,
+        withNotes: bool = False,
+        limit: int | None = None
+    ):
+        self.eventNames: frozenset[str] | None = (
+            frozenset(eventNames) if eventNames is not None else None
+        )
+        self.assetNamePattern: str | None = assetNamePattern
+        self.year: int | None = int(year) if year is not None else None
+        self.month: str | None = month
+        self.withNotes: bool = withNotes
+        self.limit: int | None = limit
+        self._nameMatch: t.Callable[[str], re.Match | None] | None = None
+        if assetNamePattern is not None:
+            self._nameMatch = re.compile(fnmatch.translate(assetNamePattern)).match
+        # keywords tuple -> whether it has the selected date keywords
+        self._dateMatches: dict[tuple[str, ...], bool] = {}
+        self._eventsToSee: set[str] = set()
+        self.numSelected: int = 0
+        self.reset()
+
+    def reset(self):
+        # call before each pass over a library's asset-clips
+        self._eventsToSee = set(self.eventNames) if self.eventNames is not None else set()
+        self.numSelected = 0
+
+    @property
+    def isFull(self) -> bool:
+        return self.limit is not None and self.numSelected >= self.limit
+
+    def filters(self) -> dict[str, tuple[t.Callable[[t.Any, Element], int], t.Any]]:
+        # the filters to pass to XMLParser.parse
+        if self.eventNames is None:
+            return {}
+        return {self.EVENT_PATH: (AssetClipSelector._eventFilter, self)}
+
+    def matchesName(self, assetName: str) -> bool:
+        return self._nameMatch is None or self._nameMatch(assetName) is not None
+
+    def select(self, assetClip: AssetClip) -> AssetClip | None:
+        # Returns assetClip (or a copy with only the selected keyword ranges), or None if
+        # it isn't selected.  Call it in document order: it counts towards the limit.
+        if self.isFull or not self.matchesName(assetClip.name):
+            return None
+        if self.selectsKeywordRanges:
+            keywordRanges: list[KeywordRange] = [
+                kr for kr in assetClip.keywordRanges
+                if self.matchesKeywordRange(kr.keywords, kr.note)
+            ]
+            if not keywordRanges:
+                return None
+            if len(keywordRanges) != len(assetClip.keywordRanges):
+                assetClip = AssetClip(
+                    assetClip.name, keywordRanges, assetClip.digest, assetClip.ref,
+                    assetClip.asset
+                )
+        self.numSelected += 1
+        return assetClip
+
+    @property
+    def selectsKeywordRanges(self) -> bool:
+        return self.year is not None or self.month is not None or self.withNotes
+
+    def matchesKeywordRange(self, keywords: tuple[str, ...], note: str) -> bool:
+        return (bool(note) or not self.withNotes) and self._matchesDate(keywords)
+
+    def _matchesDate(self, keywords: tuple[str, ...]) -> bool:
+        matches: bool | None = self._dateMatches.get(keywords)
+        if matches is not None:
+            return matches
+        yearMatches: bool = self.year is None
+        monthMatches: bool = self.month is None
+        for keyword in keywords:
+            if not yearMatches and Utils.isYear(keyword):
+                firstYear, _, lastYear = keyword.partition('-')
+                yearMatches = int(firstYear) <= self.year <= int(lastYear or firstYear)
+            elif not monthMatches and keyword == self.month:
+                monthMatches = True
+        matches = yearMatches and monthMatches
+        self._dateMatches[keywords] = matches
+        return matches
+
+    @staticmethod
+    def _eventFilter(selector: 'AssetClipSelector', eventEl: Element) -> int:
+        if not selector._eventsToSee or selector.isFull:
+            # every selected event has been parsed already
+            return XMLParser.STOP
+        name: str = eventEl.get('name', '')
+        if name not in selector._eventsToSee:
+            return XMLParser.SKIP
+        selector._eventsToSee.discard(name)
+        return XMLParser.DESCEND
+
+
+class AssetClipsSource:
+    # AssetClipsSource is where an output gets its asset-clips from: the library
+    # cache (if there is one, and it has this file's asset-clips), or else an
+    # XMLParser (whose asset-clips then get stored in the cache for next time).
+    # If stats is passed in, loading, parsing and extraction are recorded in it.
+    # If selector is passed in, only the asset-clips it selects are produced.  The cache
+    # is then only used if the selector doesn't select events (cached asset-clips don't
+    # know their event), and nothing is stored in it (since the asset-clips are partial).
+    # xml can also be AssetClipRecords (e.g. a ClipTable), which are used as they are
+    # (selecting events needs the XML, so a selector's eventNames are ignored then).
+    def __init__(
+        self,
+        xml: 'str | Path | Element | AssetClipRecords',
+        cache: 'LibraryCache | None' = None,
+        streaming: bool = False,
+        stats: Stats | None = None,
+        selector: AssetClipSelector | None = None
+    ):
+        if selector is not None and selector.eventNames is not None:
+            cache = None
+        self.cache: LibraryCache | None = cache
+        self.stats: Stats | None = stats
+        self.selector: AssetClipSelector | None = selector
+        self.records: AssetClipRecords | None = None
+        self.xmlPath: Path | None = None
+        self.parser: XMLParser | None = None
+        self.cachedAssetClips: list[AssetClip] | None = None
+        # the key the asset-clips are stored under (computed before parsing)
+        self.cacheKey: LibraryKey | None = None
+        if isinstance(xml, AssetClipRecords):
+            self.records = xml
+            return
+        if isinstance(xml, Path):
+            self.xmlPath = xml
+        elif isinstance(xml, str) and not xml.lstrip().startswith('<'):
+            self.xmlPath = Path(xml)
+
+        if cache is not None and self.xmlPath is not None:
+            start: float = time.perf_counter()
+            self.cacheKey = cache.key(self.xmlPath)
+            if self.cacheKey is not None:
+                self.cachedAssetClips = cache.load(self.cacheKey)
+            if stats is not None:
+                stats.addPhaseTime('cacheLoad', time.perf_counter() - start)
+
+        # only parse the XML if we have to
+        if self.cachedAssetClips is None:
+            self.parser = XMLParser(xml, streaming=streaming, stats=stats)
+
+    @property
+    def isValid(self) -> bool:
+        return self.cachedAssetClips is not None or self.records is not None or (
+            self.parser is not None and self.parser.isValid
+        )
+
+    def assetClips(self) -> list[AssetClip] | None:
+        # returns None if parsing failed
+        if self.cachedAssetClips is not None and self.selector is None:
+            return self.cachedAssetClips
+        assetClips: list[AssetClip] = []
+        if not self.forEachAssetClip(assetClips.append):
+            return None
+        return assetClips
+
+    def forEachAssetClip(self, callback: t.Callable[[AssetClip], t.Any]) -> bool:
+        # Calls callback with each asset-clip, in document order, as soon as it has been
+        # extracted.  With a streaming parser (and no cache to fill) only one asset-clip
+        # is in memory at a time.  Returns False if parsing failed.
+        selector: AssetClipSelector | None = self.selector
+        if selector is not None:
+            selector.reset()
+        loaded: t.Iterable[AssetClip] | None = self.cachedAssetClips
+        if self.records is not None:
+            loaded = self.records.assetClips()
+        if loaded is not None:
+            for assetClip in loaded:
+                if selector is not None:
+                    if selector.isFull:
+                        break
+                    selected: AssetClip | None = selector.select(assetClip)
+                    if selected is None:
+                        continue
+                    assetClip = selected
+                callback(assetClip)
+            return True
+        if self.parser is None or not self.parser.isValid:
+            return False
+
+        toCache: list[AssetClip] | None = None
+        if self.cache is not None and self.cacheKey is not None and selector is None:
+            toCache = []
+        extractor = AssetClipExtractor()
+        extract: t.Callable[[Element], AssetClip] = extractor.assetClip
+        if self.stats is not None:
+            extract = self.stats.timed('extract', extract)
+
+        def assetClipCallback(_refcon: t.Any, assetClipEl: Element) -> bool:
+            assetClip: AssetClip = extract(assetClipEl)
+            if toCache is not None:
+                toCache.append(assetClip)
+            callback(assetClip)
+            return True  # please keep feeding me Elements
+
+        def selectedAssetClipCallback(selector: AssetClipSelector, assetClipEl: Element) -> bool:
+            # (don't bother extracting asset-clips with the wrong name)
+            if selector.matchesName(assetClipEl.get('name', '')):
+                assetClip: AssetClip | None = selector.select(extract(assetClipEl))
+                if assetClip is not None:
+                    callback(assetClip)
+            return not selector.isFull
+
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+            **extractor.resources.callbacks(),
+            AssetClipExtractor.ASSET_CLIP_PATH: (assetClipCallback, None)
+        }
+        filters: dict[str, tuple[t.Callable[[t.Any, Element], int], t.Any]] | None = None
+        if selector is not None:
+            callbacks[AssetClipExtractor.ASSET_CLIP_PATH] = (selectedAssetClipCallback, selector)
+            filters = selector.filters()
+        if not self.parser.parse(callbacks, filters=filters):
+            return False
+
+        if self.cache is not None and self.cacheKey is not None and toCache is not None:
+            start: float = time.perf_counter()
+            self.cache.store(self.cacheKey, toCache)
+            if self.stats is not None:
+                self.stats.addPhaseTime('cacheStore', time.perf_counter() - start)
+        return True
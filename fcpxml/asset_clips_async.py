@@ -0,0 +1,239 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsAsync runs parsing and output generation from asyncio code,
+#                on a bounded pool of worker threads, so that the event loop keeps
+#                running.  Jobs can be cancelled, and report their progress.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import asyncio
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml.asset_clips import AssetClip, AssetClipExtractor, AssetClipsSource
+from fcpxml.asset_clips_csv import AssetClipsCSV
+from fcpxml.asset_clips_report import AssetClipsReport
+from fcpxml.asset_clips_sqlite import AssetClipsSQLite
+from fcpxml.stats import Stats
+
+T = t.TypeVar('T')
+
+class ParseProgress:
+    # elementsProcessed is the number of elements called back so far: for parse, every
+    # callback made; for the others, the asset-clips (not the resources, or anything
+    # else they parse).  totalBytes is None if the size isn't known (e.g. xml is an
+    # Element, or a gzip file).  The last progress of a job has done == True.
+    __slots__ = ('bytesRead', 'totalBytes', 'elementsProcessed', 'done')
+
+    def __init__(
+        self,
+        bytesRead: int,
+        totalBytes: int | None,
+        elementsProcessed: int,
+        done: bool = False
+    ):
+        self.bytesRead: int = bytesRead
+        self.totalBytes: int | None = totalBytes
+        self.elementsProcessed: int = elementsProcessed
+        self.done: bool = done
+
+    def __repr__(self) -> str:
+        return (
+            f'ParseProgress({self.bytesRead}/{self.totalBytes} bytes,'
+            f' {self.elementsProcessed} elements{", done" if self.done else ""})'
+        )
+
+
+class _Cancelled(Exception):
+    # raised (by the stats hook) in a worker thread, to stop a job that was cancelled
+    pass
+
+
+class AssetClipsAsync:
+    # Each job (parse, assetClips, writeCSV, writeReport, writeSQLite) runs in one of
+    # maxWorkers threads.  Jobs on large inputs (files of largeFileBytes or more, or XML
+    # data that big, or compressed files, whose size isn't known) also need one of
+    # maxLargeParses slots, so that only a few of the memory-hungry ones run at once;
+    # the others wait (in the event loop, not a thread).  Jobs on an Element (already
+    # parsed) don't need a slot.
+    #
+    # If the task awaiting a job is cancelled, the worker stops at its next progress
+    # point (the next chunk read or callback made), and CancelledError is raised once
+    # the worker has really stopped.  The job's output file is left as it was (outputs
+    # are only replaced when they have been written completely).
+    #
+    # onProgress (if passed) is called on the event loop with a ParseProgress, at most
+    # every progressInterval seconds, and once more when the job is done.
+    #
+    # Parse callbacks (see parse) are called in the worker thread.
+    #     async with AssetClipsAsync(maxWorkers=4) as runner:
+    #         success = await runner.writeCSV(xmlPath, csvPath, onProgress=print)
+    DEFAULT_LARGE_FILE_BYTES: int = 64 << 20
+
+    def __init__(
+        self,
+        maxWorkers: int = 4,
+        maxLargeParses: int = 1,
+        largeFileBytes: int = DEFAULT_LARGE_FILE_BYTES,
+        progressInterval: float = 0.25
+    ):
+        self.maxWorkers: int = maxWorkers
+        self.maxLargeParses: int = maxLargeParses
+        self.largeFileBytes: int = largeFileBytes
+        self.progressInterval: float = progressInterval
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self._largeParses: asyncio.Semaphore | None = None
+
+    async def __aenter__(self) -> 'AssetClipsAsync':
+        return self
+
+    async def __aexit__(self, *excInfo: t.Any):
+        self.close()
+
+    def close(self):
+        # waits for running jobs to finish
+        self._executor.shutdown(wait=True)
+
+    async def parse(
+        self,
+        xml: str | bytes | Path | Element,
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        streaming: bool = True,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None = None
+    ) -> bool:
+        # XMLParser(xml, streaming).parse(callbacks)
+        def job(stats: Stats) -> bool:
+            parser = XMLParser(xml, streaming=streaming, stats=stats)
+            if not parser.isValid:
+                return False
+            return parser.parse(callbacks)
+        return await self._run(xml, job, None, onProgress)
+
+    async def assetClips(
+        self,
+        xml: str | Path | Element,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None = None
+    ) -> list[AssetClip] | None:
+        # returns None if parsing failed
+        def job(stats: Stats) -> list[AssetClip] | None:
+            return AssetClipsSource(xml, streaming=True, stats=stats).assetClips()
+        return await self._run(xml, job, AssetClipExtractor.ASSET_CLIP_PATH, onProgress)
+
+    async def writeCSV(
+        self,
+        xml: str | Path | Element,
+        csvPath: str | Path,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None = None
+    ) -> bool:
+        def job(stats: Stats) -> bool:
+            return AssetClipsCSV(xml, stats=stats).writeCSV(csvPath)
+        return await self._run(xml, job, AssetClipExtractor.ASSET_CLIP_PATH, onProgress)
+
+    async def writeReport(
+        self,
+        xml: str | Path | Element,
+        reportPath: str | Path,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None = None
+    ) -> bool:
+        def job(stats: Stats) -> bool:
+            return AssetClipsReport(xml, stats=stats).writeReport(reportPath)
+        return await self._run(xml, job, AssetClipExtractor.ASSET_CLIP_PATH, onProgress)
+
+    async def writeSQLite(
+        self,
+        xml: str | Path | Element,
+        dbPath: str | Path,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None = None
+    ) -> bool:
+        def job(stats: Stats) -> bool:
+            return AssetClipsSQLite(xml, stats=stats).writeSQLite(dbPath)
+        return await self._run(xml, job, AssetClipExtractor.ASSET_CLIP_PATH, onProgress)
+
+    async def _run(
+        self,
+        xml: str | bytes | Path | Element,
+        job: t.Callable[[Stats], T],
+        countedKey: str | None,
+        onProgress: t.Callable[[ParseProgress], t.Any] | None
+    ) -> T:
+        # elementsProcessed counts the callbacks for countedKey (None: all of them)
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        totalBytes: int | None = self._size(xml)
+        cancelled = threading.Event()
+        stats = Stats()
+        elementsProcessed: list[int] = [0]
+        lastProgress: list[float] = [time.monotonic()]
+
+        def progressHook(event: str, name: str, _seconds: float):
+            # called in the worker thread
+            if cancelled.is_set():
+                raise _Cancelled()
+            if event == 'callback' and (countedKey is None or name == countedKey):
+                elementsProcessed[0] += 1
+            if onProgress is None:
+                return
+            now: float = time.monotonic()
+            if now - lastProgress[0] >= self.progressInterval:
+                lastProgress[0] = now
+                loop.call_soon_threadsafe(
+                    onProgress, ParseProgress(stats.bytesRead, totalBytes, elementsProcessed[0])
+                )
+
+        def worker() -> T:
+            if cancelled.is_set():
+                raise _Cancelled()
+            return job(stats)
+
+        stats.addHook(progressHook)
+        largeParses: asyncio.Semaphore | None = None
+        if self._isLarge(xml, totalBytes):
+            if self._largeParses is None:
+                self._largeParses = asyncio.Semaphore(self.maxLargeParses)
+            largeParses = self._largeParses
+
+        if largeParses is not None:
+            await largeParses.acquire()
+        try:
+            future: asyncio.Future = loop.run_in_executor(self._executor, worker)
+            try:
+                result: T = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # stop the worker, and wait until it has (so its memory, files, and
+                # large parse slot really are free when we're done)
+                cancelled.set()
+                try:
+                    await future
+                except (Exception, asyncio.CancelledError):
+                    pass
+                raise
+        finally:
+            if largeParses is not None:
+                largeParses.release()
+
+        if onProgress is not None:
+            onProgress(ParseProgress(stats.bytesRead, totalBytes, elementsProcessed[0], True))
+        return result
+
+    def _isLarge(self, xml: str | bytes | Path | Element, totalBytes: int | None) -> bool:
+        # (an Element has nothing left to parse; a file of unknown size might be large)
+        if not isinstance(xml, (str, bytes, Path)):
+            return False
+        return totalBytes is None or totalBytes >= self.largeFileBytes
+
+    @staticmethod
+    def _size(xml: str | bytes | Path | Element) -> int | None:
+        if isinstance(xml, bytes):
+            return len(xml)
+        if isinstance(xml, str) and xml.lstrip().startswith('<'):
+            return len(xml)
+        if isinstance(xml, (str, Path)):
+            return XMLParser.documentSize(xml)
+        return None
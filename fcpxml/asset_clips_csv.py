@@ -15,103 +15,123 @@ from xml.etree.ElementTree import Element
 
 from fcpxml import XMLParser
 from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipRecords, AssetClipSelector, AssetClipSink
+from fcpxml.library_cache import LibraryCache
+from fcpxml.stats import Stats
+
+class CSVRowWriter:
+    # CSVRowWriter turns asset-clips into CSV rows (one per keyword range), and
+    # writes them to a text file in large batches, instead of a write per cell.
+    # Don't forget to call flush() when you're done.
+    HEADER: str = 'Movie Name,Media Path,Media Duration,Time Range,Note,Year,Month,Keywords...'
+    BUFFER_SIZE: int = 1 << 20  # characters
+
+    def __init__(self, f: t.TextIO):
+        self.f: t.TextIO = f
+        self.rowsWritten: int = 0
+        self._buffer: list[str] = []
+        self._bufferSize: int = 0
+
+    def writeHeader(self, libraryColumn: bool = False):
+        # libraryColumn is for CSVs containing more than one library (see AssetClipsBatch)
+        self._append(('Library,' if libraryColumn else '') + self.HEADER + '\n')
+
+    def writeAssetClip(self, assetClip: AssetClip, library: str | None = None):
+        # writes a row per keyword range:
+        # [library,] name, mediaPath, mediaDuration, timeRange, note, year, month,
+        # keyword1, keyword2, ...
+        escaped: t.Callable[[str], str] = Utils.escapedCSVEntry
+        prefix: str = (
+            escaped(assetClip.name) + ',' + escaped(assetClip.mediaPath) + ','
+            + escaped(assetClip.mediaDuration) + ','
+        )
+        if library is not None:
+            prefix = escaped(library) + ',' + prefix
+
+        rows: list[str] = []
+        for keywordRange in assetClip.keywordRanges:
+            row: str = prefix + escaped(keywordRange.timeRange)
+            keywords: tuple[str, ...] = keywordRange.keywords
+            note: str = keywordRange.note
+            if keywords or note:
+                # note first, year and month next (if present), then the other keywords
+                year, month = Utils.findYearAndMonth(keywords)
+                cells: list[str] = [row, escaped(note), escaped(year), escaped(month)]
+                for keyword in keywords:
+                    if year and keyword == year:
+                        continue
+                    if month and keyword == month:
+                        continue
+                    cells.append(escaped(keyword))
+                row = ','.join(cells)
+            rows.append(row)
+
+        if rows:
+            rows.append('')  # so the join ends with a newline
+            self.rowsWritten += len(rows) - 1
+            self._append('\n'.join(rows))
+
+    def flush(self):
+        if self._buffer:
+            self.f.write(''.join(self._buffer))
+            self._buffer = []
+            self._bufferSize = 0
+
+    def _append(self, text: str):
+        self._buffer.append(text)
+        self._bufferSize += len(text)
+        if self._bufferSize >= self.BUFFER_SIZE:
+            self.flush()
+
+
+class CSVSink(AssetClipSink):
+    # writes a CSV file (header and a row per keyword range), through a CSVRowWriter
+    # (csvPath is only replaced if everything succeeds)
+    def __init__(self, csvPath: str | Path):
+        super().__init__(str(csvPath))
+        self.csvPath: Path = Path(csvPath)
+        self._file: t.TextIO | None = None
+        self._rowWriter: CSVRowWriter | None = None
+
+    def open(self):
+        self._file = open(self.tempPath(self.csvPath), 'wt', encoding='utf-8')
+        self._rowWriter = CSVRowWriter(self._file)
+        self._rowWriter.writeHeader()
+
+    def writeAssetClip(self, assetClip: AssetClip):
+        self._rowWriter.writeAssetClip(assetClip)
+
+    def close(self, success: bool):
+        if self._file is None:
+            return
+        written: bool = False
+        try:
+            self._rowWriter.flush()
+            self.rowsWritten = self._rowWriter.rowsWritten
+            self._file.close()
+            written = True
+        finally:
+            self._file.close()
+            self._file = None
+            self.replaceFile(self.csvPath, success and written)
+
 
 class AssetClipsCSV:
-    def __init__(self, xml: str | Path | Element):
-        self.parser = XMLParser(xml)
+    def __init__(
+        self,
+        xml: str | Path | Element | AssetClipRecords,
+        cache: LibraryCache | None = None,
+        stats: Stats | None = None,
+        selector: AssetClipSelector | None = None
+    ):
+        # xml, cache, stats and selector are as for AssetClipsOutputs (xml is parsed
+        # while the CSV is being written, so only a single asset-clip has to be in memory
+        # at a time).
+        # (imported here, because asset_clips_outputs imports this module)
+        from fcpxml.asset_clips_outputs import AssetClipsOutputs
+        self.outputs = AssetClipsOutputs(xml, cache, stats, selector)
+        self.parser: XMLParser | None = self.outputs.source.parser
 
     def writeCSV(self, csvPath: str | Path) -> bool:
-        def assetClipCallback(csvObj, assetClipEl: Element) -> bool:
-            # just name for now, could make a name->fileName/filePath mapping
-            # from './resources/asset/media-rep' elements, so we can put at
-            # least part of the file path in the name.
-            assetName: str = assetClipEl.get('name', '')
-            # maybe later: assetDuration: str = assetClipEl.get('duration', '')
-
-            # assetClipDict contains:
-            #   key = str(timeRange)
-            #   value = tuple(list(keywords), note)
-            assetClipDict: dict[str, tuple[list[str], str]] = {}
-            csvObj[assetName] = assetClipDict
-            # loop over the clips in this
-            for kwEl in assetClipEl.findall('keyword'):
-                startTime: str = kwEl.get('start', '')
-                duration: str = kwEl.get('duration', '')
-                timeRange: str = Utils.getTimeRange(startTime, duration)
-                keywordValue: str = kwEl.get('value', '')  # ', '-delimited list of keywords
-                keywordList: list[str] = []
-                if keywordValue:
-                    keywordList = keywordValue.split(', ')
-                note: str = kwEl.get('note', '')
-                assetClipDict[timeRange] = (keywordList, note)
-
-            return True  # please keep feeding me Elements
-
-        if not self.parser.isValid:
-            return False
-
-        # csvObj is a dict with:
-        #   key = assetName
-        #   value = assetClipDict
-        # assetClipDict is a dict with:
-        #   key = timeRange
-        #   value = keywordsAndNote
-        # keywordsAndNote is a tuple of:
-        #   keywords: list[str]
-        #   note: str
-        csvObj: dict[str, dict[str, tuple[list[str], str]]] = {}
-        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
-            './library/event/asset-clip': (assetClipCallback, csvObj)
-        }
-        self.parser.parse(callbacks)
-
-        # now take csvObj and write it out as a CSV file
-        # name, timeRange, note, keyword1, keyword2, ...
-        with open(csvPath, 'wt', encoding='utf-8') as f:
-            print('Movie Name,Time Range,Note,Year,Month,Keywords...', file=f)
-            for assetName, assetClipDict in csvObj.items():
-                for timeRange, keywordsAndNote in assetClipDict.items():
-                    print(
-                        f'{Utils.escapedCSVEntry(assetName)}'
-                        ','
-                        f'{Utils.escapedCSVEntry(timeRange)}',
-                        end='',
-                        file=f
-                    )
-                    keywords: list[str] = keywordsAndNote[0]
-                    note: str = keywordsAndNote[1]
-                    if keywords or note:
-                        # note first
-                        if note:
-                            print(f',{Utils.escapedCSVEntry(note)}', end='', file=f)
-                        else:
-                            print(',', end='', file=f)
-
-                        # year and month next (if present)
-                        year: str = ''
-                        month: str = ''
-                        for keyword in keywords:
-                            if year and month:
-                                # stop looking if you found both
-                                break
-
-                            if not year and Utils.isYear(keyword):
-                                year = keyword
-                                continue
-
-                            if not month and Utils.isMonth(keyword):
-                                month = keyword
-                                continue
-
-                        print(f',{Utils.escapedCSVEntry(year)}' if year else ',', end='', file=f)
-                        print(f',{Utils.escapedCSVEntry(month)}' if month else ',', end='', file=f)
-
-                        for keyword in keywords:
-                            if year and keyword == year:
-                                continue
-                            if month and keyword == month:
-                                continue
-                            print(f',{Utils.escapedCSVEntry(keyword)}', end='', file=f)
-                    print('', file=f)  # EOL, finally
-
-        return True
+        self.outputs.sinks = [CSVSink(csvPath)]
+        return self.outputs.write()
@@ -0,0 +1,207 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsDiff is a utility that compares two exports of a library
+#                (e.g. yesterday's and today's Info.fcpxml) and reports the keyword
+#                ranges (and notes) that were added, removed or modified.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import sys
+import typing as t
+from fractions import Fraction
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipExtractor, KeywordRange
+
+class KeywordRangeChange:
+    # kind is 'added', 'removed' or 'modified'.  oldRange is None for 'added', and
+    # newRange is None for 'removed'.
+    __slots__ = ('kind', 'assetName', 'oldRange', 'newRange')
+
+    def __init__(
+        self,
+        kind: str,
+        assetName: str,
+        oldRange: KeywordRange | None,
+        newRange: KeywordRange | None
+    ):
+        self.kind: str = kind
+        self.assetName: str = assetName
+        self.oldRange: KeywordRange | None = oldRange
+        self.newRange: KeywordRange | None = newRange
+
+    def __repr__(self) -> str:
+        return f'KeywordRangeChange({self.kind!r}, {self.assetName!r})'
+
+
+class AssetClipsDiff:
+    # Asset-clips are matched up by name (and, for asset-clips with the same name,
+    # by their order in the library).  The old export is parsed first, keeping only a
+    # hash of each asset-clip's subtree.  Then the new export is parsed, and only the
+    # asset-clips whose hash is new or different are extracted; the old export is
+    # parsed once more (only if anything changed) to extract the old versions of just
+    # those, and of the asset-clips that were removed.  So apart from the parses (and a
+    # hash per asset-clip), the work and memory are proportional to the change.
+    # Keyword ranges are matched up by their exact start and duration.
+    def __init__(self, oldXml: str | Path | Element, newXml: str | Path | Element):
+        self.oldParser = XMLParser(oldXml, streaming=True)
+        self.newParser = XMLParser(newXml, streaming=True)
+
+    def diff(self) -> list[KeywordRangeChange] | None:
+        # Returns the changes in new document order (removed asset-clips come last),
+        # or None if either file could not be parsed.
+        if not self.oldParser.isValid or not self.newParser.isValid:
+            return None
+
+        # (name, occurrence) -> digest, for every old asset-clip
+        oldDigests: dict[tuple[str, int], bytes] = {}
+
+        def oldDigest(key: tuple[str, int], assetClipEl: Element) -> bool:
+            oldDigests[key] = Utils.elementDigest(assetClipEl)
+            return True
+
+        if not self._forEachAssetClipEl(self.oldParser, oldDigest):
+            return None
+
+        # (one extractor for both exports, so they share their interned strings)
+        extractor = AssetClipExtractor()
+        changedNew: dict[tuple[str, int], AssetClip] = {}
+        newKeys: set[tuple[str, int]] = set()
+
+        def newAssetClip(key: tuple[str, int], assetClipEl: Element) -> bool:
+            newKeys.add(key)
+            if oldDigests.get(key) != Utils.elementDigest(assetClipEl):
+                changedNew[key] = extractor.assetClip(assetClipEl)
+            return True
+
+        if not self._forEachAssetClipEl(self.newParser, newAssetClip):
+            return None
+
+        # the old versions of the changed and removed asset-clips
+        wanted: set[tuple[str, int]] = {key for key in changedNew if key in oldDigests}
+        wanted.update(key for key in oldDigests if key not in newKeys)
+        oldAssetClips: dict[tuple[str, int], AssetClip] = {}
+
+        def oldAssetClip(key: tuple[str, int], assetClipEl: Element) -> bool:
+            if key in wanted:
+                oldAssetClips[key] = extractor.assetClip(assetClipEl)
+            return True
+
+        if wanted and not self._forEachAssetClipEl(self.oldParser, oldAssetClip):
+            return None
+
+        changes: list[KeywordRangeChange] = []
+        for key, newAssetClip in changedNew.items():
+            self._diffAssetClip(oldAssetClips.get(key), newAssetClip, changes)
+        for key, assetClip in oldAssetClips.items():
+            if key not in newKeys:
+                self._diffAssetClip(assetClip, None, changes)
+
+        return changes
+
+    def writeDiff(self, diffPath: str | Path) -> bool:
+        changes: list[KeywordRangeChange] | None = self.diff()
+        if changes is None:
+            return False
+
+        # asset-name:
+        #   + timeRange: keywords: note           (added)
+        #   - timeRange: keywords: note           (removed)
+        #   ~ timeRange: keywords: note           (modified: old, then new)
+        #     timeRange: keywords: note
+        with open(diffPath, 'wt', encoding='utf-8') as f:
+            currAssetName: str | None = None
+            for change in changes:
+                if change.assetName != currAssetName:
+                    currAssetName = change.assetName
+                    print(f'{currAssetName}:', file=f)
+                if change.kind == 'added':
+                    print(f'  + {self._describe(change.newRange)}', file=f)
+                elif change.kind == 'removed':
+                    print(f'  - {self._describe(change.oldRange)}', file=f)
+                else:
+                    print(f'  ~ {self._describe(change.oldRange)}', file=f)
+                    print(f'    {self._describe(change.newRange)}', file=f)
+
+        if not changes:
+            print('No changes found.', file=sys.stderr)
+        return True
+
+    @staticmethod
+    def _forEachAssetClipEl(
+        parser: XMLParser,
+        callback: t.Callable[[tuple[str, int], Element], bool]
+    ) -> bool:
+        # Calls callback with each asset-clip element and its key: (name, number of
+        # earlier asset-clips with the same name).  Returns False if parsing failed.
+        counts: dict[str, int] = {}
+
+        def assetClipCallback(_refcon: t.Any, assetClipEl: Element) -> bool:
+            name: str = assetClipEl.get('name', '')
+            count: int = counts.get(name, 0)
+            counts[name] = count + 1
+            return callback((name, count), assetClipEl)
+
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+            AssetClipExtractor.ASSET_CLIP_PATH: (assetClipCallback, None)
+        }
+        return parser.parse(callbacks)
+
+    @staticmethod
+    def _rangeKeyed(
+        keywordRanges: list[KeywordRange]
+    ) -> dict[tuple[Fraction, Fraction, int], KeywordRange]:
+        # key is (start, duration, number of earlier ranges with the same start/duration)
+        output: dict[tuple[Fraction, Fraction, int], KeywordRange] = {}
+        counts: dict[tuple[Fraction, Fraction], int] = {}
+        for kr in keywordRanges:
+            startAndDuration: tuple[Fraction, Fraction] = (
+                Fraction(kr.start, kr.timescale), Fraction(kr.duration, kr.timescale)
+            )
+            count: int = counts.get(startAndDuration, 0)
+            counts[startAndDuration] = count + 1
+            output[startAndDuration + (count,)] = kr
+        return output
+
+    @staticmethod
+    def _diffAssetClip(
+        oldAssetClip: AssetClip | None,
+        newAssetClip: AssetClip | None,
+        changes: list[KeywordRangeChange]
+    ):
+        assetName: str = newAssetClip.name if newAssetClip is not None else ''
+        oldRanges: dict[tuple[Fraction, Fraction, int], KeywordRange] = {}
+        newRanges: dict[tuple[Fraction, Fraction, int], KeywordRange] = {}
+        if oldAssetClip is not None:
+            assetName = oldAssetClip.name
+            oldRanges = AssetClipsDiff._rangeKeyed(oldAssetClip.keywordRanges)
+        if newAssetClip is not None:
+            newRanges = AssetClipsDiff._rangeKeyed(newAssetClip.keywordRanges)
+
+        for key, newRange in newRanges.items():
+            oldRange: KeywordRange | None = oldRanges.get(key)
+            if oldRange is None:
+                changes.append(KeywordRangeChange('added', assetName, None, newRange))
+            elif oldRange.keywords != newRange.keywords or oldRange.note != newRange.note:
+                changes.append(KeywordRangeChange('modified', assetName, oldRange, newRange))
+
+        for key, oldRange in oldRanges.items():
+            if key not in newRanges:
+                changes.append(KeywordRangeChange('removed', assetName, oldRange, None))
+
+    @staticmethod
+    def _describe(keywordRange: KeywordRange | None) -> str:
+        if t.TYPE_CHECKING:
+            assert keywordRange is not None
+        output: str = keywordRange.timeRange + ':'
+        if keywordRange.keywords:
+            output += ' ' + ', '.join(keywordRange.keywords) + ':'
+        if keywordRange.note:
+            output += ' ' + keywordRange.note
+        return output
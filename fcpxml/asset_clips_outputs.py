@@ -0,0 +1,236 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsOutputs writes any number of outputs (CSV, report, SQLite,
+#                or your own AssetClipSinks) from a single parse of a library, instead
+#                of each output parsing the library again.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import queue
+import sys
+import threading
+import time
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml.asset_clips import AssetClip, AssetClipRecords, AssetClipSelector, AssetClipSink
+from fcpxml.asset_clips import AssetClipsSource
+from fcpxml.asset_clips_csv import CSVSink
+from fcpxml.asset_clips_report import ReportSink
+from fcpxml.asset_clips_sqlite import SQLiteSink
+from fcpxml.library_cache import LibraryCache
+from fcpxml.stats import Stats
+
+class _SinkThread:
+    # Runs a sink on its own thread: asset-clips arrive in batches through a bounded
+    # queue, and a bool (did parsing succeed) means there are no more.  If the sink
+    # fails, the thread keeps emptying the queue (so the parse never waits on it).
+    def __init__(self, sink: AssetClipSink, queueSize: int):
+        self.sink: AssetClipSink = sink
+        self.queue: queue.Queue[list[AssetClip] | bool] = queue.Queue(queueSize)
+        self.error: Exception | None = None
+        self.seconds: float = 0.
+        self.thread = threading.Thread(target=self._run, name=f'fcpxml: {sink.name}', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        sink: AssetClipSink = self.sink
+        start: float = time.perf_counter()
+        try:
+            sink.open()
+        except Exception as e:
+            self.error = e
+        self.seconds += time.perf_counter() - start
+
+        while True:
+            batch: list[AssetClip] | bool = self.queue.get()
+            start = time.perf_counter()
+            if isinstance(batch, bool):
+                parsed: bool = batch
+                try:
+                    sink.close(parsed and self.error is None)
+                except Exception as e:
+                    if self.error is None:
+                        self.error = e
+                self.seconds += time.perf_counter() - start
+                return
+            if self.error is not None:
+                continue
+            try:
+                for assetClip in batch:
+                    sink.writeAssetClip(assetClip)
+            except Exception as e:
+                self.error = e
+            self.seconds += time.perf_counter() - start
+
+
+class AssetClipsOutputs:
+    # xml is parsed once, and each asset-clip is written to every sink (in the order
+    # they were added) as soon as it has been extracted:
+    #     outputs = AssetClipsOutputs('Info.fcpxml', threaded=True)
+    #     outputs.addCSV('Info.csv')
+    #     outputs.addReport('Info.txt')
+    #     outputs.addSink(MySink())  # an AssetClipSink
+    #     success = outputs.write()
+    #
+    # Without threaded, the sinks are written in the parsing thread, one after the other,
+    # so the total time is the parse plus all the writers.  With threaded, each sink gets
+    # its own thread, fed through a bounded queue (of queueSize batches of BATCH_SIZE
+    # asset-clips), so the total time gets close to the parse or the slowest writer,
+    # whichever is longer (as far as the writers release the GIL: file and database
+    # writes do, formatting rows doesn't).  A writer that falls behind holds up the
+    # parse once its queue is full, rather than letting asset-clips pile up in memory.
+    #
+    # A sink that fails is reported on stderr and recorded in self.failures, as (sink,
+    # reason), but doesn't stop the others.
+    #
+    # xml can also be AssetClipRecords (e.g. a ClipTable or ClipTableView).
+    # If cache is passed in, and it has xml's asset-clips, xml will not be parsed.
+    # Otherwise xml is parsed incrementally, so only the asset-clips not yet written
+    # have to be in memory at a time.
+    # If stats is passed in, everything write does is recorded in it ('write' is the
+    # total time spent in the sinks, which, with threaded, overlaps the parse).
+    # If selector is passed in, only the asset-clips it selects are written (see
+    # AssetClipSelector), and the events it doesn't select are never built.
+    #
+    # AssetClipsCSV, AssetClipsReport and AssetClipsSQLite are each an AssetClipsOutputs
+    # with a single sink.
+    BATCH_SIZE: int = 64  # asset-clips
+    DEFAULT_QUEUE_SIZE: int = 16  # batches
+
+    def __init__(
+        self,
+        xml: str | Path | Element | AssetClipRecords,
+        cache: LibraryCache | None = None,
+        stats: Stats | None = None,
+        selector: AssetClipSelector | None = None,
+        threaded: bool = False,
+        queueSize: int = DEFAULT_QUEUE_SIZE
+    ):
+        self.stats: Stats | None = stats
+        self.threaded: bool = threaded
+        self.queueSize: int = queueSize
+        self.source = AssetClipsSource(
+            xml, cache, streaming=True, stats=stats, selector=selector
+        )
+        self.sinks: list[AssetClipSink] = []
+        self.failures: list[tuple[AssetClipSink, str]] = []
+
+    def addSink(self, sink: AssetClipSink) -> AssetClipSink:
+        self.sinks.append(sink)
+        return sink
+
+    def addCSV(self, csvPath: str | Path) -> CSVSink:
+        return self.addSink(CSVSink(csvPath))
+
+    def addReport(
+        self,
+        reportPath: str | Path,
+        workers: int = 1,
+        chunkSize: int = ReportSink.DEFAULT_CHUNK_SIZE
+    ) -> ReportSink:
+        # (see ReportSink for workers and chunkSize)
+        return self.addSink(ReportSink(reportPath, workers, chunkSize))
+
+    def addSQLite(self, dbPath: str | Path) -> SQLiteSink:
+        return self.addSink(SQLiteSink(dbPath))
+
+    def write(self) -> bool:
+        # returns True if parsing, and every sink, succeeded
+        self.failures = []
+        if not self.source.isValid:
+            return False
+        if self.threaded:
+            success: bool = self._writeThreaded()
+        else:
+            success = self._writeSerially()
+
+        if self.stats is not None:
+            for sink in self.sinks:
+                self.stats.rowsWritten += sink.rowsWritten
+                self.stats.linesWritten += sink.linesWritten
+        return success and not self.failures
+
+    def _writeSerially(self) -> bool:
+        sinks: list[AssetClipSink] = []
+        for sink in self.sinks:
+            try:
+                sink.open()
+                sinks.append(sink)
+            except Exception as e:
+                self._failed(sink, e)
+
+        def writeAssetClip(assetClip: AssetClip):
+            for sink in tuple(sinks):
+                try:
+                    sink.writeAssetClip(assetClip)
+                except Exception as e:
+                    self._failed(sink, e)
+                    sinks.remove(sink)
+                    self._close(sink, False)
+
+        if self.stats is not None:
+            writeAssetClip = self.stats.timed('write', writeAssetClip)
+        success: bool = False
+        try:
+            success = self.source.forEachAssetClip(writeAssetClip)
+        finally:
+            start: float = time.perf_counter()
+            for sink in sinks:
+                self._close(sink, success)
+            if self.stats is not None:
+                self.stats.addPhaseTime('write', time.perf_counter() - start)
+        return success
+
+    def _writeThreaded(self) -> bool:
+        sinkThreads: list[_SinkThread] = [
+            _SinkThread(sink, self.queueSize) for sink in self.sinks
+        ]
+        batchSize: int = self.BATCH_SIZE
+        batch: list[AssetClip] = []
+
+        def sendBatch():
+            for sinkThread in sinkThreads:
+                if sinkThread.error is None:
+                    sinkThread.queue.put(batch)
+
+        def writeAssetClip(assetClip: AssetClip):
+            nonlocal batch
+            batch.append(assetClip)
+            if len(batch) >= batchSize:
+                sendBatch()
+                batch = []
+
+        success: bool = False
+        try:
+            success = self.source.forEachAssetClip(writeAssetClip)
+            if batch:
+                sendBatch()
+        finally:
+            # (even if parsing raised, so the threads don't wait forever)
+            for sinkThread in sinkThreads:
+                sinkThread.queue.put(success)
+            for sinkThread in sinkThreads:
+                sinkThread.thread.join()
+
+        for sinkThread in sinkThreads:
+            if sinkThread.error is not None:
+                self._failed(sinkThread.sink, sinkThread.error)
+            if self.stats is not None:
+                self.stats.addPhaseTime('write', sinkThread.seconds)
+        return success
+
+    def _close(self, sink: AssetClipSink, success: bool):
+        try:
+            sink.close(success)
+        except Exception as e:
+            self._failed(sink, e)
+
+    def _failed(self, sink: AssetClipSink, e: Exception):
+        reason: str = str(e) or type(e).__name__
+        print(f'ERROR: failed to write {sink.name} ({reason}).', file=sys.stderr)
+        self.failures.append((sink, reason))
@@ -8,65 +8,140 @@
 # Copyright:     (c) 2024 Greg Chapman
 # License:       MIT, see LICENSE
 # ------------------------------------------------------------------------------
+import io
 import typing as t
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
 from xml.etree.ElementTree import Element
-import textwrap
 
 from fcpxml import XMLParser
 from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipRecords, AssetClipSelector, AssetClipSink
+from fcpxml.library_cache import LibraryCache
+from fcpxml.stats import Stats
+
+def _renderAssetClips(assetClips: list[AssetClip]) -> tuple[str, int]:
+    # Runs in the worker processes (so it must be a module-level function).  Each
+    # asset-clip's text starts (and ends) at the start of a line, so a chunk of them
+    # renders exactly the same on its own as it does in the middle of the report.
+    buffer = io.StringIO()
+    with Utils.TextWrapper(buffer, wrapIndent=AssetClipsReport.WRAP_INDENT) as out:
+        AssetClipsReport.writeAssetClips(out, assetClips)
+    return buffer.getvalue(), out.linesWritten
+
+
+class ReportSink(AssetClipSink):
+    # Writes a text report (see AssetClipsReport.writeAssetClips).
+    # With workers > 1, the asset-clips are rendered in chunks (of chunkSize asset-clips)
+    # by that many worker processes, and their text is written in document order, so
+    # the report is exactly the same as when it is rendered here.  At most two chunks
+    # per worker are in flight at a time.  reportPath is only replaced if everything
+    # succeeds.
+    DEFAULT_CHUNK_SIZE: int = 64  # asset-clips
+
+    def __init__(
+        self,
+        reportPath: str | Path,
+        workers: int = 1,
+        chunkSize: int = DEFAULT_CHUNK_SIZE
+    ):
+        super().__init__(str(reportPath))
+        self.reportPath: Path = Path(reportPath)
+        self.workers: int = workers
+        self.chunkSize: int = chunkSize
+        self._file: t.TextIO | None = None
+        self._out: Utils.TextWrapper | None = None
+        self._executor: ProcessPoolExecutor | None = None
+        self._chunk: list[AssetClip] = []
+        self._rendering: deque[Future] = deque()
+
+    def open(self):
+        self._file = open(self.tempPath(self.reportPath), 'wt', encoding='utf-8')
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._out = Utils.TextWrapper(self._file, wrapIndent=AssetClipsReport.WRAP_INDENT)
+
+    def writeAssetClip(self, assetClip: AssetClip):
+        if self._executor is None:
+            AssetClipsReport.writeAssetClip(self._out, assetClip)
+            return
+        self._chunk.append(assetClip)
+        if len(self._chunk) >= self.chunkSize:
+            self._renderChunk()
+
+    def close(self, success: bool):
+        if self._file is None:
+            return
+        written: bool = False
+        try:
+            if self._executor is None:
+                self._out.flush()
+                self.linesWritten = self._out.linesWritten
+            elif success:
+                if self._chunk:
+                    self._renderChunk()
+                while self._rendering:
+                    self._writeRendered()
+            self._file.close()
+            written = True
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+                self._rendering.clear()
+            self._file.close()
+            self._file = None
+            self.replaceFile(self.reportPath, success and written)
+
+    def _renderChunk(self):
+        self._rendering.append(self._executor.submit(_renderAssetClips, self._chunk))
+        self._chunk = []
+        # write whatever is ready (in order), waiting if too much is in flight
+        rendering: deque[Future] = self._rendering
+        while rendering and (len(rendering) > 2 * self.workers or rendering[0].done()):
+            self._writeRendered()
+
+    def _writeRendered(self):
+        text, linesWritten = self._rendering.popleft().result()
+        self._file.write(text)
+        self.linesWritten += linesWritten
+
 
 class AssetClipsReport:
-    def __init__(self, xml: str | Path | Element):
-        self.parser = XMLParser(xml)
-
-    def writeReport(self, reportPath: str | Path) -> bool:
-        def assetClipCallback(assetObj, assetClipEl: Element) -> bool:
-            # just name for now, could make a name->fileName/filePath mapping
-            # from './resources/asset/media-rep' elements, so we can put at
-            # least part of the file path in the name.
-            assetName: str = assetClipEl.get('name', '')
-            # maybe later: assetDuration: str = assetClipEl.get('duration', '')
-
-            # assetClipDict contains:
-            #   key = str(timeRange)
-            #   value = tuple(list(keywords), note)
-            assetClipDict: dict[str, tuple[list[str], str]] = {}
-            assetObj[assetName] = assetClipDict
-            # loop over the clips in this
-            for kwEl in assetClipEl.findall('keyword'):
-                startTime: str = kwEl.get('start', '')
-                duration: str = kwEl.get('duration', '')
-                timeRange: str = Utils.getTimeRange(startTime, duration)
-                keywordValue: str = kwEl.get('value', '')  # ', '-delimited list of keywords
-                keywordList: list[str] = []
-                if keywordValue:
-                    keywordList = keywordValue.split(', ')
-                note: str = kwEl.get('note', '')
-                assetClipDict[timeRange] = (keywordList, note)
-
-            return True  # please keep feeding me Elements
-
-        if not self.parser.isValid:
-            return False
-
-        # assetsObj is a dict with:
-        #   key = assetName
-        #   value = assetClipDict
-        # assetClipDict is a dict with:
-        #   key = timeRange
-        #   value = keywordsAndNote
-        # keywordsAndNote is a tuple of:
-        #   keywords: list[str]
-        #   note: str
-        assetsObj: dict[str, dict[str, tuple[list[str], str]]] = {}
-        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
-            './library/event/asset-clip': (assetClipCallback, assetsObj)
-        }
-        self.parser.parse(callbacks)
-
-        # now take assetsObj and write it out as a text file
-        # clip1-name
+    WRAP_INDENT: int = 25
+
+    def __init__(
+        self,
+        xml: str | Path | Element | AssetClipRecords,
+        cache: LibraryCache | None = None,
+        stats: Stats | None = None,
+        selector: AssetClipSelector | None = None
+    ):
+        # xml, cache, stats and selector are as for AssetClipsOutputs (xml is parsed
+        # while the report is being written, so only the asset-clips not yet written
+        # have to be in memory at a time).
+        # (imported here, because asset_clips_outputs imports this module)
+        from fcpxml.asset_clips_outputs import AssetClipsOutputs
+        self.outputs = AssetClipsOutputs(xml, cache, stats, selector)
+        self.parser: XMLParser | None = self.outputs.source.parser
+
+    def writeReport(
+        self,
+        reportPath: str | Path,
+        workers: int = 1,
+        chunkSize: int = ReportSink.DEFAULT_CHUNK_SIZE
+    ) -> bool:
+        # With workers > 1, chunks of chunkSize asset-clips are rendered in parallel, by
+        # that many worker processes (see ReportSink).  The report is the same either way.
+        self.outputs.sinks = [ReportSink(reportPath, workers, chunkSize)]
+        return self.outputs.write()
+
+    @staticmethod
+    def writeAssetClips(out: Utils.TextWrapper, assetClips: t.Iterable[AssetClip]):
+        # write assetClips out as text
+        # clip1-name: mediaPath (mediaDuration)
         #   timeRange1: year, month note1
         #   timeRange2, note2
         #   ...
@@ -75,49 +150,35 @@ class AssetClipsReport:
         #   timeRange2, note2
         #   ...
         # ...
-        with open(reportPath, 'wt', encoding='utf-8') as f:
-            out = Utils.TextWrapper(f, wrapIndent=25)
-            for assetName, assetClipDict in assetsObj.items():
-                out.writeLine(f'{assetName}:')
-                for timeRange, keywordsAndNote in assetClipDict.items():
-                    keywords: list[str] = keywordsAndNote[0]
-                    note: str = keywordsAndNote[1]
-
-                    # timeRange first
-                    out.write(f'\t{timeRange}:')
-                    out.write(' ')  # out.write trims trailing spaces (but not pure whitespace)
-
-                    # year and month next (if present in keywords)
-                    year: str = ''
-                    month: str = ''
-                    for keyword in keywords:
-                        if year and month:
-                            # stop looking if you found both
-                            break
-
-                        if not year and Utils.isYear(keyword):
-                            year = keyword
-                            continue
-
-                        if not month and Utils.isMonth(keyword):
-                            month = keyword
-                            continue
-
-                    if month:
-                        out.write(Utils.abbreviate(month))
-                    if month and year:
-                        out.write(' ')
-                    if year:
-                        out.write(year)
-                    if year or month:
-                        out.write(':')
-                        out.write(' ')
-
-                    # note next
-                    if note:
-                        out.write(f'{note}')
-
-                    # EOL, finally
-                    out.writeLine('')
-
-        return True
+        for assetClip in assetClips:
+            AssetClipsReport.writeAssetClip(out, assetClip)
+
+    @staticmethod
+    def writeAssetClip(out: Utils.TextWrapper, assetClip: AssetClip):
+        if assetClip.asset is not None:
+            out.writeLine(f'{assetClip.name}: {assetClip.mediaPath} ({assetClip.mediaDuration})')
+        else:
+            out.writeLine(f'{assetClip.name}:')
+        for keywordRange in assetClip.keywordRanges:
+            # timeRange first
+            out.write(f'\t{keywordRange.timeRange}:')
+            out.write(' ')  # out.write trims trailing spaces (but not pure whitespace)
+
+            # year and month next (if present in keywords)
+            year, month = Utils.findYearAndMonth(keywordRange.keywords)
+            if month:
+                out.write(Utils.abbreviate(month))
+            if month and year:
+                out.write(' ')
+            if year:
+                out.write(year)
+            if year or month:
+                out.write(':')
+                out.write(' ')
+
+            # note next
+            if keywordRange.note:
+                out.write(f'{keywordRange.note}')
+
+            # EOL, finally
+            out.writeLine('')
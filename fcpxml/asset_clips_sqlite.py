@@ -0,0 +1,245 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsSQLite is a utility that exports all the asset-clips (with
+#                their keyword ranges, keywords and notes) to a SQLite database, for
+#                libraries that are too big to be useful as a spreadsheet.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import sqlite3
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipRecords, AssetClipSelector, AssetClipSink
+from fcpxml.library_cache import LibraryCache
+from fcpxml.resource_index import AssetResource
+from fcpxml.stats import Stats
+
+class SQLiteRowWriter:
+    # SQLiteRowWriter turns asset-clips into rows, and inserts them in batches (one
+    # executemany per table per batch), committing every TRANSACTION_SIZE keyword ranges.
+    # The tables' indexes are only created by finish(), after all the rows are in, which
+    # is much faster than keeping them up to date during the load.
+    # Keywords are normalized: each distinct keyword is stored once (notes, which are
+    # mostly distinct, are stored with their keyword ranges), so the only things kept in
+    # memory between batches are the keywords, and the keyword lists' ids.
+    # Don't forget to call finish() when you're done.
+    BATCH_SIZE: int = 1 << 16  # keyword ranges
+    TRANSACTION_SIZE: int = 1 << 20  # keyword ranges
+
+    SCHEMA: tuple[str, ...] = (
+        # ref is the asset-clip's asset id, mediaPath and mediaDuration (seconds) are its
+        # asset's (NULL if the asset isn't in the library's resources)
+        'CREATE TABLE assets (id INTEGER PRIMARY KEY, name TEXT NOT NULL, ref TEXT,'
+        ' mediaPath TEXT, mediaDuration REAL)',
+        'CREATE TABLE keywords (id INTEGER PRIMARY KEY, keyword TEXT NOT NULL)',
+        # start and duration are exact (in units of 1/timescale seconds), startSeconds
+        # and endSeconds are for queries, year and month are as in the CSV, and note is
+        # NULL if there isn't one
+        'CREATE TABLE keywordRanges ('
+        'id INTEGER PRIMARY KEY, assetId INTEGER NOT NULL REFERENCES assets(id),'
+        ' start INTEGER NOT NULL, duration INTEGER NOT NULL, timescale INTEGER NOT NULL,'
+        ' startSeconds REAL NOT NULL, endSeconds REAL NOT NULL,'
+        ' year TEXT, month TEXT, note TEXT)',
+        # position is the keyword's position in the keyword range's keywords
+        'CREATE TABLE keywordRangeKeywords ('
+        'keywordRangeId INTEGER NOT NULL REFERENCES keywordRanges(id),'
+        ' keywordId INTEGER NOT NULL REFERENCES keywords(id), position INTEGER NOT NULL)',
+        # everything joined back together, with the time range formatted as in the CSV
+        # (for times under 24 hours), e.g.
+        #   SELECT * FROM keywordRangeDetails WHERE assetName = 'Clip 1' AND year = '1998'
+        'CREATE VIEW keywordRangeDetails AS SELECT'
+        ' r.id AS id, a.name AS assetName, a.mediaPath AS mediaPath,'
+        " printf('%d:%02d:%02d - %d:%02d:%02d',"
+        ' r.start / r.timescale / 3600, r.start / r.timescale / 60 % 60,'
+        ' r.start / r.timescale % 60,'
+        ' ((r.start + r.duration) / r.timescale + 1) / 3600,'
+        ' ((r.start + r.duration) / r.timescale + 1) / 60 % 60,'
+        ' ((r.start + r.duration) / r.timescale + 1) % 60) AS timeRange,'
+        ' r.startSeconds AS startSeconds, r.endSeconds AS endSeconds,'
+        " r.year AS year, r.month AS month, coalesce(r.note, '') AS note,"
+        " (SELECT group_concat(keyword, ', ') FROM (SELECT w.keyword AS keyword"
+        ' FROM keywordRangeKeywords k JOIN keywords w ON w.id = k.keywordId'
+        ' WHERE k.keywordRangeId = r.id ORDER BY k.position)) AS keywords'
+        ' FROM keywordRanges r JOIN assets a ON a.id = r.assetId',
+    )
+    INDEXES: tuple[str, ...] = (
+        'CREATE INDEX assetsName ON assets (name)',
+        'CREATE UNIQUE INDEX keywordsKeyword ON keywords (keyword)',
+        'CREATE INDEX keywordRangesAsset ON keywordRanges (assetId, startSeconds)',
+        'CREATE INDEX keywordRangesYearMonth ON keywordRanges (year, month)',
+        'CREATE INDEX keywordRangeKeywordsRange ON keywordRangeKeywords (keywordRangeId)',
+        'CREATE INDEX keywordRangeKeywordsKeyword ON keywordRangeKeywords (keywordId)',
+    )
+
+    def __init__(self, db: sqlite3.Connection):
+        # db should be a new (empty) database, opened with isolation_level=None
+        self.db: sqlite3.Connection = db
+        self.rowsWritten: int = 0  # keyword ranges
+        self._keywordIds: dict[str, int] = {}
+        # keywords tuple -> [(keywordId, position)], plus its year and month
+        self._keywordLists: dict[tuple[str, ...], tuple[list[tuple[int, int]], str, str]] = {}
+        self._numAssets: int = 0
+        self._uncommitted: int = 0
+        self._assets: list[tuple] = []
+        self._keywords: list[tuple[int, str]] = []
+        self._keywordRanges: list[tuple] = []
+        self._keywordRangeKeywords: list[tuple[int, int, int]] = []
+
+        # It's a new database: if we don't finish, there's nothing worth keeping anyway.
+        db.execute('PRAGMA journal_mode = OFF')
+        db.execute('PRAGMA synchronous = OFF')
+        for statement in self.SCHEMA:
+            db.execute(statement)
+        db.execute('BEGIN')
+
+    def writeAssetClip(self, assetClip: AssetClip):
+        self._numAssets += 1
+        assetId: int = self._numAssets
+        asset: AssetResource | None = assetClip.asset
+        if asset is not None:
+            self._assets.append((
+                assetId, assetClip.name, assetClip.ref or None, asset.mediaPath or None,
+                asset.duration / asset.timescale if asset.timescale > 0 else None
+            ))
+        else:
+            self._assets.append((assetId, assetClip.name, assetClip.ref or None, None, None))
+
+        keywordRanges: list[tuple] = self._keywordRanges
+        keywordRangeKeywords: list[tuple[int, int, int]] = self._keywordRangeKeywords
+        rangeId: int = self.rowsWritten
+        for kr in assetClip.keywordRanges:
+            rangeId += 1
+            keywordList: tuple[list[tuple[int, int]], str, str] | None = (
+                self._keywordLists.get(kr.keywords)
+            )
+            if keywordList is None:
+                keywordList = self._keywordList(kr.keywords)
+            keywordIdsAndPositions, year, month = keywordList
+
+            end: int = kr.start + kr.duration
+            keywordRanges.append((
+                rangeId, assetId, kr.start, kr.duration, kr.timescale,
+                kr.start / kr.timescale, end / kr.timescale,
+                year or None, month or None, kr.note or None
+            ))
+            for keywordId, position in keywordIdsAndPositions:
+                keywordRangeKeywords.append((rangeId, keywordId, position))
+
+        self.rowsWritten = rangeId
+        if len(keywordRanges) >= self.BATCH_SIZE:
+            self._insertBatch()
+
+    def finish(self):
+        # inserts the last batch, commits, and creates the indexes
+        self._insertBatch()
+        self.db.execute('COMMIT')
+        self.db.execute('BEGIN')
+        for statement in self.INDEXES:
+            self.db.execute(statement)
+        self.db.execute('COMMIT')
+        self.db.execute('ANALYZE')
+
+    def _keywordList(self, keywords: tuple[str, ...]) -> tuple[list[tuple[int, int]], str, str]:
+        keywordIdsAndPositions: list[tuple[int, int]] = []
+        for position, keyword in enumerate(keywords):
+            keywordId: int | None = self._keywordIds.get(keyword)
+            if keywordId is None:
+                keywordId = len(self._keywordIds) + 1
+                self._keywordIds[keyword] = keywordId
+                self._keywords.append((keywordId, keyword))
+            keywordIdsAndPositions.append((keywordId, position))
+        year, month = Utils.findYearAndMonth(keywords)
+        keywordList: tuple[list[tuple[int, int]], str, str] = (keywordIdsAndPositions, year, month)
+        self._keywordLists[keywords] = keywordList
+        return keywordList
+
+    def _insertBatch(self):
+        db: sqlite3.Connection = self.db
+        db.executemany('INSERT INTO assets VALUES (?, ?, ?, ?, ?)', self._assets)
+        db.executemany('INSERT INTO keywords VALUES (?, ?)', self._keywords)
+        db.executemany(
+            'INSERT INTO keywordRanges VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            self._keywordRanges
+        )
+        db.executemany('INSERT INTO keywordRangeKeywords VALUES (?, ?, ?)',
+            self._keywordRangeKeywords)
+
+        self._uncommitted += len(self._keywordRanges)
+        if self._uncommitted >= self.TRANSACTION_SIZE:
+            db.execute('COMMIT')
+            db.execute('BEGIN')
+            self._uncommitted = 0
+
+        self._assets = []
+        self._keywords = []
+        self._keywordRanges = []
+        self._keywordRangeKeywords = []
+
+
+class SQLiteSink(AssetClipSink):
+    # writes a new database through a SQLiteRowWriter (dbPath, if it exists, is only
+    # replaced if everything succeeds)
+    def __init__(self, dbPath: str | Path):
+        super().__init__(str(dbPath))
+        self.dbPath: Path = Path(dbPath)
+        self._db: sqlite3.Connection | None = None
+        self._rowWriter: SQLiteRowWriter | None = None
+
+    def open(self):
+        tempPath: Path = self.tempPath(self.dbPath)
+        tempPath.unlink(missing_ok=True)  # (left behind by a crash)
+        self._db = sqlite3.connect(tempPath, isolation_level=None)
+        try:
+            self._rowWriter = SQLiteRowWriter(self._db)
+        except sqlite3.Error:
+            self._db.close()
+            self._db = None
+            tempPath.unlink(missing_ok=True)
+            raise
+
+    def writeAssetClip(self, assetClip: AssetClip):
+        self._rowWriter.writeAssetClip(assetClip)
+
+    def close(self, success: bool):
+        if self._db is None:
+            return
+        written: bool = False
+        try:
+            if success:
+                self._rowWriter.finish()
+            self.rowsWritten = self._rowWriter.rowsWritten
+            self._db.close()
+            written = True
+        finally:
+            self._db.close()
+            self._db = None
+            self.replaceFile(self.dbPath, success and written)
+
+
+class AssetClipsSQLite:
+    def __init__(
+        self,
+        xml: str | Path | Element | AssetClipRecords,
+        cache: LibraryCache | None = None,
+        stats: Stats | None = None,
+        selector: AssetClipSelector | None = None
+    ):
+        # xml, cache, stats and selector are as for AssetClipsOutputs (xml is parsed
+        # while the database is being written, so only a single asset-clip, and a batch
+        # of rows, has to be in memory at a time).
+        # (imported here, because asset_clips_outputs imports this module)
+        from fcpxml.asset_clips_outputs import AssetClipsOutputs
+        self.outputs = AssetClipsOutputs(xml, cache, stats, selector)
+        self.parser: XMLParser | None = self.outputs.source.parser
+
+    def writeSQLite(self, dbPath: str | Path) -> bool:
+        # writes a new database (replacing dbPath, if it exists)
+        self.outputs.sinks = [SQLiteSink(dbPath)]
+        return self.outputs.write()
@@ -0,0 +1,273 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsWatcher watches a library export, and regenerates its CSV
+#                and/or report every time it is exported again, re-rendering only the
+#                asset-clips that changed since the last time.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import io
+import os
+import sys
+import time
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipExtractor
+from fcpxml.asset_clips_csv import CSVRowWriter
+from fcpxml.asset_clips_report import AssetClipsReport
+from fcpxml.resource_index import AssetResource
+from fcpxml.stats import Stats
+
+# an asset-clip's element digest, plus what its output uses of its asset
+_RenderedKey = tuple[bytes, str, int, int] | tuple[bytes]
+
+class RenderedAssetClip:
+    # An asset-clip's CSV rows and report section, exactly as they appear in the files.
+    __slots__ = ('csvRows', 'numRows', 'reportSection', 'numLines')
+
+    def __init__(self, csvRows: str, numRows: int, reportSection: str, numLines: int):
+        self.csvRows: str = csvRows
+        self.numRows: int = numRows
+        self.reportSection: str = reportSection
+        self.numLines: int = numLines
+
+
+class AssetClipsWatcher:
+    # AssetClipsWatcher polls xmlPath's modification time and size (no file system
+    # notification service needed) every interval seconds.  Once they have changed, and
+    # then stayed the same for debounce seconds (an export is written over a while, and
+    # some apps write twice), csvPath and/or reportPath are regenerated.  They are the
+    # same as AssetClipsCSV and AssetClipsReport would write.
+    #
+    # Each asset-clip's rendered CSV rows and report section are kept, keyed by a
+    # digest of its element (and its asset's media path and duration).  When xml is
+    # parsed again, only the asset-clips whose digest isn't known are extracted and
+    # rendered; the others are copied from the last time, so after a small edit the
+    # cost is the parse, plus the asset-clips that were touched.
+    # Only the last regeneration's asset-clips are kept.
+    #     watcher = AssetClipsWatcher('Info.fcpxml', csvPath='Info.csv')
+    #     watcher.watch()  # until interrupted
+    DEFAULT_INTERVAL: float = 1.
+    DEFAULT_DEBOUNCE: float = 2.
+
+    def __init__(
+        self,
+        xmlPath: str | Path,
+        csvPath: str | Path | None = None,
+        reportPath: str | Path | None = None,
+        interval: float = DEFAULT_INTERVAL,
+        debounce: float = DEFAULT_DEBOUNCE,
+        stats: Stats | None = None
+    ):
+        # If stats is passed in, every regeneration is recorded in it.
+        self.xmlPath: Path = Path(xmlPath)
+        self.csvPath: Path | None = Path(csvPath) if csvPath is not None else None
+        self.reportPath: Path | None = Path(reportPath) if reportPath is not None else None
+        self.interval: float = interval
+        self.debounce: float = debounce
+        self.stats: Stats | None = stats
+        # for the last regeneration
+        self.lastSuccess: bool = False
+        self.numRendered: int = 0
+        self.numReused: int = 0
+        self._rendered: dict[_RenderedKey, RenderedAssetClip] = {}
+        # (mtime, size) of the last export regenerated, and of the one waiting to be
+        self._generatedSignature: tuple[int, int] | None = None
+        self._pendingSignature: tuple[int, int] | None = None
+        self._pendingSince: float = 0.
+        # for rendering one asset-clip at a time
+        self._csvBuffer = io.StringIO()
+        self._csvWriter = CSVRowWriter(self._csvBuffer)
+        self._reportBuffer = io.StringIO()
+        self._reportWriter = Utils.TextWrapper(
+            self._reportBuffer, wrapIndent=AssetClipsReport.WRAP_INDENT
+        )
+
+    def watch(
+        self,
+        onRegenerate: t.Callable[['AssetClipsWatcher', bool], t.Any] | None = None,
+        maxRegenerations: int | None = None
+    ):
+        # Polls (and regenerates) until interrupted, or until maxRegenerations.  The
+        # outputs are generated at once if they are older than xmlPath (or missing).
+        # onRegenerate is called after each regeneration, with its success.
+        if not self._outputsOutOfDate():
+            self._generatedSignature = self._signature()
+        numRegenerations: int = 0
+        while maxRegenerations is None or numRegenerations < maxRegenerations:
+            if self.poll():
+                numRegenerations += 1
+                if onRegenerate is not None:
+                    onRegenerate(self, self.lastSuccess)
+                continue
+            time.sleep(self.interval)
+
+    def poll(self) -> bool:
+        # One look at xmlPath: returns True if it regenerated the outputs (see lastSuccess).
+        signature: tuple[int, int] | None = self._signature()
+        now: float = time.monotonic()
+        if signature is None or signature == self._generatedSignature:
+            # missing (e.g. in the middle of being replaced), or not changed
+            self._pendingSignature = None
+            return False
+        if signature != self._pendingSignature:
+            # changed (again): wait for it to settle
+            self._pendingSignature = signature
+            self._pendingSince = now
+            return False
+        if now - self._pendingSince < self.debounce:
+            return False
+
+        self.lastSuccess = self.regenerate()
+        # (even if it failed: don't try again until there is a new export)
+        self._generatedSignature = signature
+        self._pendingSignature = None
+        return True
+
+    def regenerate(self) -> bool:
+        # parses xmlPath, and writes the outputs (reusing what's unchanged)
+        parser = XMLParser(self.xmlPath, streaming=True, stats=self.stats)
+        if not parser.isValid:
+            return False
+
+        previous: dict[_RenderedKey, RenderedAssetClip] = self._rendered
+        current: dict[_RenderedKey, RenderedAssetClip] = {}
+        sections: list[RenderedAssetClip] = []
+        extractor = AssetClipExtractor()
+        extract: t.Callable[[Element], AssetClip] = extractor.assetClip
+        render: t.Callable[[AssetClip], RenderedAssetClip] = self._render
+        if self.stats is not None:
+            extract = self.stats.timed('extract', extract)
+            render = self.stats.timed('write', render)
+        self.numRendered = 0
+        self.numReused = 0
+
+        def assetClipCallback(_refcon: t.Any, assetClipEl: Element) -> bool:
+            key: _RenderedKey = self._key(assetClipEl, extractor.resources.asset(
+                assetClipEl.get('ref', '')
+            ))
+            rendered: RenderedAssetClip | None = current.get(key)
+            if rendered is None:
+                rendered = previous.get(key)
+                if rendered is None:
+                    rendered = render(extract(assetClipEl))
+                    self.numRendered += 1
+                else:
+                    self.numReused += 1
+                current[key] = rendered
+            else:
+                self.numReused += 1
+            sections.append(rendered)
+            return True  # please keep feeding me Elements
+
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+            **extractor.resources.callbacks(),
+            AssetClipExtractor.ASSET_CLIP_PATH: (assetClipCallback, None)
+        }
+        if not parser.parse(callbacks):
+            return False
+        self._rendered = current
+
+        start: float = time.perf_counter()
+        success: bool = True
+        if self.csvPath is not None:
+            success = self._writeCSV(sections) and success
+        if self.reportPath is not None:
+            success = self._writeReport(sections) and success
+        if self.stats is not None:
+            self.stats.addPhaseTime('write', time.perf_counter() - start)
+        return success
+
+    def _render(self, assetClip: AssetClip) -> RenderedAssetClip:
+        csvRows: str = ''
+        numRows: int = 0
+        if self.csvPath is not None:
+            rowsWritten: int = self._csvWriter.rowsWritten
+            self._csvWriter.writeAssetClip(assetClip)
+            self._csvWriter.flush()
+            csvRows = self._takeText(self._csvBuffer)
+            numRows = self._csvWriter.rowsWritten - rowsWritten
+
+        reportSection: str = ''
+        numLines: int = 0
+        if self.reportPath is not None:
+            linesWritten: int = self._reportWriter.linesWritten
+            AssetClipsReport.writeAssetClip(self._reportWriter, assetClip)
+            self._reportWriter.flush()
+            reportSection = self._takeText(self._reportBuffer)
+            numLines = self._reportWriter.linesWritten - linesWritten
+        return RenderedAssetClip(csvRows, numRows, reportSection, numLines)
+
+    def _writeCSV(self, sections: list[RenderedAssetClip]) -> bool:
+        text: list[str] = [CSVRowWriter.HEADER + '\n']
+        text.extend(section.csvRows for section in sections)
+        if not self._replace(self.csvPath, text):
+            return False
+        if self.stats is not None:
+            self.stats.rowsWritten += sum(section.numRows for section in sections)
+        return True
+
+    def _writeReport(self, sections: list[RenderedAssetClip]) -> bool:
+        if not self._replace(self.reportPath, [section.reportSection for section in sections]):
+            return False
+        if self.stats is not None:
+            self.stats.linesWritten += sum(section.numLines for section in sections)
+        return True
+
+    @staticmethod
+    def _replace(path: Path, text: list[str]) -> bool:
+        # Writes a temporary file, and then renames it to path, so that anyone reading
+        # path (e.g. a spreadsheet app) never sees half a file.
+        tempPath: Path = path.with_name(path.name + '.tmp')
+        try:
+            with open(tempPath, 'wt', encoding='utf-8') as f:
+                f.write(''.join(text))
+            os.replace(tempPath, path)
+        except OSError as e:
+            print(f'ERROR: failed to write: {path} ({e}).', file=sys.stderr)
+            tempPath.unlink(missing_ok=True)
+            return False
+        return True
+
+    @staticmethod
+    def _takeText(buffer: io.StringIO) -> str:
+        text: str = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    @staticmethod
+    def _key(assetClipEl: Element, asset: AssetResource | None) -> _RenderedKey:
+        digest: bytes = Utils.elementDigest(assetClipEl)
+        if asset is None:
+            return (digest,)
+        return (digest, asset.src, asset.duration, asset.timescale)
+
+    def _signature(self) -> tuple[int, int] | None:
+        try:
+            stat: os.stat_result = XMLParser.documentPath(self.xmlPath).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _outputsOutOfDate(self) -> bool:
+        try:
+            xmlTime: int = XMLParser.documentPath(self.xmlPath).stat().st_mtime_ns
+        except OSError:
+            return False
+        for outputPath in (self.csvPath, self.reportPath):
+            if outputPath is None:
+                continue
+            try:
+                if outputPath.stat().st_mtime_ns < xmlTime:
+                    return True
+            except OSError:
+                return True
+        return False
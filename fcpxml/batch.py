@@ -0,0 +1,164 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                AssetClipsBatch is a utility that processes many library exports at
+#                once, parsing them in parallel across a pool of worker processes, and
+#                writes a CSV and/or report per library, or one merged CSV/report.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import os
+import sys
+import typing as t
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+
+from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, AssetClipsSource
+from fcpxml.asset_clips_csv import CSVRowWriter
+from fcpxml.asset_clips_outputs import AssetClipsOutputs
+from fcpxml.asset_clips_report import AssetClipsReport
+
+# These run in the worker processes (so they must be module-level functions).
+
+def _extractAssetClips(xmlPath: str) -> list[AssetClip]:
+    source = AssetClipsSource(xmlPath)
+    assetClips: list[AssetClip] | None = source.assetClips()
+    if assetClips is None:
+        raise ValueError('failed to parse')
+    return assetClips
+
+def _writeOutputs(xmlPath: str, csvPath: str | None, reportPath: str | None) -> bool:
+    # The outputs are written by the worker, in a single (streaming) parse, so the
+    # asset-clips never have to be sent back to the main process, or all be in memory.
+    outputs = AssetClipsOutputs(xmlPath)
+    if csvPath is not None:
+        outputs.addCSV(csvPath)
+    if reportPath is not None:
+        outputs.addReport(reportPath)
+    if not outputs.write():
+        if outputs.failures:
+            raise ValueError(f'failed to write {outputs.failures[0][0].name}')
+        raise ValueError('failed to parse')
+    return True
+
+
+class _InProcessExecutor(Executor):
+    # for workers=1: same interface as a process pool, without the processes
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class AssetClipsBatch:
+    # Results (and merged output) are always in the order of xmlPaths, no matter
+    # which worker finishes first.  A library that fails doesn't stop the batch: it
+    # is reported on stderr and recorded in self.failures, as (xmlPath, reason).
+    def __init__(self, xmlPaths: t.Iterable[str | Path], workers: int | None = None):
+        self.xmlPaths: list[Path] = [Path(xmlPath) for xmlPath in xmlPaths]
+        self.workers: int = workers if workers is not None else (os.cpu_count() or 1)
+        self.failures: list[tuple[Path, str]] = []
+
+    def writeOutputs(
+        self,
+        outputDir: str | Path,
+        csv: bool = True,
+        report: bool = True
+    ) -> bool:
+        # writes <name>.csv and/or <name>.txt per library into outputDir (see outputNames)
+        # returns True if every library succeeded
+        outputDir = Path(outputDir)
+        outputDir.mkdir(parents=True, exist_ok=True)
+        names: list[str] = self.outputNames()
+        self.failures = []
+        with self._executor() as executor:
+            futures: list[Future] = [
+                executor.submit(
+                    _writeOutputs,
+                    str(xmlPath),
+                    str(outputDir / f'{name}.csv') if csv else None,
+                    str(outputDir / f'{name}.txt') if report else None,
+                )
+                for xmlPath, name in zip(self.xmlPaths, names)
+            ]
+            for xmlPath, future in zip(self.xmlPaths, futures):
+                self._result(xmlPath, future)
+        return not self.failures
+
+    def writeMergedCSV(self, csvPath: str | Path) -> bool:
+        # one CSV for all the libraries, with an extra (first) column: Library
+        # returns True if every library succeeded
+        names: list[str] = self.outputNames()
+        with open(csvPath, 'wt', encoding='utf-8') as f:
+            rowWriter = CSVRowWriter(f)
+            rowWriter.writeHeader(libraryColumn=True)
+            for name, assetClips in zip(names, self._extractAll()):
+                if assetClips is not None:
+                    for assetClip in assetClips:
+                        rowWriter.writeAssetClip(assetClip, library=name)
+            rowWriter.flush()
+        return not self.failures
+
+    def writeMergedReport(self, reportPath: str | Path) -> bool:
+        # one report for all the libraries, each starting with a '== name ==' line
+        # returns True if every library succeeded
+        names: list[str] = self.outputNames()
+        with open(reportPath, 'wt', encoding='utf-8') as f, \
+                Utils.TextWrapper(f, wrapIndent=AssetClipsReport.WRAP_INDENT) as out:
+            for name, assetClips in zip(names, self._extractAll()):
+                if assetClips is not None:
+                    out.writeLine(f'== {name} ==')
+                    AssetClipsReport.writeAssetClips(out, assetClips)
+        return not self.failures
+
+    def outputNames(self) -> list[str]:
+        # A name for each library, for output file names and the merged Library column.
+        # Library exports are usually all called Info.fcpxml, so if file names clash,
+        # the name of the containing folder is added, and then the position in the batch.
+        # (Lib.fcpxml, Lib.fcpxmld, Lib.fcpxml.gz and Lib.zip are all 'Lib')
+        names: list[str] = [
+            Path(xmlPath.stem).stem if xmlPath.suffix in ('.gz', '.zip') else xmlPath.stem
+            for xmlPath in self.xmlPaths
+        ]
+        if len(set(names)) != len(names):
+            names = [
+                f'{xmlPath.parent.name}-{name}' if names.count(name) > 1 else name
+                for xmlPath, name in zip(self.xmlPaths, names)
+            ]
+        if len(set(names)) != len(names):
+            names = [
+                f'{name}-{i + 1}' if names.count(name) > 1 else name
+                for i, name in enumerate(names)
+            ]
+        return names
+
+    def _extractAll(self) -> t.Iterator[list[AssetClip] | None]:
+        # yields each library's asset-clips (None if it failed) in order, as soon as
+        # that library (and all the ones before it) are done
+        self.failures = []
+        with self._executor() as executor:
+            futures: list[Future] = [
+                executor.submit(_extractAssetClips, str(xmlPath)) for xmlPath in self.xmlPaths
+            ]
+            for xmlPath, future in zip(self.xmlPaths, futures):
+                yield self._result(xmlPath, future)
+
+    def _result(self, xmlPath: Path, future: Future) -> t.Any:
+        try:
+            return future.result()
+        except Exception as e:
+            reason: str = str(e) or type(e).__name__
+            print(f'ERROR: {xmlPath}: {reason}', file=sys.stderr)
+            self.failures.append((xmlPath, reason))
+            return None
+
+    def _executor(self) -> Executor:
+        if self.workers <= 1:
+            return _InProcessExecutor()
+        return ProcessPoolExecutor(max_workers=self.workers)
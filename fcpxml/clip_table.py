@@ -0,0 +1,397 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                ClipTable is a compact, columnar table of a library's keyword ranges,
+#                for libraries too big to keep as AssetClip and KeywordRange records.
+#                ClipTableView is a slice or filtered subset of a ClipTable's rows.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import typing as t
+from array import array
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml.asset_clips import AssetClip, KeywordRange, AssetClipRecords, AssetClipSelector
+from fcpxml.asset_clips import AssetClipsSource
+from fcpxml.library_cache import LibraryCache
+from fcpxml.resource_index import AssetResource, FormatResource
+from fcpxml.stats import Stats
+
+# a view's rows: a range of row numbers, or (a slice of) an array of them
+_Rows = range | memoryview
+
+class StringPool:
+    # Strings, each stored once, as UTF-8 in a single bytearray: string i is
+    # data[offsets[i]:offsets[i + 1]].  String 0 is ''.  While building, a dict finds
+    # the strings that are already there; compact() drops it (after which add() still
+    # works, but doesn't share the strings added before).
+    OFFSET_TYPECODE: str = 'Q'
+
+    def __init__(self):
+        self.data: bytearray = bytearray()
+        self.offsets: array = array(self.OFFSET_TYPECODE, [0, 0])
+        self._ids: dict[str, int] = {'': 0}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def add(self, string: str) -> int:
+        stringId: int | None = self._ids.get(string)
+        if stringId is None:
+            stringId = len(self.offsets) - 1
+            self.data += string.encode('utf-8')
+            self.offsets.append(len(self.data))
+            self._ids[string] = stringId
+        return stringId
+
+    def get(self, stringId: int) -> str:
+        if stringId == 0:
+            return ''
+        return self.data[self.offsets[stringId]:self.offsets[stringId + 1]].decode('utf-8')
+
+    def compact(self):
+        self._ids = {'': 0}
+
+
+class ClipTable(AssetClipRecords):
+    # There is a row per keyword range, in document order, and every column is an array:
+    #   starts, durations, timescales   the time range, in exact integer ticks
+    #   rowAssetClips                   the row's asset-clip (index into the asset-clip
+    #                                   columns)
+    #   rowKeywordLists                 the row's keyword list: keyword list i is keywordIds
+    #                                   [keywordListOffsets[i]:keywordListOffsets[i + 1]],
+    #                                   which are indexes into vocabulary
+    #   rowNotes                        the row's note (an id in the notes pool)
+    # The asset-clip columns are assetClipNames and assetClipRefs (ids in the strings
+    # pool), assetClipAssets (index into the asset columns, -1 if the asset-clip has no
+    # asset) and assetClipRowStarts (asset-clip i's rows are assetClipRowStarts[i] up to
+    # assetClipRowStarts[i + 1]).  The asset columns are the AssetResource fields.
+    # Keywords, keyword lists, notes and other strings are stored once each, however
+    # many rows share them.  A row costs 36 bytes (instead of the hundreds of bytes of
+    # a KeywordRange, and of the objects it refers to).
+    # A ClipTable can be passed instead of XML to AssetClipsCSV, AssetClipsReport and
+    # AssetClipsSQLite (so can a ClipTableView).
+    # Call compact() when you're done appending (fromXML and fromAssetClips do).
+    TIME_TYPECODE: str = 'q'
+    INDEX_TYPECODE: str = 'I'
+    OPTIONAL_INDEX_TYPECODE: str = 'i'  # -1 for none
+
+    def __init__(self):
+        indexType: str = self.INDEX_TYPECODE
+        timeType: str = self.TIME_TYPECODE
+        self.starts: array = array(timeType)
+        self.durations: array = array(timeType)
+        self.timescales: array = array(timeType)
+        self.rowAssetClips: array = array(indexType)
+        self.rowKeywordLists: array = array(indexType)
+        self.rowNotes: array = array(indexType)
+
+        self.assetClipNames: array = array(indexType)
+        self.assetClipRefs: array = array(indexType)
+        self.assetClipAssets: array = array(self.OPTIONAL_INDEX_TYPECODE)
+        self.assetClipRowStarts: array = array(indexType, [0])
+
+        self.assetIds: array = array(indexType)
+        self.assetNames: array = array(indexType)
+        self.assetSrcs: array = array(indexType)
+        self.assetStarts: array = array(timeType)
+        self.assetDurations: array = array(timeType)
+        self.assetTimescales: array = array(timeType)
+        self.assetFormats: array = array(self.OPTIONAL_INDEX_TYPECODE)
+        self.formats: list[FormatResource] = []
+
+        self.vocabulary: list[str] = []
+        self.keywordIds: array = array(indexType)
+        self.keywordListOffsets: array = array(indexType, [0])
+        self.notes = StringPool()
+        self.strings = StringPool()
+
+        # for building (dropped by compact())
+        self._keywordListIds: dict[tuple[str, ...], int] = {}
+        # (an asset's fields, with its format's index) -> index
+        self._assetIndexes: dict[tuple[str, str, str, int, int, int, int], int] = {}
+        # (a format's fields) -> index
+        self._formatIndexes: dict[tuple[str, str, int, int, int, int], int] = {}
+        self._vocabularyIds: dict[str, int] = {}
+
+    @staticmethod
+    def fromXML(
+        xml: str | Path | Element,
+        cache: LibraryCache | None = None,
+        selector: AssetClipSelector | None = None,
+        stats: Stats | None = None
+    ) -> 'ClipTable | None':
+        # Returns None if xml could not be parsed.  xml is parsed incrementally, straight
+        # into the table, so there are never more than a few records in memory.
+        table = ClipTable()
+        source = AssetClipsSource(xml, cache, streaming=True, stats=stats, selector=selector)
+        if not source.isValid or not source.forEachAssetClip(table.append):
+            return None
+        table.compact()
+        return table
+
+    @staticmethod
+    def fromAssetClips(assetClips: t.Iterable[AssetClip]) -> 'ClipTable':
+        table = ClipTable()
+        for assetClip in assetClips:
+            table.append(assetClip)
+        table.compact()
+        return table
+
+    def append(self, assetClip: AssetClip):
+        assetClipIndex: int = len(self.assetClipNames)
+        self.assetClipNames.append(self.strings.add(assetClip.name))
+        self.assetClipRefs.append(self.strings.add(assetClip.ref))
+        self.assetClipAssets.append(self._addAsset(assetClip.asset))
+
+        keywordListIds: dict[tuple[str, ...], int] = self._keywordListIds
+        addNote: t.Callable[[str], int] = self.notes.add
+        for kr in assetClip.keywordRanges:
+            self.starts.append(kr.start)
+            self.durations.append(kr.duration)
+            self.timescales.append(kr.timescale)
+            self.rowAssetClips.append(assetClipIndex)
+            keywordListId: int | None = keywordListIds.get(kr.keywords)
+            if keywordListId is None:
+                keywordListId = self._addKeywordList(kr.keywords)
+            self.rowKeywordLists.append(keywordListId)
+            self.rowNotes.append(addNote(kr.note))
+
+        self.assetClipRowStarts.append(len(self.starts))
+
+    def compact(self):
+        # Drops the dictionaries used to share strings, keywords, keyword lists, notes and
+        # assets while appending.  More rows can still be appended, but they won't share
+        # those with the rows before.
+        self.notes.compact()
+        self.strings.compact()
+        self._keywordListIds = {}
+        self._vocabularyIds = {}
+        self._assetIndexes = {}
+        self._formatIndexes = {}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def numAssetClips(self) -> int:
+        return len(self.assetClipNames)
+
+    def keywords(self, row: int) -> tuple[str, ...]:
+        return self.keywordList(self.rowKeywordLists[row])
+
+    def keywordList(self, keywordListId: int) -> tuple[str, ...]:
+        vocabulary: list[str] = self.vocabulary
+        return tuple(
+            vocabulary[keywordId] for keywordId in self.keywordIds[
+                self.keywordListOffsets[keywordListId]:self.keywordListOffsets[keywordListId + 1]
+            ]
+        )
+
+    def note(self, row: int) -> str:
+        return self.notes.get(self.rowNotes[row])
+
+    def keywordRange(self, row: int) -> KeywordRange:
+        return KeywordRange(
+            self.starts[row],
+            self.durations[row],
+            self.timescales[row],
+            self.keywordList(self.rowKeywordLists[row]),
+            self.notes.get(self.rowNotes[row])
+        )
+
+    def assetName(self, row: int) -> str:
+        return self.strings.get(self.assetClipNames[self.rowAssetClips[row]])
+
+    def asset(self, assetIndex: int) -> AssetResource | None:
+        # (a new record each time)
+        if assetIndex < 0:
+            return None
+        formatIndex: int = self.assetFormats[assetIndex]
+        return AssetResource(
+            self.strings.get(self.assetIds[assetIndex]),
+            self.strings.get(self.assetNames[assetIndex]),
+            self.strings.get(self.assetSrcs[assetIndex]),
+            self.assetStarts[assetIndex],
+            self.assetDurations[assetIndex],
+            self.assetTimescales[assetIndex],
+            self.formats[formatIndex] if formatIndex >= 0 else None
+        )
+
+    def assetClip(self, assetClipIndex: int, rows: t.Iterable[int] | None = None) -> AssetClip:
+        # the asset-clip, with the keyword ranges of rows (default: all its rows)
+        if rows is None:
+            rows = range(
+                self.assetClipRowStarts[assetClipIndex], self.assetClipRowStarts[assetClipIndex + 1]
+            )
+        keywordRange: t.Callable[[int], KeywordRange] = self.keywordRange
+        return AssetClip(
+            self.strings.get(self.assetClipNames[assetClipIndex]),
+            [keywordRange(row) for row in rows],
+            None,
+            self.strings.get(self.assetClipRefs[assetClipIndex]),
+            self.asset(self.assetClipAssets[assetClipIndex])
+        )
+
+    def view(self) -> 'ClipTableView':
+        # all the rows
+        return ClipTableView(self, range(len(self.starts)))
+
+    def __getitem__(self, rows: slice) -> 'ClipTableView':
+        return self.view()[rows]
+
+    def filter(self, predicate: t.Callable[[int], bool]) -> 'ClipTableView':
+        return self.view().filter(predicate)
+
+    def select(self, selector: AssetClipSelector) -> 'ClipTableView':
+        return self.view().select(selector)
+
+    def assetClips(self) -> t.Iterator[AssetClip]:
+        # all the asset-clips (including any without keyword ranges), built one at a time
+        for assetClipIndex in range(len(self.assetClipNames)):
+            yield self.assetClip(assetClipIndex)
+
+    def _addKeywordList(self, keywords: tuple[str, ...]) -> int:
+        keywordListId: int = len(self.keywordListOffsets) - 1
+        vocabularyIds: dict[str, int] = self._vocabularyIds
+        for keyword in keywords:
+            keywordId: int | None = vocabularyIds.get(keyword)
+            if keywordId is None:
+                keywordId = len(self.vocabulary)
+                self.vocabulary.append(keyword)
+                vocabularyIds[keyword] = keywordId
+            self.keywordIds.append(keywordId)
+        self.keywordListOffsets.append(len(self.keywordIds))
+        self._keywordListIds[keywords] = keywordListId
+        return keywordListId
+
+    def _addAsset(self, asset: AssetResource | None) -> int:
+        # Assets (and formats) are shared by value: the records passed in can be new for
+        # every asset-clip (e.g. from another ClipTable), and they don't live any longer
+        # than the asset-clip, so their ids mean nothing once it's been appended.
+        if asset is None:
+            return -1
+        formatIndex: int = -1
+        assetFormat: FormatResource | None = asset.format
+        if assetFormat is not None:
+            formatKey: tuple[str, str, int, int, int, int] = (
+                assetFormat.id, assetFormat.name, assetFormat.frameDuration,
+                assetFormat.timescale, assetFormat.width, assetFormat.height
+            )
+            formatIndex = self._formatIndexes.get(formatKey, -1)
+            if formatIndex < 0:
+                formatIndex = len(self.formats)
+                self.formats.append(assetFormat)
+                self._formatIndexes[formatKey] = formatIndex
+
+        key: tuple[str, str, str, int, int, int, int] = (
+            asset.id, asset.name, asset.src, asset.start, asset.duration, asset.timescale,
+            formatIndex
+        )
+        assetIndex: int | None = self._assetIndexes.get(key)
+        if assetIndex is not None:
+            return assetIndex
+
+        assetIndex = len(self.assetIds)
+        self.assetIds.append(self.strings.add(asset.id))
+        self.assetNames.append(self.strings.add(asset.name))
+        self.assetSrcs.append(self.strings.add(asset.src))
+        self.assetStarts.append(asset.start)
+        self.assetDurations.append(asset.duration)
+        self.assetTimescales.append(asset.timescale)
+        self.assetFormats.append(formatIndex)
+        self._assetIndexes[key] = assetIndex
+        return assetIndex
+
+
+class ClipTableView(AssetClipRecords):
+    # Some of a ClipTable's rows (in ascending order), without copying any of the
+    # table's columns.  Slicing a view is free (it slices the range or memoryview of
+    # row numbers); filtering one makes a new array of row numbers (4 bytes per row).
+    def __init__(self, table: ClipTable, rows: _Rows):
+        self.table: ClipTable = table
+        self.rows: _Rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> t.Iterator[int]:
+        # the row numbers
+        return iter(self.rows)
+
+    def __getitem__(self, rows: slice) -> 'ClipTableView':
+        return ClipTableView(self.table, self.rows[rows])
+
+    def filter(self, predicate: t.Callable[[int], bool]) -> 'ClipTableView':
+        # the rows (row numbers) for which predicate returns True
+        return self._view(row for row in self.rows if predicate(row))
+
+    def select(self, selector: AssetClipSelector) -> 'ClipTableView':
+        # The rows that selector selects (see AssetClipSelector; the table doesn't know
+        # which event a row is in, so selector.eventNames is ignored).
+        table: ClipTable = self.table
+        selector.reset()
+        rowAssetClips: array = table.rowAssetClips
+        rowKeywordLists: array = table.rowKeywordLists
+        rowNotes: array = table.rowNotes
+        selectsKeywordRanges: bool = selector.selectsKeywordRanges
+        # (keyword list id, has a note) -> does it match
+        keywordListMatches: dict[tuple[int, bool], bool] = {}
+
+        def selectedRows() -> t.Iterator[int]:
+            currAssetClip: int = -1
+            nameMatches: bool = False
+            counted: bool = False
+            for row in self.rows:
+                assetClipIndex: int = rowAssetClips[row]
+                if assetClipIndex != currAssetClip:
+                    if selector.isFull:
+                        return
+                    currAssetClip = assetClipIndex
+                    nameMatches = selector.matchesName(
+                        table.strings.get(table.assetClipNames[assetClipIndex])
+                    )
+                    counted = False
+                if not nameMatches:
+                    continue
+                if selectsKeywordRanges:
+                    key: tuple[int, bool] = (rowKeywordLists[row], rowNotes[row] != 0)
+                    matches: bool | None = keywordListMatches.get(key)
+                    if matches is None:
+                        # (only whether there is a note matters)
+                        matches = selector.matchesKeywordRange(
+                            table.keywords(row), 'note' if key[1] else ''
+                        )
+                        keywordListMatches[key] = matches
+                    if not matches:
+                        continue
+                if not counted:
+                    counted = True
+                    selector.numSelected += 1
+                yield row
+
+        return self._view(selectedRows())
+
+    def assetClips(self) -> t.Iterator[AssetClip]:
+        # The asset-clips of the rows (each with just the keyword ranges of its rows, so
+        # asset-clips without any rows in the view aren't there), built one at a time.
+        table: ClipTable = self.table
+        rowAssetClips: array = table.rowAssetClips
+        currAssetClip: int = -1
+        rows: list[int] = []
+        for row in self.rows:
+            assetClipIndex: int = rowAssetClips[row]
+            if assetClipIndex != currAssetClip:
+                if rows:
+                    yield table.assetClip(currAssetClip, rows)
+                currAssetClip = assetClipIndex
+                rows = []
+            rows.append(row)
+        if rows:
+            yield table.assetClip(currAssetClip, rows)
+
+    def _view(self, rows: t.Iterable[int]) -> 'ClipTableView':
+        return ClipTableView(self.table, memoryview(array(ClipTable.INDEX_TYPECODE, rows)))
@@ -0,0 +1,362 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                KeywordIndex is a queryable index of a library's keyword ranges: which
+#                asset-clips have a keyword (in a particular year and/or month), and which
+#                keyword ranges of an asset overlap a particular time range.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import bisect
+import math
+import pickle
+import sys
+import typing as t
+import zlib
+from array import array
+from fractions import Fraction
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+from fcpxml import Utils
+from fcpxml.asset_clips import AssetClip, KeywordRange, AssetClipsSource
+from fcpxml.library_cache import LibraryCache
+
+# A list of keyword range ids (their position in the library), in increasing order.
+_Postings = array
+
+# An interval tree node: (center, left, right, byStart, byEnd).  byStart and byEnd are
+# the (start, end, rangeId) intervals that contain center, sorted by start (ascending)
+# and by end (descending).  left and right are the subtrees (None if empty) of the
+# intervals that end before center, and that start after center.
+_IntervalNode = tuple[int, 'tuple | None', 'tuple | None', list, list]
+
+class KeywordIndex:
+    # Every keyword range in the library gets an id (its position, in document order).
+    # There are postings lists (sorted arrays of ids) for each keyword, each year and
+    # each month (the year and month facets use the same rules as the report: see
+    # Utils.isYear and Utils.isMonth; a range of years like '1998-2001' is in each of
+    # those years).  A query intersects postings lists by looking up each id of the
+    # shortest list in the others (or, for lists of similar length, by set intersection),
+    # so it never scans the library.
+    # For time queries, each asset name has a (centered) interval tree of its keyword
+    # ranges, with times in units of 1/timescale seconds (exactly).  Zero-length keyword
+    # ranges are instants, not intervals: they are kept in a list sorted by time instead.
+    # Bump FORMAT_VERSION whenever what save() writes changes.
+    FORMAT_VERSION: int = 3
+    POSTINGS_TYPECODE: str = 'I'
+    # intersect with a longer postings list by binary search if it is this many times longer
+    BISECT_RATIO: int = 16
+
+    def __init__(self, assetClips: list[AssetClip]):
+        self.assetClips: list[AssetClip] = assetClips
+        # indexed by keyword range id
+        self._ranges: list[KeywordRange] = []
+        self._rangeAssetClips: _Postings = array(self.POSTINGS_TYPECODE)
+        self._byKeyword: dict[str, _Postings] = {}
+        self._byYear: dict[int, _Postings] = {}
+        self._byMonth: dict[str, _Postings] = {}
+        # asset name -> (timescale, interval tree, [(instant, rangeId)] sorted)
+        self._intervals: dict[
+            str, tuple[int, _IntervalNode | None, list[tuple[int, int]]]
+        ] = {}
+        self._build()
+
+    @staticmethod
+    def fromXML(
+        xml: str | Path | Element,
+        cache: LibraryCache | None = None
+    ) -> 'KeywordIndex | None':
+        # returns None if xml could not be parsed
+        source = AssetClipsSource(xml, cache, streaming=True)
+        if not source.isValid:
+            return None
+        assetClips: list[AssetClip] | None = source.assetClips()
+        if assetClips is None:
+            return None
+        return KeywordIndex(assetClips)
+
+    def keywords(self) -> dict[str, int]:
+        # every keyword, with its number of keyword ranges
+        return {keyword: len(postings) for keyword, postings in self._byKeyword.items()}
+
+    def years(self) -> list[int]:
+        return sorted(self._byYear)
+
+    def months(self) -> list[str]:
+        return [month for month in Utils.MONTHS_ABBREV if month in self._byMonth]
+
+    def find(
+        self,
+        keyword: str | None = None,
+        year: int | str | None = None,
+        month: str | None = None
+    ) -> list[tuple[AssetClip, KeywordRange]]:
+        # The keyword ranges (with their asset-clips) that have keyword, and are in
+        # year and month (each of which is optional), in document order.
+        postingsLists: list[_Postings] = []
+        empty: _Postings = array(self.POSTINGS_TYPECODE)
+        if keyword is not None:
+            postingsLists.append(self._byKeyword.get(keyword, empty))
+        if year is not None:
+            postingsLists.append(self._byYear.get(int(year), empty))
+        if month is not None:
+            postingsLists.append(self._byMonth.get(month, empty))
+
+        ids: t.Iterable[int]
+        if postingsLists:
+            ids = self._intersection(postingsLists)
+        else:
+            ids = range(len(self._ranges))
+        return [(self.assetClips[self._rangeAssetClips[i]], self._ranges[i]) for i in ids]
+
+    def findAssetClips(
+        self,
+        keyword: str | None = None,
+        year: int | str | None = None,
+        month: str | None = None
+    ) -> list[AssetClip]:
+        # the asset-clips that have at least one keyword range that matches (see find)
+        output: list[AssetClip] = []
+        seen: set[int] = set()
+        for assetClip, _ in self.find(keyword, year, month):
+            if id(assetClip) not in seen:
+                seen.add(id(assetClip))
+                output.append(assetClip)
+        return output
+
+    def overlapping(
+        self,
+        assetName: str,
+        start: Fraction | int | float | str,
+        end: Fraction | int | float | str
+    ) -> list[KeywordRange]:
+        # The keyword ranges of asset-clips named assetName that overlap [start, end),
+        # sorted by start time.  start and end are seconds, or strings like '0:12:00'
+        # (see Utils.parseSeconds).  A keyword range overlaps if it starts before end
+        # and ends after start.  Zero-length ones are instants: one overlaps if
+        # start <= it < end.  If start == end, the query is the instant start: the
+        # keyword ranges that contain it (and the instants equal to it) are returned.
+        startSeconds: Fraction | None = self._seconds(start)
+        endSeconds: Fraction | None = self._seconds(end)
+        if startSeconds is None or endSeconds is None:
+            print(f'ERROR: invalid time range: {start} - {end}.', file=sys.stderr)
+            return []
+
+        timescale, tree, instants = self._intervals.get(assetName, (1, None, []))
+        if startSeconds > endSeconds:
+            return []
+
+        found: list[tuple[int, int]] = []  # (start, rangeId)
+        queryStart: Fraction = startSeconds * timescale
+        queryEnd: Fraction = endSeconds * timescale
+        lo: int = bisect.bisect_left(instants, queryStart, key=lambda instant: instant[0])
+        hi: int
+        if queryStart == queryEnd:
+            hi = bisect.bisect_right(instants, queryEnd, key=lambda instant: instant[0])
+            # (the keyword ranges' times are integers, so those that start at or before
+            # the instant are those that start before the next integer)
+            queryEnd = Fraction(math.floor(queryEnd) + 1)
+        else:
+            hi = bisect.bisect_left(instants, queryEnd, key=lambda instant: instant[0])
+        found.extend(instants[lo:hi])
+        if tree is not None:
+            self._query(tree, queryStart, queryEnd, found)
+        found.sort()
+        return [self._ranges[rangeId] for _, rangeId in found]
+
+    def save(self, indexPath: str | Path) -> bool:
+        # The whole index (including the asset-clips), so that load() doesn't have to
+        # parse anything, or rebuild anything.
+        state: tuple = (
+            [
+                (
+                    assetClip.name,
+                    [
+                        (kr.start, kr.duration, kr.timescale, kr.keywords, kr.note)
+                        for kr in assetClip.keywordRanges
+                    ],
+                    assetClip.ref,
+                    assetClip.asset
+                )
+                for assetClip in self.assetClips
+            ],
+            self._rangeAssetClips,
+            self._byKeyword,
+            self._byYear,
+            self._byMonth,
+            self._intervals,
+        )
+        try:
+            with open(indexPath, 'wb') as f:
+                f.write(zlib.compress(pickle.dumps(
+                    (self.FORMAT_VERSION, state), protocol=pickle.HIGHEST_PROTOCOL
+                ), 6))
+        except OSError as e:
+            print(f'ERROR: failed to write keyword index: {indexPath} ({e}).', file=sys.stderr)
+            return False
+        return True
+
+    @staticmethod
+    def load(indexPath: str | Path) -> 'KeywordIndex | None':
+        # returns None if the file can't be read, or is from a different FORMAT_VERSION
+        try:
+            with open(indexPath, 'rb') as f:
+                version, state = pickle.loads(zlib.decompress(f.read()))
+        except Exception as e:
+            print(f'ERROR: failed to read keyword index: {indexPath} ({e}).', file=sys.stderr)
+            return None
+        if version != KeywordIndex.FORMAT_VERSION:
+            print(f'ERROR: keyword index is out of date: {indexPath}.', file=sys.stderr)
+            return None
+
+        rows, rangeAssetClips, byKeyword, byYear, byMonth, intervals = state
+        index: KeywordIndex = KeywordIndex.__new__(KeywordIndex)
+        index.assetClips = [
+            AssetClip(name, [KeywordRange(*kr) for kr in keywordRanges], None, ref, asset)
+            for name, keywordRanges, ref, asset in rows
+        ]
+        index._ranges = [kr for assetClip in index.assetClips for kr in assetClip.keywordRanges]
+        index._rangeAssetClips = rangeAssetClips
+        index._byKeyword = byKeyword
+        index._byYear = byYear
+        index._byMonth = byMonth
+        index._intervals = intervals
+        return index
+
+    def _build(self):
+        typecode: str = self.POSTINGS_TYPECODE
+        # keywords tuple -> the postings lists its keyword ranges go in (keywords tuples are
+        # shared between keyword ranges, see AssetClipExtractor, so each is looked at once)
+        facets: dict[tuple[str, ...], list[_Postings]] = {}
+        # asset name -> [(start, end, timescale, rangeId)]
+        assetRanges: dict[str, list[tuple[int, int, int, int]]] = {}
+
+        rangeId: int = 0
+        for assetIndex, assetClip in enumerate(self.assetClips):
+            ranges: list[tuple[int, int, int, int]] = assetRanges.setdefault(assetClip.name, [])
+            for kr in assetClip.keywordRanges:
+                self._ranges.append(kr)
+                self._rangeAssetClips.append(assetIndex)
+                ranges.append((kr.start, kr.start + kr.duration, kr.timescale, rangeId))
+
+                postingsLists: list[_Postings] | None = facets.get(kr.keywords)
+                if postingsLists is None:
+                    postingsLists = self._postingsFor(kr.keywords, typecode)
+                    facets[kr.keywords] = postingsLists
+                for postings in postingsLists:
+                    postings.append(rangeId)
+                rangeId += 1
+
+        for name, ranges in assetRanges.items():
+            timescale: int = math.lcm(*[ts for _, _, ts, _ in ranges]) if ranges else 1
+            intervals: list[tuple[int, int, int]] = []
+            instants: list[tuple[int, int]] = []
+            for start, end, ts, i in ranges:
+                if start == end:
+                    instants.append((start * (timescale // ts), i))
+                else:
+                    intervals.append((start * (timescale // ts), end * (timescale // ts), i))
+            instants.sort()
+            self._intervals[name] = (timescale, self._buildTree(intervals), instants)
+
+    def _postingsFor(self, keywords: tuple[str, ...], typecode: str) -> list[_Postings]:
+        # the postings lists a keyword range with these keywords goes in (each only once)
+        postingsLists: dict[int, _Postings] = {}
+        for keyword in keywords:
+            postings: _Postings = self._byKeyword.setdefault(keyword, array(typecode))
+            postingsLists[id(postings)] = postings
+            if Utils.isYear(keyword):
+                firstYear, _, lastYear = keyword.partition('-')
+                for year in range(int(firstYear), int(lastYear or firstYear) + 1):
+                    postings = self._byYear.setdefault(year, array(typecode))
+                    postingsLists[id(postings)] = postings
+            elif Utils.isMonth(keyword):
+                postings = self._byMonth.setdefault(keyword, array(typecode))
+                postingsLists[id(postings)] = postings
+        return list(postingsLists.values())
+
+    @staticmethod
+    def _intersection(postingsLists: list[_Postings]) -> list[int]:
+        # Starting with the shortest list, each other list either gets intersected with
+        # a set (when it's not much longer, that's fastest), or has each remaining id
+        # looked up in it (binary search, when it's much longer).
+        postingsLists = sorted(postingsLists, key=len)
+        output: list[int] = list(postingsLists[0])
+        for postings in postingsLists[1:]:
+            if not output:
+                break
+            if len(postings) <= KeywordIndex.BISECT_RATIO * len(output):
+                output = sorted(set(output).intersection(postings))
+                continue
+            remaining: list[int] = []
+            lo: int = 0
+            for i in output:
+                lo = bisect.bisect_left(postings, i, lo)
+                if lo == len(postings):
+                    break
+                if postings[lo] == i:
+                    remaining.append(i)
+            output = remaining
+        return output
+
+    @staticmethod
+    def _buildTree(intervals: list[tuple[int, int, int]]) -> _IntervalNode | None:
+        # intervals are (start, end, rangeId)
+        if not intervals:
+            return None
+        starts: list[int] = sorted(start for start, _, _ in intervals)
+        center: int = starts[len(starts) // 2]
+        left: list[tuple[int, int, int]] = []
+        right: list[tuple[int, int, int]] = []
+        here: list[tuple[int, int, int]] = []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        return (
+            center,
+            KeywordIndex._buildTree(left),
+            KeywordIndex._buildTree(right),
+            sorted(here),
+            sorted(here, key=lambda interval: interval[1], reverse=True),
+        )
+
+    @staticmethod
+    def _query(
+        node: _IntervalNode | None,
+        start: Fraction,
+        end: Fraction,
+        found: list[tuple[int, int]]
+    ):
+        # appends (start, rangeId) of the intervals overlapping [start, end) to found.
+        # Every interval at a node contains its center.
+        while node is not None:
+            center, left, right, byStart, byEnd = node
+            if end <= center:
+                for intervalStart, _, rangeId in byStart:
+                    if intervalStart >= end:
+                        break
+                    found.append((intervalStart, rangeId))
+                node = left
+            elif start >= center:
+                for intervalStart, intervalEnd, rangeId in byEnd:
+                    if intervalEnd <= start:
+                        break
+                    found.append((intervalStart, rangeId))
+                node = right
+            else:
+                found.extend((intervalStart, rangeId) for intervalStart, _, rangeId in byStart)
+                KeywordIndex._query(left, start, end, found)
+                node = right
+
+    @staticmethod
+    def _seconds(time: Fraction | int | float | str) -> Fraction | None:
+        if isinstance(time, str):
+            return Utils.parseSeconds(time)
+        return Fraction(time)
@@ -0,0 +1,192 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                LibraryCache is a persistent (SQLite) cache of the asset-clips
+#                extracted from library files, so that generating several outputs from
+#                an unchanged library only has to parse it once.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from fcpxml import XMLParser
+from fcpxml.asset_clips import AssetClip, KeywordRange
+
+# A library file's cache key: (path, size, mtime in ns, content hash), as they were
+# before it was parsed.
+LibraryKey = tuple[str, int, int, str]
+
+class LibraryCache:
+    # Entries are keyed by a hash of the file's contents.  A second table remembers
+    # each file's path, size and mtime with the content hash we computed for it, so
+    # that a file that hasn't changed doesn't even need to be re-hashed.  When the
+    # total size of the entries goes over maxBytes, the least recently used ones are
+    # evicted.
+    # Get a file's key (once) before parsing it, and pass it to load and store:
+    #     key = cache.key(xmlPath)
+    #     assetClips = cache.load(key) if key is not None else None
+    #     if assetClips is None:
+    #         (parse and extract assetClips)
+    #         cache.store(key, assetClips)
+    # so that what is stored is keyed by the file that was parsed, even if it has been
+    # exported again since (store doesn't store anything if the file has changed).
+    # Bump FORMAT_VERSION whenever the records (or how they are stored) change.
+    FORMAT_VERSION: int = 2
+    DEFAULT_MAX_BYTES: int = 512 << 20
+
+    def __init__(self, cachePath: str | Path | None = None, maxBytes: int = DEFAULT_MAX_BYTES):
+        if cachePath is None:
+            cachePath = LibraryCache.defaultCachePath()
+        self.cachePath: Path = Path(cachePath)
+        self.maxBytes: int = maxBytes
+        self.cachePath.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.cachePath)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'hash TEXT PRIMARY KEY, version INTEGER, size INTEGER, lastUsed REAL, data BLOB)'
+            )
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)'
+            )
+
+    @staticmethod
+    def defaultCachePath() -> Path:
+        cacheHome: str = os.environ.get('XDG_CACHE_HOME', '') or str(Path.home() / '.cache')
+        return Path(cacheHome) / 'fcpxml' / 'library-cache.sqlite'
+
+    def close(self):
+        self._db.close()
+
+    def key(self, xmlPath: str | Path) -> LibraryKey | None:
+        # returns None if the file can't be read
+        path: str = str(XMLParser.documentPath(xmlPath).resolve())
+        try:
+            stat: os.stat_result = os.stat(path)
+        except OSError:
+            return None
+        contentHash: str | None = self._contentHash(path, stat)
+        if contentHash is None:
+            return None
+        return (path, stat.st_size, stat.st_mtime_ns, contentHash)
+
+    def load(self, key: LibraryKey) -> list[AssetClip] | None:
+        # returns the cached asset-clips for this file, or None if it isn't cached
+        contentHash: str = key[3]
+        row = self._db.execute(
+            'SELECT data FROM entries WHERE hash = ? AND version = ?',
+            (contentHash, self.FORMAT_VERSION)
+        ).fetchone()
+        if row is None:
+            return None
+
+        with self._db:
+            self._db.execute(
+                'UPDATE entries SET lastUsed = ? WHERE hash = ?', (time.time(), contentHash)
+            )
+        try:
+            return self._decode(row[0])
+        except Exception as e:
+            print(f'Warning: ignoring unreadable library cache entry ({e}).', file=sys.stderr)
+            return None
+
+    def store(self, key: LibraryKey, assetClips: list[AssetClip]):
+        # (assetClips must be from the file as it was when key was computed)
+        path, size, mtime, contentHash = key
+        try:
+            stat: os.stat_result = os.stat(path)
+        except OSError:
+            return
+        if stat.st_size != size or stat.st_mtime_ns != mtime:
+            print(f'Warning: not caching {path}, it changed while it was being parsed.',
+                file=sys.stderr)
+            return
+        data: bytes = self._encode(assetClips)
+        if len(data) > self.maxBytes:
+            return
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (hash, version, size, lastUsed, data)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (contentHash, self.FORMAT_VERSION, len(data), time.time(), data)
+            )
+            self._evict()
+
+    def clear(self):
+        with self._db:
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM files')
+
+    def _evict(self):
+        # delete least recently used entries until we're under maxBytes
+        total: int = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        evicted: list[str] = []
+        for contentHash, size in self._db.execute(
+                'SELECT hash, size FROM entries ORDER BY lastUsed').fetchall():
+            if total <= self.maxBytes:
+                break
+            evicted.append(contentHash)
+            total -= size
+        self._db.executemany('DELETE FROM entries WHERE hash = ?', [(h,) for h in evicted])
+        self._db.executemany('DELETE FROM files WHERE hash = ?', [(h,) for h in evicted])
+
+    def _contentHash(self, path: str, stat: os.stat_result) -> str | None:
+        # returns None if the file can't be read
+        row = self._db.execute(
+            'SELECT size, mtime, hash FROM files WHERE path = ?', (path,)
+        ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        hasher = hashlib.blake2b(digest_size=20)
+        try:
+            with open(path, 'rb') as f:
+                while chunk := f.read(1 << 20):
+                    hasher.update(chunk)
+        except OSError:
+            return None
+        contentHash: str = hasher.hexdigest()
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime_ns, contentHash)
+            )
+        return contentHash
+
+    @staticmethod
+    def _encode(assetClips: list[AssetClip]) -> bytes:
+        # Plain tuples pickle much smaller than the records themselves, and pickle
+        # only stores each shared (interned) keywords tuple once.
+        rows: list[tuple] = [
+            (
+                assetClip.name,
+                [
+                    (kr.start, kr.duration, kr.timescale, kr.keywords, kr.note)
+                    for kr in assetClip.keywordRanges
+                ],
+                assetClip.ref,
+                assetClip.asset
+            )
+            for assetClip in assetClips
+        ]
+        return zlib.compress(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL), 6)
+
+    @staticmethod
+    def _decode(data: bytes) -> list[AssetClip]:
+        rows: list[tuple] = pickle.loads(zlib.decompress(data))
+        return [
+            AssetClip(name, [KeywordRange(*kr) for kr in keywordRanges], None, ref, asset)
+            for name, keywordRanges, ref, asset in rows
+        ]
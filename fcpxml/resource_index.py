@@ -0,0 +1,173 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                ResourceIndex is an id-keyed index of a library's resources (assets,
+#                with their media-reps, and formats), so that asset-clips can be joined
+#                to their media through their 'ref' attribute.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import math
+import typing as t
+from urllib.parse import unquote, urlparse
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+
+class FormatResource:
+    # A './resources/format' element.  frameDuration is exact: frameDuration/timescale
+    # seconds (0 if the format doesn't have one).
+    __slots__ = ('id', 'name', 'frameDuration', 'timescale', 'width', 'height')
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        frameDuration: int,
+        timescale: int,
+        width: int,
+        height: int
+    ):
+        self.id: str = id
+        self.name: str = name
+        self.frameDuration: int = frameDuration
+        self.timescale: int = timescale
+        self.width: int = width
+        self.height: int = height
+
+    def __repr__(self) -> str:
+        return f'FormatResource({self.id!r}, {self.name!r}, {self.width}x{self.height})'
+
+
+class AssetResource:
+    # A './resources/asset' element.  src is the URL of the asset's original media
+    # (from its media-rep, or its own src attribute in older versions of FCPXML), and
+    # start and duration are exact: they are integer counts of 1/timescale seconds.
+    __slots__ = ('id', 'name', 'src', 'start', 'duration', 'timescale', 'format')
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        src: str,
+        start: int,
+        duration: int,
+        timescale: int,
+        format: FormatResource | None = None
+    ):
+        self.id: str = id
+        self.name: str = name
+        self.src: str = src
+        self.start: int = start
+        self.duration: int = duration
+        self.timescale: int = timescale
+        self.format: FormatResource | None = format
+
+    @property
+    def mediaPath(self) -> str:
+        # the path of a 'file:' src (src itself, if it isn't a file URL)
+        if not self.src.startswith('file:'):
+            return self.src
+        return unquote(urlparse(self.src).path)
+
+    @property
+    def durationText(self) -> str:
+        # e.g. '0:01:17' (rounded up to the next whole second, like the end of a time range)
+        if self.timescale <= 0:
+            return ''
+        return Utils.formatSeconds(-(-self.duration // self.timescale))
+
+    def __repr__(self) -> str:
+        return f'AssetResource({self.id!r}, {self.name!r}, {self.src!r})'
+
+
+class ResourceIndex:
+    # ResourceIndex is filled in by parse callbacks (see callbacks()), so it can be built
+    # in the same pass as everything else: resources come before the library in an
+    # FCPXML document, so by the time the first asset-clip is called back, all of its
+    # resources are in the index.  Lookups are a dict access (no findall per clip).
+    ASSET_PATH: str = './resources/asset'
+    FORMAT_PATH: str = './resources/format'
+    ORIGINAL_MEDIA: str = 'original-media'
+
+    def __init__(self):
+        self.assets: dict[str, AssetResource] = {}
+        self.formats: dict[str, FormatResource] = {}
+
+    def asset(self, ref: str) -> AssetResource | None:
+        return self.assets.get(ref)
+
+    def format(self, ref: str) -> FormatResource | None:
+        return self.formats.get(ref)
+
+    def callbacks(self) -> dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]]:
+        # add these to the callbacks passed to XMLParser.parse
+        return {
+            self.FORMAT_PATH: (ResourceIndex._formatCallback, self),
+            self.ASSET_PATH: (ResourceIndex._assetCallback, self),
+        }
+
+    @staticmethod
+    def fromParser(parser: XMLParser) -> 'ResourceIndex | None':
+        # returns None if parsing failed
+        resources = ResourceIndex()
+        if not parser.parse(resources.callbacks()):
+            return None
+        return resources
+
+    def addFormat(self, formatEl: Element) -> FormatResource:
+        frameDuration, timescale = Utils.parseTime(formatEl.get('frameDuration', ''))
+        if not formatEl.get('frameDuration'):
+            frameDuration = timescale = 0
+        formatResource = FormatResource(
+            formatEl.get('id', ''),
+            formatEl.get('name', ''),
+            frameDuration,
+            timescale,
+            int(formatEl.get('width', '0')),
+            int(formatEl.get('height', '0'))
+        )
+        self.formats[formatResource.id] = formatResource
+        return formatResource
+
+    def addAsset(self, assetEl: Element) -> AssetResource:
+        src: str = assetEl.get('src', '')
+        for mediaRepEl in assetEl.iterfind('media-rep'):
+            if mediaRepEl.get('kind', self.ORIGINAL_MEDIA) == self.ORIGINAL_MEDIA:
+                src = mediaRepEl.get('src', src)
+                break
+            if not src:
+                src = mediaRepEl.get('src', '')
+
+        startNum, startDen = Utils.parseTime(assetEl.get('start', ''))
+        durNum, durDen = Utils.parseTime(assetEl.get('duration', ''))
+        timescale: int = startDen
+        if durDen != startDen:
+            timescale = math.lcm(startDen, durDen)
+            startNum *= timescale // startDen
+            durNum *= timescale // durDen
+
+        assetResource = AssetResource(
+            assetEl.get('id', ''),
+            assetEl.get('name', ''),
+            src,
+            startNum,
+            durNum,
+            timescale,
+            self.formats.get(assetEl.get('format', ''))
+        )
+        self.assets[assetResource.id] = assetResource
+        return assetResource
+
+    @staticmethod
+    def _formatCallback(resources: 'ResourceIndex', formatEl: Element) -> bool:
+        resources.addFormat(formatEl)
+        return True  # please keep feeding me Elements
+
+    @staticmethod
+    def _assetCallback(resources: 'ResourceIndex', assetEl: Element) -> bool:
+        resources.addAsset(assetEl)
+        return True  # please keep feeding me Elements
@@ -0,0 +1,143 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Stats is the (opt-in) instrumentation of parsing and writing: where the
+#                time went (reading, decoding, XML parsing, matching, callbacks, writing),
+#                and how much work was done.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import time
+import typing as t
+
+# A hook is called as hook(event, name, seconds) every time some time is recorded:
+# event is 'phase' (name is the phase) or 'callback' (name is the callback key).
+StatsHook = t.Callable[[str, str, float], None]
+
+class CallbackStats:
+    __slots__ = ('count', 'totalSeconds', 'maxSeconds')
+
+    def __init__(self):
+        self.count: int = 0
+        self.totalSeconds: float = 0.
+        self.maxSeconds: float = 0.
+
+    def __repr__(self) -> str:
+        return (
+            f'CallbackStats({self.count} calls, {self.totalSeconds:.6f}s total,'
+            f' {self.maxSeconds:.6f}s max)'
+        )
+
+
+class Stats:
+    # Pass a Stats to XMLParser, AssetClipsCSV or AssetClipsReport (or XMLParser.parse)
+    # and it is filled in as they run; it is then available as their .stats.  Without
+    # a Stats, nothing is timed or counted (beyond what the code does anyway).
+    #
+    # Phases (seconds; a phase that didn't happen isn't there):
+    #   read        reading the file
+    #   decode      detecting the encoding (and decoding, for the latin-1 fallback)
+    #   parseXML    XML parsing and building the (partial, if streaming) tree
+    #   findall     finding the elements to call back (only for complex paths)
+    #   walk        walking the tree (or parser events) and matching paths
+    #   callbacks   in parse callbacks (which, when streaming, includes extract and write)
+    #   cacheLoad   loading asset-clips from the library cache
+    #   cacheStore  storing asset-clips in the library cache
+    #   extract     turning elements into AssetClip records
+    #   write       generating and writing the output
+    # Phases and counts accumulate, so one Stats can be used for several runs.
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.callbacks: dict[str, CallbackStats] = {}
+        self.elementsVisited: int = 0
+        self.bytesRead: int = 0
+        self.rowsWritten: int = 0
+        self.linesWritten: int = 0
+        self.hooks: list[StatsHook] = []
+
+    def addHook(self, hook: StatsHook):
+        self.hooks.append(hook)
+
+    def addPhaseTime(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.) + seconds
+        for hook in self.hooks:
+            hook('phase', phase, seconds)
+
+    def addCallbackTime(self, key: str, seconds: float):
+        callbackStats: CallbackStats | None = self.callbacks.get(key)
+        if callbackStats is None:
+            callbackStats = CallbackStats()
+            self.callbacks[key] = callbackStats
+        callbackStats.count += 1
+        callbackStats.totalSeconds += seconds
+        if seconds > callbackStats.maxSeconds:
+            callbackStats.maxSeconds = seconds
+        self.phases['callbacks'] = self.phases.get('callbacks', 0.) + seconds
+        for hook in self.hooks:
+            hook('callback', key, seconds)
+
+    def phaseTotal(self, phases: t.Iterable[str]) -> float:
+        return sum(self.phases.get(phase, 0.) for phase in phases)
+
+    def timedCallback(
+        self,
+        key: str,
+        callback: t.Callable[[t.Any, t.Any], bool]
+    ) -> t.Callable[[t.Any, t.Any], bool]:
+        # returns callback, wrapped so that each call is recorded under key
+        def timed(refcon: t.Any, element: t.Any) -> bool:
+            start: float = time.perf_counter()
+            result: bool = callback(refcon, element)
+            self.addCallbackTime(key, time.perf_counter() - start)
+            return result
+        return timed
+
+    def timed(self, phase: str, func: t.Callable[..., t.Any]) -> t.Callable[..., t.Any]:
+        # returns func, wrapped so that each call's time is added to phase
+        def timedFunc(*args: t.Any) -> t.Any:
+            start: float = time.perf_counter()
+            result: t.Any = func(*args)
+            self.addPhaseTime(phase, time.perf_counter() - start)
+            return result
+        return timedFunc
+
+    def asDict(self) -> dict[str, t.Any]:
+        # everything but the hooks, as plain (JSON-able) values
+        return {
+            'phases': dict(self.phases),
+            'callbacks': {
+                key: {
+                    'count': callbackStats.count,
+                    'totalSeconds': callbackStats.totalSeconds,
+                    'maxSeconds': callbackStats.maxSeconds,
+                }
+                for key, callbackStats in self.callbacks.items()
+            },
+            'elementsVisited': self.elementsVisited,
+            'bytesRead': self.bytesRead,
+            'rowsWritten': self.rowsWritten,
+            'linesWritten': self.linesWritten,
+        }
+
+    def summary(self) -> str:
+        lines: list[str] = []
+        for phase, seconds in self.phases.items():
+            lines.append(f'{phase:12} {seconds * 1000:10.2f}ms')
+        for key, callbackStats in self.callbacks.items():
+            lines.append(
+                f'callback {key}: {callbackStats.count} calls,'
+                f' {callbackStats.totalSeconds * 1000:.2f}ms total,'
+                f' {callbackStats.maxSeconds * 1000:.3f}ms max'
+            )
+        lines.append(f'elements visited: {self.elementsVisited}')
+        lines.append(f'bytes read: {self.bytesRead}')
+        if self.rowsWritten:
+            lines.append(f'rows written: {self.rowsWritten}')
+        if self.linesWritten:
+            lines.append(f'lines written: {self.linesWritten}')
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return f'Stats({self.asDict()!r})'
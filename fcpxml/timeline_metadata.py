@@ -0,0 +1,333 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                TimelineExtractor extracts the markers, chapter markers and keywords on
+#                the clips in a library's projects (including those inside compound
+#                clips), with where they are on each project's timeline.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import math
+import typing as t
+from fractions import Fraction
+from xml.etree.ElementTree import Element
+
+from fcpxml import XMLParser
+from fcpxml import Utils
+
+class TimelineItem:
+    # A marker, chapter-marker or keyword on a project's timeline.  start and duration
+    # are exact (seconds), on the project's timeline, trimmed to the part of the item
+    # that is visible there.  clipName and ref are the clip the item is on (ref is the
+    # clip's asset, or its media for a ref-clip), and sourceStart is the item's start in
+    # that clip's own time (the asset's media time, for a clip of an asset).  compounds
+    # are the names of the compound clips the item is inside, outermost first.
+    MARKER: str = 'marker'
+    CHAPTER_MARKER: str = 'chapter-marker'
+    KEYWORD: str = 'keyword'
+    __slots__ = (
+        'project', 'kind', 'value', 'note', 'start', 'duration',
+        'clipName', 'ref', 'sourceStart', 'compounds'
+    )
+
+    def __init__(
+        self,
+        project: str,
+        kind: str,
+        value: str,
+        note: str,
+        start: Fraction,
+        duration: Fraction,
+        clipName: str,
+        ref: str,
+        sourceStart: Fraction,
+        compounds: tuple[str, ...] = ()
+    ):
+        self.project: str = project
+        self.kind: str = kind
+        self.value: str = value
+        self.note: str = note
+        self.start: Fraction = start
+        self.duration: Fraction = duration
+        self.clipName: str = clipName
+        self.ref: str = ref
+        self.sourceStart: Fraction = sourceStart
+        self.compounds: tuple[str, ...] = compounds
+
+    @property
+    def keywords(self) -> tuple[str, ...]:
+        # (a keyword's value is a ', '-delimited list of keywords)
+        if self.kind != self.KEYWORD or not self.value:
+            return ()
+        return tuple(self.value.split(', '))
+
+    @property
+    def timeRange(self) -> str:
+        timescale: int = math.lcm(self.start.denominator, self.duration.denominator)
+        return Utils.formatTimeRange(
+            self.start.numerator * (timescale // self.start.denominator),
+            self.duration.numerator * (timescale // self.duration.denominator),
+            timescale
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f'TimelineItem({self.project!r}, {self.kind}, {self.value!r}, {self.start}s,'
+            f' {self.duration}s, {self.clipName!r})'
+        )
+
+
+# A compound clip (ref-clip) on a timeline: (media id, shift, lo, hi).  A time t in the
+# media's sequence is at t + shift on the timeline, and only the timeline times in
+# [lo, hi) are visible (hi is None if there's no end).
+_Instance = tuple[str, Fraction, Fraction, Fraction | None]
+
+class _Compound:
+    # A compound clip's media: its own items (in its sequence's time), and the compound
+    # clips inside it, until it is resolved (into all the items, nested ones included).
+    __slots__ = ('name', 'items', 'instances', 'resolved', 'resolving')
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.items: list[TimelineItem] = []
+        self.instances: list[_Instance] = []
+        self.resolved: list[TimelineItem] | None = None
+        self.resolving: bool = False
+
+
+class TimelineExtractor:
+    # Story elements (clips, spines, etc) are nested on timelines: an element's offset is
+    # its position in its parent's time, and its start is the time of its own that it
+    # begins with, so a time t in an element is at t - start + offset in its parent
+    # (a spine's time is its parent's, unless it has a start).  Only the part of an
+    # element from start to start + duration is visible, so items outside it are
+    # dropped, and items crossing its edges are trimmed.  (Retiming is not applied.)
+    #
+    # Compound clips (ref-clips) refer to a media resource, whose sequence can be used
+    # by any number of ref-clips, in any number of projects.  Each media's items are
+    # resolved (mapped through any compound clips inside it) only once, the first time a
+    # ref-clip refers to it; after that each ref-clip just maps those into its timeline,
+    # so the work is proportional to the items produced, however deeply compound clips
+    # are shared.  Multicam clips (mc-clip) are treated as ordinary clips: only their
+    # own items are extracted, not their angles'.
+    #
+    # Everything is extracted in the same (streaming-friendly) parse: resources come
+    # before the library, so every media is known before a project refers to it, and
+    # each project is dealt with (and its elements freed) as soon as it has been parsed.
+    PROJECT_PATH: str = './library/event/project'
+    MEDIA_PATH: str = './resources/media'
+    ITEM_KINDS: frozenset[str] = frozenset(
+        (TimelineItem.MARKER, TimelineItem.CHAPTER_MARKER, TimelineItem.KEYWORD)
+    )
+    STORY_ELEMENTS: frozenset[str] = frozenset((
+        'spine', 'asset-clip', 'clip', 'ref-clip', 'sync-clip', 'mc-clip',
+        'gap', 'title', 'video', 'audio'
+    ))
+    MAX_CACHED_TIMES: int = 1 << 16
+
+    def __init__(self):
+        self._compounds: dict[str, _Compound] = {}
+        self._times: dict[str, Fraction] = {'': Fraction(0)}
+
+    def callbacks(
+        self,
+        projectCallback: t.Callable[[str, list[TimelineItem]], t.Any]
+    ) -> dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]]:
+        # Add these to the callbacks passed to XMLParser.parse.  projectCallback is called
+        # with each project's name and items (in timeline order).
+        return {
+            self.MEDIA_PATH: (TimelineExtractor._mediaCallback, self),
+            self.PROJECT_PATH: (TimelineExtractor._projectCallback, (self, projectCallback)),
+        }
+
+    def extract(self, parser: XMLParser) -> list[TimelineItem] | None:
+        # returns all the projects' items, project by project (None if parsing failed)
+        items: list[TimelineItem] = []
+
+        def projectCallback(_project: str, projectItems: list[TimelineItem]):
+            items.extend(projectItems)
+
+        if not parser.parse(self.callbacks(projectCallback)):
+            return None
+        return items
+
+    def addMedia(self, mediaEl: Element):
+        sequenceEl: Element | None = mediaEl.find('sequence')
+        if sequenceEl is None:
+            # (e.g. a multicam)
+            return
+        compound = _Compound(mediaEl.get('name', ''))
+        self._walkSequence(sequenceEl, '', compound.items, compound.instances)
+        self._compounds[mediaEl.get('id', '')] = compound
+
+    def projectItems(self, projectEl: Element) -> list[TimelineItem]:
+        # the project's items, in timeline order
+        items: list[TimelineItem] = []
+        sequenceEl: Element | None = projectEl.find('sequence')
+        if sequenceEl is None:
+            return items
+        project: str = projectEl.get('name', '')
+        instances: list[_Instance] = []
+        self._walkSequence(sequenceEl, project, items, instances)
+        self._addInstances(instances, project, items)
+        items.sort(key=lambda item: item.start)
+        return items
+
+    def _walkSequence(
+        self,
+        sequenceEl: Element,
+        project: str,
+        items: list[TimelineItem],
+        instances: list[_Instance]
+    ):
+        lo: Fraction = self._time(sequenceEl.get('tcStart', ''))
+        hi: Fraction | None = None
+        if sequenceEl.get('duration'):
+            hi = lo + self._time(sequenceEl.get('duration', ''))
+        self._walk(sequenceEl, Fraction(0), lo, hi, project, items, instances)
+
+    def _walk(
+        self,
+        el: Element,
+        shift: Fraction,
+        lo: Fraction,
+        hi: Fraction | None,
+        project: str,
+        items: list[TimelineItem],
+        instances: list[_Instance]
+    ):
+        # A time t in el is at t + shift on the timeline, where only [lo, hi) is visible.
+        for childEl in el:
+            tag: str = childEl.tag
+            if tag in self.ITEM_KINDS:
+                self._addItem(childEl, el, shift, lo, hi, project, items)
+                continue
+            if tag not in self.STORY_ELEMENTS:
+                continue
+
+            offset: Fraction = self._time(childEl.get('offset', ''))
+            start: Fraction
+            if 'start' in childEl.attrib or tag != 'spine':
+                start = self._time(childEl.get('start', ''))
+            else:
+                start = offset
+            childShift: Fraction = shift + offset - start
+            childLo: Fraction = max(lo, shift + offset)
+            childHi: Fraction | None = hi
+            if childEl.get('duration'):
+                childEnd: Fraction = shift + offset + self._time(childEl.get('duration', ''))
+                childHi = childEnd if hi is None else min(hi, childEnd)
+            if childHi is not None and childHi <= childLo:
+                continue  # none of it is visible
+
+            self._walk(childEl, childShift, childLo, childHi, project, items, instances)
+            if tag == 'ref-clip':
+                instances.append((childEl.get('ref', ''), childShift, childLo, childHi))
+
+    def _addItem(
+        self,
+        itemEl: Element,
+        clipEl: Element,
+        shift: Fraction,
+        lo: Fraction,
+        hi: Fraction | None,
+        project: str,
+        items: list[TimelineItem]
+    ):
+        start: Fraction = self._time(itemEl.get('start', ''))
+        duration: Fraction = self._time(itemEl.get('duration', ''))
+        visible: tuple[Fraction, Fraction] | None = self._visible(
+            start + shift, duration, lo, hi
+        )
+        if visible is None:
+            return
+        items.append(TimelineItem(
+            project,
+            itemEl.tag,
+            itemEl.get('value', ''),
+            itemEl.get('note', ''),
+            visible[0],
+            visible[1],
+            clipEl.get('name', ''),
+            clipEl.get('ref', ''),
+            start
+        ))
+
+    def _addInstances(self, instances: list[_Instance], project: str, items: list[TimelineItem]):
+        # adds the (resolved) items of the compound clips in instances to items
+        for mediaId, shift, lo, hi in instances:
+            compound: _Compound | None = self._compounds.get(mediaId)
+            if compound is None:
+                continue
+            compounds: tuple[str, ...] = (compound.name,)
+            for item in self._resolved(compound):
+                visible: tuple[Fraction, Fraction] | None = self._visible(
+                    item.start + shift, item.duration, lo, hi
+                )
+                if visible is None:
+                    continue
+                items.append(TimelineItem(
+                    project, item.kind, item.value, item.note, visible[0], visible[1],
+                    item.clipName, item.ref, item.sourceStart, compounds + item.compounds
+                ))
+
+    def _resolved(self, compound: _Compound) -> list[TimelineItem]:
+        # compound's items, including those of the compound clips inside it (computed once)
+        if compound.resolved is not None:
+            return compound.resolved
+        if compound.resolving:
+            return []  # (a compound clip can't contain itself)
+        compound.resolving = True
+        resolved: list[TimelineItem] = list(compound.items)
+        self._addInstances(compound.instances, '', resolved)
+        compound.resolved = resolved
+        compound.items = []
+        compound.instances = []
+        compound.resolving = False
+        return resolved
+
+    @staticmethod
+    def _visible(
+        start: Fraction,
+        duration: Fraction,
+        lo: Fraction,
+        hi: Fraction | None
+    ) -> tuple[Fraction, Fraction] | None:
+        # (start, duration) trimmed to [lo, hi), or None if none of it is in there
+        # (a marker with no duration is there if its start is)
+        end: Fraction = start + duration
+        if hi is not None and start >= hi:
+            return None
+        if end <= lo and not (duration == 0 and start == lo):
+            return None
+        if start < lo:
+            start = lo
+        if hi is not None and end > hi:
+            end = hi
+        return (start, end - start)
+
+    def _time(self, time: str) -> Fraction:
+        # (the same times, e.g. durations and starts, come up over and over)
+        fraction: Fraction | None = self._times.get(time)
+        if fraction is None:
+            if len(self._times) >= self.MAX_CACHED_TIMES:
+                self._times = {'': Fraction(0)}
+            fraction = Fraction(*Utils.parseTime(time))
+            self._times[time] = fraction
+        return fraction
+
+    @staticmethod
+    def _mediaCallback(extractor: 'TimelineExtractor', mediaEl: Element) -> bool:
+        extractor.addMedia(mediaEl)
+        return True  # please keep feeding me Elements
+
+    @staticmethod
+    def _projectCallback(
+        refcon: tuple['TimelineExtractor', t.Callable[[str, list[TimelineItem]], t.Any]],
+        projectEl: Element
+    ) -> bool:
+        extractor, projectCallback = refcon
+        projectCallback(projectEl.get('name', ''), extractor.projectItems(projectEl))
+        return True  # please keep feeding me Elements
@@ -8,12 +8,36 @@
 # Copyright:     (c) 2024 Greg Chapman
 # License:       MIT, see LICENSE
 # ------------------------------------------------------------------------------
+import bisect
 import datetime
+import functools
+import hashlib
+import itertools
 import re
+import textwrap
+import typing as t
 from fractions import Fraction
+from xml.etree.ElementTree import Element
 
 class Utils:
     class TextWrapper:
+        # TextWrapper writes text to a file, wrapping lines at wrapAt (breaking at
+        # whitespace, like textwrap.wrap with break_long_words=False), indenting
+        # continuation lines by wrapIndent, and expanding tabs to tab spaces.  It keeps
+        # track of the current column, so each write() continues the current line.
+        #
+        # IMPORTANT: it buffers its output (up to BUFFER_SIZE characters), and nothing
+        # reaches the file until the buffer fills, or it is flushed.  Use it as a context
+        # manager (which flushes on the way out), or call flush() (or close()) when
+        # you're done, before the file is closed.  A TextWrapper that is garbage
+        # collected with output still buffered flushes it then, if the file is still
+        # open, but don't count on that (e.g. the file may be closed first).
+        BUFFER_SIZE: int = 1 << 16  # characters
+
+        # same word splitting as textwrap (including breaking after hyphens)
+        _WORD_SEPARATOR: re.Pattern = textwrap.TextWrapper.wordsep_re
+        _WHITESPACE_TO_SPACE: dict[int, int] = {ord(ch): ord(' ') for ch in '\t\n\x0b\x0c\r'}
+
         def __init__(
             self,
             filewt,
@@ -22,118 +46,264 @@ class Utils:
             tab: int = 4,
             dryRun: bool = False
         ):
-            # filewt is a text file, open for writing:
-            #   with open(reportPath, 'wt', encoding='utf-8') as filewt:
-            #       wrapper = TextWrapper(filewt, wrapAt=100, wrapIndent=25)
+            # filewt is a text file, open for writing (TextWrapper doesn't close it):
+            #   with open(reportPath, 'wt', encoding='utf-8') as filewt, \
+            #           TextWrapper(filewt, wrapAt=100, wrapIndent=25) as wrapper:
+            #       ...
             self.filewt = filewt
             self.wrapAt = wrapAt
             self.wrapIndent = wrapIndent
             self.tab = tab
             self.dryRun = dryRun
+            self.linesWritten: int = 0
             self._currLinePos = 0
+            self._indent: str = ' ' * wrapIndent
+            self._buffer: list[str] = []
+            self._bufferSize: int = 0
 
         def write(self, text: str):
             # how much can we fit (break at whitespace, but don't trim any whitespace except
             # the one that caused the break)
-            lines: list[str] = self._split(text)
-
-            numLines: int = len(lines)
-            if numLines == 0:
+            if not text:
                 return
 
-            for i, line in enumerate(lines):
-                if not self.dryRun:
-                    if i == numLines - 1:
-                        print(line, end='', file=self.filewt)
-                        continue
-                    print(line, file=self.filewt)
+            # expand tabs and convert white-space to spaces (if there is any)
+            line: str = text
+            printable: bool = text.isprintable()
+            if not printable:
+                line = text.expandtabs(self.tab).translate(self._WHITESPACE_TO_SPACE)
+                printable = line.isprintable()
 
-            if lines[-1][-1] == '\n':
-                self._currLinePos = 0
+            lines: list[str]
+            if printable and len(line) <= self.wrapAt - self._currLinePos:
+                # it all fits on the current line, we just trim any trailing white-space
+                line = line.rstrip(' ')
+                lines = [line] if line else []
             else:
-                lastLineLength: int = len(lines[-1])
-                self._currLinePos += lastLineLength
+                lines = self._wrap(self._chunks(line))
+
+            if not lines:
+                # must have been all white-space; we want to keep that (as is).  If it
+                # has newlines, the column is what follows the last one (TextWrapper
+                # used to add the length of the whole text, unless it ended with one).
+                self._emit(text)
+                newline: int = text.rfind('\n')
+                if newline == -1:
+                    self._currLinePos += len(text)
+                else:
+                    self.linesWritten += text.count('\n')
+                    self._currLinePos = len(text) - newline - 1
+                return
+
+            if len(lines) == 1:
+                self._emit(lines[0])
+                self._currLinePos += len(lines[0])
+                return
+
+            self._emit('\n'.join(lines))
+            self.linesWritten += len(lines) - 1
+            self._currLinePos = len(lines[-1])
 
         def writeLine(self, text: str):
             if text:
                 self.write(text)
 
-            if not self.dryRun:
-                print(file=self.filewt)
-                self._currLinePos = 0
-
-        def _split(self, text: str) -> list[str]:
-            import textwrap
-            initialIndent: str = ' ' * self._currLinePos
-            output: list[str] = textwrap.wrap(
-                text,
-                width=self.wrapAt,
-                initial_indent=initialIndent,
-                subsequent_indent=' ' * self.wrapIndent,
-                tabsize=self.tab,
-                break_long_words=False,
-            )
-
-            # We tricked textwrap.wrap with initial_indent.  We need to strip that off,
-            # since that text is already in the file.
-            if output:
-                output[0] = output[0][self._currLinePos:]
-            else:
-                # must have been all white-space; we want to keep that
-                output.append(text)
+            self._emit('\n')
+            self.linesWritten += 1
+            self._currLinePos = 0
+
+        def flush(self):
+            if self._buffer:
+                if not self.dryRun:
+                    self.filewt.write(''.join(self._buffer))
+                self._buffer = []
+                self._bufferSize = 0
+
+        def close(self):
+            # flushes (filewt is left open)
+            self.flush()
+
+        def __enter__(self) -> 'Utils.TextWrapper':
+            return self
+
+        def __exit__(self, *excInfo: t.Any):
+            self.flush()
+
+        def __del__(self):
+            # the last resort (see the class comment)
+            try:
+                self.flush()
+            except (ValueError, OSError, AttributeError):
+                # the file is closed, or __init__ never finished
+                pass
+
+        def _emit(self, text: str):
+            self._buffer.append(text)
+            self._bufferSize += len(text)
+            if self._bufferSize >= self.BUFFER_SIZE:
+                self.flush()
+
+        def _chunks(self, text: str) -> list[str]:
+            # split text (with tabs expanded, and white-space converted to spaces) into
+            # words and runs of spaces
+            if ' ' not in text and '-' not in text:
+                return [text]
+            return [chunk for chunk in self._WORD_SEPARATOR.split(text) if chunk]
+
+        def _wrap(self, chunks: list[str]) -> list[str]:
+            # Greedily fills lines with chunks, exactly like textwrap.TextWrapper does.
+            # The first line continues the current line (so it has less room, and no
+            # indent), and it never starts a new line: its first word stays on the
+            # current line even if it doesn't fit.  White-space at the end of a line is
+            # dropped, as is white-space at the start of any line but the first.
+            # starts[i] is where chunks[i] starts in the text, so a bisect finds how many
+            # chunks fit on each line.
+            starts: list[int] = list(itertools.accumulate(map(len, chunks), initial=0))
+            numChunks: int = len(chunks)
+            lines: list[str] = []
+            i: int = 0
+            while i < numChunks:
+                width: int
+                if lines:
+                    width = self.wrapAt - self.wrapIndent
+                    if not chunks[i].strip():
+                        i += 1
+                        if i == numChunks:
+                            break
+                else:
+                    width = self.wrapAt - self._currLinePos
 
-            return output
+                # chunks[i:end] fit on this line
+                end: int = bisect.bisect_right(starts, starts[i] + width, i) - 1
+                if end <= i:
+                    # too long for any line, it gets a line of its own
+                    end = i + 1
 
+                lineEnd: int = end
+                if not chunks[lineEnd - 1].strip():
+                    lineEnd -= 1
+                if lineEnd > i:
+                    lines.append((self._indent if lines else '') + ''.join(chunks[i:lineEnd]))
+                i = end
+
+            return lines
+
+
+    # the number of distinct formatted time ranges (and time range strings) to remember
+    TIME_RANGE_CACHE_SIZE: int = 1 << 16
 
     @staticmethod
+    @functools.lru_cache(maxsize=TIME_RANGE_CACHE_SIZE)
     def getTimeRange(timeStamp: str, duration: str) -> str:
         # timeStamp and duration both must be of the form:
         # Ns (for an integer number of seconds) or N/Ms (for a fractional number of seconds)
         if timeStamp[-1] != 's' and duration[-1] != 's':
             return timeStamp + '-' + duration
-        timeStamp = timeStamp[:-1]
-        duration = duration[:-1]
 
-        tsNumStr: str = ''
-        tsDenStr: str = '1'
-        durNumStr: str = ''
-        durDenStr: str = '1'
+        tsNum, tsDen = Utils.parseTime(timeStamp)
+        durNum, durDen = Utils.parseTime(duration)
+        if tsDen != durDen:
+            tsNum *= durDen
+            durNum *= tsDen
+            tsDen *= durDen
+        return Utils.formatTimeRange(tsNum, durNum, tsDen)
 
-        if '/' in timeStamp:
-            tsNumStr, tsDenStr = timeStamp.split('/', 1)
-        else:
-            tsNumStr = timeStamp
+    @staticmethod
+    def getTimeRanges(timeStampsAndDurations: t.Iterable[tuple[str, str]]) -> list[str]:
+        # getTimeRange for a whole sequence of (timeStamp, duration) pairs
+        getTimeRange = Utils.getTimeRange
+        return [getTimeRange(timeStamp, duration) for timeStamp, duration in timeStampsAndDurations]
 
-        if '/' in duration:
-            durNumStr, durDenStr = duration.split('/', 1)
-        else:
-            durNumStr = duration
+    @staticmethod
+    def parseTime(time: str) -> tuple[int, int]:
+        # time must be of the form Ns or N/Ms (or empty, which means 0s).
+        # Returns (numerator, denominator), i.e. the time in seconds is exactly
+        # numerator/denominator.
+        if not time:
+            return (0, 1)
+        if time[-1] == 's':
+            time = time[:-1]
+        numStr, slash, denStr = time.partition('/')
+        if slash:
+            return (int(numStr), int(denStr))
+        return (int(numStr), 1)
 
-        startTime: Fraction = Fraction(int(tsNumStr), int(tsDenStr))
-        dur: Fraction = Fraction(int(durNumStr), int(durDenStr))
-        endTime: Fraction = startTime + dur
+    @staticmethod
+    def formatTimeRange(start: int, duration: int, timescale: int) -> str:
+        # start and duration are in units of 1/timescale seconds.
+        # We truncate startTime down, and (whatever it's called) endTime up
+        end: int = start + duration
+        if start >= 0 and end >= 0 and timescale > 0:
+            # integer arithmetic only (floor division is truncation here)
+            return Utils._formatSecondsRange(start // timescale, end // timescale + 1)
 
-        # we truncate startTime down, and (whatever it's called) endTime up
-        startStr: str = str(datetime.timedelta(seconds=int(startTime)))
-        endStr: str = str(datetime.timedelta(seconds=int(endTime + 1.0)))
+        startTime: Fraction = Fraction(start, timescale)
+        endTime: Fraction = Fraction(end, timescale)
+        return Utils._formatSecondsRange(int(startTime), int(endTime + 1))
 
-        return startStr + ' - ' + endStr
+    @staticmethod
+    def formatTimeRanges(timeRanges: t.Iterable[tuple[int, int, int]]) -> list[str]:
+        # formatTimeRange for a whole sequence of (start, duration, timescale)
+        formatTimeRange = Utils.formatTimeRange
+        return [
+            formatTimeRange(start, duration, timescale)
+            for start, duration, timescale in timeRanges
+        ]
 
     @staticmethod
-    def escapedCSVEntry(entry: str) -> str:
-        output: str = entry
-        if ',' in entry:
-            # first escape any double-quotes (so we can use double quotes around entry)
-            output = ''
-            for ch in entry:
-                if ch == '"':
-                    output += ch + ch
-                else:
-                    output += ch
+    @functools.lru_cache(maxsize=TIME_RANGE_CACHE_SIZE)
+    def _formatSecondsRange(startSeconds: int, endSeconds: int) -> str:
+        return Utils.formatSeconds(startSeconds) + ' - ' + Utils.formatSeconds(endSeconds)
+
+    @staticmethod
+    def formatSeconds(seconds: int) -> str:
+        # same as str(datetime.timedelta(seconds=seconds)), e.g. '1:02:03'
+        if 0 <= seconds < 86400:
+            minutes, secs = divmod(seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            return f'{hours}:{minutes:02}:{secs:02}'
+        return str(datetime.timedelta(seconds=seconds))
 
-            # next, put double-quotes around entry to escape any commas.
-            output = '"' + output + '"'
-        return output
+    @staticmethod
+    def parseSeconds(text: str) -> Fraction | None:
+        # the inverse of formatSeconds: 'H:MM:SS', 'M:SS' or 'S' (the seconds can have
+        # a fractional part, e.g. '1:02:03.5').  Returns None if text isn't a time.
+        parts: list[str] = text.strip().split(':')
+        if len(parts) > 3:
+            return None
+        seconds: Fraction = Fraction(0)
+        try:
+            for part in parts:
+                seconds = seconds * 60 + Fraction(part)
+        except (ValueError, ZeroDivisionError):
+            return None
+        return seconds
+
+    @staticmethod
+    def elementDigest(element: Element) -> bytes:
+        # A hash of the element's whole subtree (tags, attributes and text, but not
+        # formatting whitespace), so that unchanged subtrees can be recognized without
+        # comparing them field by field.
+        hasher = hashlib.blake2b(digest_size=16)
+        stack: list[Element | None] = [element]
+        while stack:
+            el: Element | None = stack.pop()
+            if el is None:
+                hasher.update(b'>')
+                continue
+            text: str = (el.text or '').strip()
+            hasher.update(repr((el.tag, sorted(el.attrib.items()), text)).encode('utf-8'))
+            stack.append(None)  # end of el's children
+            stack.extend(reversed(el))
+        return hasher.digest()
+
+    @staticmethod
+    def escapedCSVEntry(entry: str) -> str:
+        # An entry containing a comma, double-quote or line break must be put in
+        # double-quotes (with any double-quotes in it doubled).
+        if ',' in entry or '"' in entry or '\n' in entry or '\r' in entry:
+            return '"' + entry.replace('"', '""') + '"'
+        return entry
 
     @staticmethod
     def isYear(string: str) -> bool:
@@ -176,6 +346,26 @@ class Utils:
     def isMonth(string: str) -> bool:
         return string in Utils.MONTHS_SET
 
+    @staticmethod
+    def findYearAndMonth(keywords: t.Sequence[str]) -> tuple[str, str]:
+        # returns the first year keyword and the first month keyword ('' if not found)
+        year: str = ''
+        month: str = ''
+        for keyword in keywords:
+            if year and month:
+                # stop looking if you found both
+                break
+
+            if not year and Utils.isYear(keyword):
+                year = keyword
+                continue
+
+            if not month and Utils.isMonth(keyword):
+                month = keyword
+                continue
+
+        return year, month
+
     @staticmethod
     def abbreviate(text: str) -> str:
         if text in Utils.MONTHS_SET:  # in set is faster than in dict
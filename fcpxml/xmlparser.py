@@ -8,66 +8,448 @@
 # License:       MIT, see LICENSE
 # ------------------------------------------------------------------------------
 
+import codecs
+import gzip
+import mmap
+import os
+import re
 import sys
+import time
 import typing as t
+import zipfile
+import zlib
 from pathlib import Path
-from xml.etree.ElementTree import Element, fromstring, ParseError, ElementTree
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser
+from xml.etree.ElementTree import XMLParser as ExpatParser
+
+from fcpxml.stats import Stats
+
+# A compiled callback path is a tuple of steps, each step being (tag, isDescendant).
+# tag is an element name or '*', and isDescendant is True if the step was preceded
+# by '//' (i.e. the tag can be found at any depth below the previous step).
+_PathSteps = tuple[tuple[str, bool], ...]
+
+# A matcher state is the set of (pathIndex, stepIndex) positions that are still "alive"
+# at a particular element; i.e. the paths that a child of that element could continue.
+_MatcherState = frozenset[tuple[int, int]]
+
+class _PathMatcher:
+    # _PathMatcher compiles the simple subset of ElementPath that callback keys use
+    # ('tag', './a/b/c', './/tag', 'a/*/c', '.') into a state machine that can be
+    # run one element at a time, in document order, without a findall per key.
+    # Transitions are memoized, so matching an element is usually one dict lookup.
+    # Filter paths are matched separately from (and in addition to) the callback paths.
+    _TAG_PATTERN = re.compile(r'^(\*|[^\s/\[\]()@=\'".*][^\s/\[\]()@=\'"*]*)$')
+
+    def __init__(self, paths: t.Iterable[str], filterPaths: t.Iterable[str] = ()):
+        self.isValid: bool = True
+        self.paths: list[_PathSteps] = []
+        paths = list(paths)
+        self.numCallbackPaths: int = len(paths)
+        for path in paths + list(filterPaths):
+            steps: _PathSteps | None = self._compile(path)
+            if steps is None:
+                self.isValid = False
+                steps = ()
+            self.paths.append(steps)
+
+        # the root element itself matches any path with no steps at all (i.e. '.')
+        self.rootMatch: int = -1
+        self.rootFilter: int = -1
+        for i, steps in enumerate(self.paths):
+            if not steps:
+                if i < self.numCallbackPaths:
+                    self.rootMatch = i
+                else:
+                    self.rootFilter = i - self.numCallbackPaths
+        self.rootState: _MatcherState = frozenset(
+            (i, 0) for i, steps in enumerate(self.paths) if steps
+        )
+        self._transitions: dict[_MatcherState, dict[str, tuple[_MatcherState, int, int]]] = {}
+
+    @staticmethod
+    def _compile(path: str) -> _PathSteps | None:
+        # returns None if path uses ElementPath features we don't handle (predicates,
+        # attributes, '..', absolute paths, etc)
+        parts: list[str] = path.split('/')
+        if parts[0] == '.':
+            parts = parts[1:]
+        elif parts[0] == '':
+            return None
+
+        steps: list[tuple[str, bool]] = []
+        isDescendant: bool = False
+        for part in parts:
+            if part == '':
+                if isDescendant:
+                    return None
+                isDescendant = True
+                continue
+            if not _PathMatcher._TAG_PATTERN.match(part):
+                return None
+            steps.append((part, isDescendant))
+            isDescendant = False
+
+        if isDescendant:
+            # trailing '//'
+            return None
+        return tuple(steps)
+
+    def transitions(self, state: _MatcherState) -> dict[str, tuple[_MatcherState, int, int]]:
+        # returns the (memoized) transition table for the children of an element
+        # in this state: tag -> result of transition(state, tag)
+        table: dict[str, tuple[_MatcherState, int, int]] | None = self._transitions.get(state)
+        if table is None:
+            table = {}
+            self._transitions[state] = table
+        return table
+
+    def transition(self, state: _MatcherState, tag: str) -> tuple[_MatcherState, int, int]:
+        # returns the state for a child element with this tag, the index of the
+        # (callback) path that child element matches (-1 if it matches none), and the
+        # index of the filter path it matches (-1 if none).  If more than one path
+        # matches, the last one wins (as it would in a dict keyed by element).
+        table: dict[str, tuple[_MatcherState, int, int]] = self.transitions(state)
+        result: tuple[_MatcherState, int, int] | None = table.get(tag)
+        if result is not None:
+            return result
+
+        childState: set[tuple[int, int]] = set()
+        matched: int = -1
+        for pathIdx, stepIdx in state:
+            steps: _PathSteps = self.paths[pathIdx]
+            stepTag, isDescendant = steps[stepIdx]
+            if isDescendant:
+                # still looking for stepTag, at any depth
+                childState.add((pathIdx, stepIdx))
+            if stepTag in ('*', tag):
+                if stepIdx + 1 == len(steps):
+                    matched = max(matched, pathIdx)
+                else:
+                    childState.add((pathIdx, stepIdx + 1))
+
+        filtered: int = -1
+        if matched >= self.numCallbackPaths:
+            # the last matching path is a filter: find the last matching callback path
+            filtered = matched - self.numCallbackPaths
+            matched = -1
+            for pathIdx, stepIdx in state:
+                steps = self.paths[pathIdx]
+                if (pathIdx < self.numCallbackPaths and stepIdx + 1 == len(steps)
+                        and steps[stepIdx][0] in ('*', tag)):
+                    matched = max(matched, pathIdx)
+
+        result = (frozenset(childState), matched, filtered)
+        table[tag] = result
+        return result
+
+
+_BOMS: list[tuple[bytes, str]] = [
+    # UTF-32 first, since the UTF-32LE BOM starts with the UTF-16LE BOM
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+_XML_DECL_ENCODING = re.compile(rb'^<\?xml[^>]*?\sencoding\s*=\s*["\']([A-Za-z][\w.\-]*)["\']')
+
+def _detectEncoding(head: bytes) -> str | None:
+    # Detects the encoding of an XML document from its first few bytes: a BOM, the
+    # byte pattern of a BOM-less UTF-16 '<', or the encoding in the XML declaration.
+    # Returns None if the document doesn't say (in which case XML says it's UTF-8).
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if head.startswith(b'<\x00'):
+        return 'utf-16-le'
+    if head.startswith(b'\x00<'):
+        return 'utf-16-be'
+    match: re.Match | None = _XML_DECL_ENCODING.match(head)
+    if match:
+        return match.group(1).decode('ascii').lower()
+    return None
+
+class _XMLSource:
+    # _XMLSource hands the XML (a file, or XML data) to the XML parser in chunks,
+    # reading the file exactly once: small files with chunk-sized reads, large files
+    # through a memory map.  The bytes go straight to the parser (which handles the
+    # decoding), so the file is never decoded into a str of its own, and a streaming
+    # parse never holds more than a chunk of it.
+    # gzip files and zip archives (recognized by their contents, not their names) are
+    # decompressed a chunk at a time on the way to the parser, so there is never an
+    # uncompressed copy of the document, on disk or in memory.
+    CHUNK_SIZE: int = 1 << 20
+    MMAP_THRESHOLD: int = 32 << 20
+    BUNDLE_DOCUMENT: str = 'Info.fcpxml'
+    GZIP_MAGIC: bytes = b'\x1f\x8b'
+    ZIP_MAGIC: bytes = b'PK\x03\x04'
+
+    def __init__(self, xml: Path | str | bytes, stats: Stats | None = None):
+        self.xml: Path | str | bytes = xml
+        self.stats: Stats | None = stats
+        # If the document doesn't declare its encoding, and it isn't UTF-8 after all,
+        # we fall back to latin-1 (which, unlike UTF-8, can decode anything) from the
+        # first byte that isn't (see _decodedChunks).
+        self.fallbackToLatin1: bool = False
+        # the encoding found in the BOM or XML declaration (once reading has started)
+        self.encoding: str | None = None
+
+    def chunks(self) -> t.Iterator[bytes | str]:
+        if isinstance(self.xml, str):
+            for i in range(0, len(self.xml), self.CHUNK_SIZE):
+                yield self.xml[i:i + self.CHUNK_SIZE]
+            return
+
+        if isinstance(self.xml, bytes):
+            data: bytes = self.xml
+            yield from self._decodedChunks(
+                data[i:i + self.CHUNK_SIZE] for i in range(0, len(data), self.CHUNK_SIZE)
+            )
+            return
+
+        with open(self.xml, 'rb') as f:
+            magic: bytes = f.read(len(self.ZIP_MAGIC))
+            f.seek(0)
+            if magic.startswith(self.GZIP_MAGIC) or magic == self.ZIP_MAGIC:
+                yield from self._decompressedChunks(f, magic)
+                return
+
+            size: int = os.fstat(f.fileno()).st_size
+            if size < self.MMAP_THRESHOLD:
+                yield from self._decodedChunks(iter(lambda: f.read(self.CHUNK_SIZE), b''))
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from self._decodedChunks(
+                    mm[i:i + self.CHUNK_SIZE] for i in range(0, size, self.CHUNK_SIZE)
+                )
+
+    def _decompressedChunks(self, f: t.BinaryIO, magic: bytes) -> t.Iterator[bytes | str]:
+        # raises OSError if the archive is corrupt (or has no FCPXML document in it)
+        try:
+            if magic.startswith(self.GZIP_MAGIC):
+                with gzip.GzipFile(fileobj=f, mode='rb') as gz:
+                    yield from self._decodedChunks(iter(lambda: gz.read(self.CHUNK_SIZE), b''))
+                return
+
+            with zipfile.ZipFile(f) as archive:
+                member: zipfile.ZipInfo | None = _XMLSource._zipDocument(archive)
+                if member is None:
+                    raise OSError('no .fcpxml document in zip archive')
+                with archive.open(member) as m:
+                    yield from self._decodedChunks(iter(lambda: m.read(self.CHUNK_SIZE), b''))
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            raise OSError(f'corrupt archive: {e}') from e
+
+    @staticmethod
+    def _zipDocument(archive: zipfile.ZipFile) -> zipfile.ZipInfo | None:
+        # The document in a zip archive: a (bundle's) Info.fcpxml if there is one (the
+        # least deeply nested, if there are several), otherwise the first .fcpxml file.
+        documents: list[zipfile.ZipInfo] = [
+            member for member in archive.infolist()
+            if not member.is_dir()
+            and member.filename.endswith('.fcpxml')
+            and not member.filename.startswith('__MACOSX/')
+        ]
+        infos: list[zipfile.ZipInfo] = [
+            member for member in documents
+            if member.filename.rpartition('/')[2] == _XMLSource.BUNDLE_DOCUMENT
+        ]
+        if infos:
+            return min(infos, key=lambda member: member.filename.count('/'))
+        return documents[0] if documents else None
+
+    @staticmethod
+    def documentPath(path: Path) -> Path:
+        # a .fcpxmld bundle (or any folder) is read through the Info.fcpxml inside it
+        if path.is_dir():
+            return path / _XMLSource.BUNDLE_DOCUMENT
+        return path
+
+    @staticmethod
+    def documentSize(path: Path) -> int | None:
+        # the size of the (uncompressed) XML document, or None if it isn't known
+        # without decompressing it (gzip), or the file can't be read
+        path = _XMLSource.documentPath(path)
+        try:
+            with open(path, 'rb') as f:
+                magic: bytes = f.read(len(_XMLSource.ZIP_MAGIC))
+                if magic.startswith(_XMLSource.GZIP_MAGIC):
+                    return None
+                if magic == _XMLSource.ZIP_MAGIC:
+                    f.seek(0)
+                    with zipfile.ZipFile(f) as archive:
+                        member: zipfile.ZipInfo | None = _XMLSource._zipDocument(archive)
+                        return member.file_size if member is not None else None
+                return os.fstat(f.fileno()).st_size
+        except (OSError, zipfile.BadZipFile):
+            return None
+
+    def _timedReads(self, chunks: t.Iterator[bytes]) -> t.Iterator[bytes]:
+        stats: Stats | None = self.stats
+        if t.TYPE_CHECKING:
+            assert stats is not None
+        while True:
+            start: float = time.perf_counter()
+            chunk: bytes | None = next(chunks, None)
+            elapsed: float = time.perf_counter() - start
+            if chunk is not None:
+                # before the hooks are called, so they see the new total
+                stats.bytesRead += len(chunk)
+            stats.addPhaseTime('read', elapsed)
+            if chunk is None:
+                return
+            yield chunk
+
+    def _decodedChunks(self, chunks: t.Iterator[bytes]) -> t.Iterator[bytes | str]:
+        # A document that declares its encoding goes to the parser as it is.  One that
+        # doesn't is checked, a chunk at a time, with an incremental UTF-8 decoder, and
+        # goes to the parser as it is up to the first byte that isn't UTF-8; from there
+        # on it is decoded as latin-1, and the parser gets str (which it treats as
+        # UTF-8, as it does the bytes before it).  A character split between chunks is
+        # held back until it is complete, so the parser never sees half of one.
+        stats: Stats | None = self.stats
+        if stats is not None:
+            chunks = self._timedReads(chunks)
+
+        self.fallbackToLatin1 = False
+        decoder: codecs.IncrementalDecoder | None = None
+        isHead: bool = True
+        for chunk in chunks:
+            start: float = 0.
+            if stats is not None:
+                start = time.perf_counter()
+            if isHead:
+                isHead = False
+                self.encoding = _detectEncoding(chunk[:1024])
+                if self.encoding is None:
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+
+            decoded: bytes | str = chunk
+            if self.fallbackToLatin1:
+                decoded = chunk.decode('latin-1')
+            elif decoder is not None:
+                decoded = self._checkedChunk(decoder, chunk)
+            if stats is not None:
+                stats.addPhaseTime('decode', time.perf_counter() - start)
+            yield decoded
+
+        if decoder is not None and not self.fallbackToLatin1:
+            # a partial character at the very end
+            held: bytes = decoder.getstate()[0]
+            if held:
+                self.fallbackToLatin1 = True
+                yield held.decode('latin-1')
+
+    def _checkedChunk(self, decoder: codecs.IncrementalDecoder, chunk: bytes) -> bytes | str:
+        # chunk (with any partial character held back from the last one), as bytes if
+        # it is UTF-8, otherwise the UTF-8 part as bytes, and the rest (from the first
+        # byte that isn't) decoded as latin-1
+        held: bytes = decoder.getstate()[0]
+        data: bytes = held + chunk if held else chunk
+        try:
+            decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            self.fallbackToLatin1 = True
+            return data[:e.start].decode('utf-8') + data[e.start:].decode('latin-1')
+        nowHeld: int = len(decoder.getstate()[0])
+        return data[:len(data) - nowHeld] if nowHeld else data
+
+    def buildTree(self) -> Element:
+        # raises ParseError (or OSError)
+        stats: Stats | None = self.stats
+        parser = ExpatParser()
+        for chunk in self.chunks():
+            if stats is None:
+                parser.feed(chunk)
+                continue
+            start: float = time.perf_counter()
+            parser.feed(chunk)
+            stats.addPhaseTime('parseXML', time.perf_counter() - start)
+        return parser.close()
+
+    def iterparse(self) -> t.Iterator[tuple[str, Element]]:
+        # like xml.etree.ElementTree.iterparse(events=('start', 'end')); raises ParseError
+        stats: Stats | None = self.stats
+        pullParser = XMLPullParser(events=('start', 'end'))
+        for chunk in self.chunks():
+            if stats is None:
+                pullParser.feed(chunk)
+            else:
+                start: float = time.perf_counter()
+                pullParser.feed(chunk)
+                stats.addPhaseTime('parseXML', time.perf_counter() - start)
+            yield from pullParser.read_events()
+        pullParser.close()
+        yield from pullParser.read_events()
+
 
 class XMLParser:
-    def __init__(self, xml: str | Path | Element):
+    def __init__(
+        self,
+        xml: str | bytes | Path | Element,
+        streaming: bool = False,
+        stats: Stats | None = None
+    ):
+        # xml can be a file path, the XML data itself (str or bytes), or an Element.
+        # The file can be an .fcpxmld bundle (a folder containing Info.fcpxml), or be
+        # compressed: a gzip file, or a zip archive containing the .fcpxml (or bundle).
+        # If streaming is True (and xml isn't an Element), the XML is not parsed here;
+        # parse() will parse it incrementally, discarding each part of the tree as soon
+        # as it has been processed, so memory use is bounded by the largest matched
+        # element instead of by the size of the file.
+        # If stats is passed in, reading and parsing (here and in parse) are recorded in
+        # it (see Stats).
         self.element: Element | None = None
+        self.streaming: bool = streaming
+        self.stats: Stats | None = stats
+        self._streamingSource: _XMLSource | None = None
 
         if isinstance(xml, Element):
             self.element = xml
             return
 
-        xmlStr: str | None = None
         if isinstance(xml, str):
             # could be a file path, or could be the xml data itself
-            try:
+            if not xml.lstrip().startswith('<'):
                 xml = Path(xml)
-            except Exception:  # pylint: disable=broad-exception-caught
-                if t.TYPE_CHECKING:
-                    assert isinstance(xml, str)
-                xmlStr = xml
-
-        if isinstance(xml, Path):
-            # xml is a Path (originally, or we turned it into one).
-            # Read it into xmlStr.
-            try:
-                with open(xml, 'rt', encoding='utf-8') as f:
-                    xmlStr = f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(xml, 'rt', encoding='utf-16') as f:
-                        xmlStr = f.read()
-                except UnicodeError:
-                    with open(xml, 'rt', encoding='latin-1') as f:
-                        xmlStr = f.read()
-
-            if xmlStr is None:
-                print(f'ERROR: failed to read from XML file: {xml}.', file=sys.stderr)
-                return
 
-        if xmlStr is not None:
-            try:
-                element: Element | ElementTree = fromstring(xmlStr)
-                if isinstance(element, ElementTree):
-                    element = element.getroot()
-                self.element = element
+        if not isinstance(xml, (str, bytes, Path)):
+            print(f'ERROR: XMLParser received incorrect arg type: {type(xml)}', file=sys.stderr)
+            return
 
-                # do some validation (version, etc)
-                return
+        if isinstance(xml, Path):
+            xml = _XMLSource.documentPath(xml)
+        if isinstance(xml, Path) and not xml.is_file():
+            print(f'ERROR: XML file not found: {xml}.', file=sys.stderr)
+            return
 
-            except ParseError as parseErr:
-                print(f'ERROR: Parsing the XML failed with "{parseErr}".', file=sys.stderr)
-                return
+        source = _XMLSource(xml, stats)
+        if streaming:
+            self._streamingSource = source
+            return
 
-        print(f'ERROR: XMLParser received incorrect arg type: {type(xml)}', file=sys.stderr)
+        try:
+            self.element = source.buildTree()
+            # do some validation (version, etc)
+        except ParseError as parseErr:
+            print(f'ERROR: Parsing the XML failed with "{parseErr}".', file=sys.stderr)
+        except OSError as osErr:
+            print(f'ERROR: failed to read from XML file: {xml} ({osErr}).', file=sys.stderr)
 
     @property
     def isValid(self) -> bool:
-        return self.element is not None
+        return self.element is not None or self._streamingSource is not None
+
+    @staticmethod
+    def documentPath(xmlPath: str | Path) -> Path:
+        # the file that actually gets read for xmlPath (Info.fcpxml, for a bundle)
+        return _XMLSource.documentPath(Path(xmlPath))
+
+    @staticmethod
+    def documentSize(xmlPath: str | Path) -> int | None:
+        # the size of xmlPath's XML document, uncompressed (None if that isn't known)
+        return _XMLSource.documentSize(Path(xmlPath))
 
     # parse with callbacks:
     # Each callbacks dict item is:
@@ -76,32 +458,305 @@ class XMLParser:
     # The callable will receive two arguments (refcon, element) and is required to return
     # True (please continue parsing) or False (you can stop, I have everything
     # I need).
-    def parse(self, callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]]) -> bool:
+    # Simple path keys are matched and called back in a single document-order walk that
+    # skips subtrees no key can match; keys that need more of ElementPath (predicates,
+    # etc) fall back to a findall per key.
+    # In streaming mode, keys are limited to simple paths ('./a/b', './/tag', 'a/*/c'),
+    # each callback is made when its element ends (so a matched descendant of a matched
+    # element is called back first), and once the callback returns, the element is
+    # removed from the tree (unless it is inside another matched element).
+    # filters (optional) decide, for each element one of their (simple path) keys
+    # matches, whether parsing should look inside it at all.  Each filters item is:
+    # key = a simple path, value = tuple(callable, refcon)
+    # The callable receives (refcon, element) as soon as the element starts (in
+    # streaming mode, its children may not have been parsed yet, so it should only look
+    # at its tag and attributes), and returns XMLParser.DESCEND (parse as usual),
+    # XMLParser.SKIP (no callbacks for it or anything inside it; when streaming, its
+    # subtree is discarded as it is parsed) or XMLParser.STOP (early termination, as
+    # if a callback had returned False).
+    # stats (default: the Stats passed to __init__, if any) records the phases, elements
+    # visited and each callback key's calls.
+    DESCEND: int = 1
+    SKIP: int = 0
+    STOP: int = -1
+
+    def parse(
+        self,
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        stats: Stats | None = None,
+        filters: dict[str, tuple[t.Callable[[t.Any, Element], int], t.Any]] | None = None
+    ) -> bool:
         # returns True if successful, False if failure occurred (early termination due
         # to callable returning False is NOT a failure; True will be returned here.)
-        if not self.element:
+        if stats is None:
+            stats = self.stats
+        if filters is None:
+            filters = {}
+
+        values: list[tuple[t.Callable[[t.Any, Element], bool], t.Any]] = list(callbacks.values())
+        if stats is not None:
+            values = [
+                (stats.timedCallback(key, callback), refcon)
+                for key, (callback, refcon) in callbacks.items()
+            ]
+        filterValues: list[tuple[t.Callable[[t.Any, Element], int], t.Any]] = list(
+            filters.values()
+        )
+
+        source: _XMLSource | None = self._streamingSource
+        if source is not None:
+            source.stats = stats
+            return self._timedWalk(
+                stats, ('read', 'decode', 'parseXML'),
+                lambda: self._parseStreaming(source, callbacks, values, filters, filterValues)
+            )
+
+        if self.element is None:
             print('ERROR: No XML to parse, XMLParser initialization failed', file=sys.stderr)
             return False
 
+        matcher = _PathMatcher(callbacks.keys(), filters.keys())
+        if not matcher.isValid:
+            # some key needs the full power of findall
+            return self._timedWalk(
+                stats, ('findall',),
+                lambda: self._parseWithFindall(callbacks, values, filters, filterValues, stats)
+            )
+        return self._timedWalk(stats, (), lambda: self._walk(matcher, values, filterValues))
+
+    @staticmethod
+    def _timedWalk(
+        stats: Stats | None,
+        otherPhases: tuple[str, ...],
+        walk: t.Callable[[], int | None]
+    ) -> bool:
+        # walk returns the number of elements visited (None if it failed).  Its 'walk'
+        # time is whatever isn't callbacks, or one of otherPhases.
+        if stats is None:
+            return walk() is not None
+
+        phases: tuple[str, ...] = otherPhases + ('callbacks',)
+        otherTime: float = stats.phaseTotal(phases)
+        start: float = time.perf_counter()
+        visited: int | None = walk()
+        elapsed: float = time.perf_counter() - start
+        stats.addPhaseTime('walk', elapsed - (stats.phaseTotal(phases) - otherTime))
+        if visited is None:
+            return False
+        stats.elementsVisited += visited
+        return True
+
+    @staticmethod
+    def _filter(
+        filterValues: list[tuple[t.Callable[[t.Any, Element], int], t.Any]],
+        filtered: int,
+        el: Element
+    ) -> int:
+        # the verdict of el's filter (DESCEND if no filter matched el)
+        if filtered < 0:
+            return XMLParser.DESCEND
+        filterCallback, refcon = filterValues[filtered]
+        verdict: int = filterCallback(refcon, el)
+        if verdict == XMLParser.STOP:
+            print('Filter requested early termination.', file=sys.stderr)
+        return verdict
+
+    def _walk(
+        self,
+        matcher: _PathMatcher,
+        values: list[tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        filterValues: list[tuple[t.Callable[[t.Any, Element], int], t.Any]]
+    ) -> int:
+        # walk the elements in document order, calling back as we find each match, and
+        # skipping any subtree that can't contain a match (or that a filter skipped).
+        # Returns the number of elements visited (all the children of every element we
+        # descend into).
+        if t.TYPE_CHECKING:
+            assert self.element is not None
+        callback: t.Callable[[t.Any, Element], bool]
+        refcon: t.Any
+        foundMatch: bool = False
+        visited: int = 1
+        verdict: int = self._filter(filterValues, matcher.rootFilter, self.element)
+        if verdict != XMLParser.DESCEND:
+            return visited
+        if matcher.rootMatch >= 0:
+            foundMatch = True
+            callback, refcon = values[matcher.rootMatch]
+            if not callback(refcon, self.element):
+                print('Callback requested early termination.', file=sys.stderr)
+                return visited
+
+        stack: list[tuple[
+            t.Iterator[Element], _MatcherState, dict[str, tuple[_MatcherState, int, int]]
+        ]] = []
+        if matcher.rootState:
+            visited += len(self.element)
+            stack.append((
+                iter(self.element), matcher.rootState, matcher.transitions(matcher.rootState)
+            ))
+        while stack:
+            children, state, table = stack[-1]
+            for el in children:
+                result: tuple[_MatcherState, int, int] | None = table.get(el.tag)
+                if result is None:
+                    result = matcher.transition(state, el.tag)
+                childState, matched, filtered = result
+                if filtered >= 0:
+                    verdict = self._filter(filterValues, filtered, el)
+                    if verdict == XMLParser.STOP:
+                        return visited
+                    if verdict == XMLParser.SKIP:
+                        continue
+                if matched >= 0:
+                    foundMatch = True
+                    callback, refcon = values[matched]
+                    if not callback(refcon, el):
+                        print('Callback requested early termination.', file=sys.stderr)
+                        return visited
+                if childState and len(el):
+                    # descend (we'll come back to the rest of children later)
+                    visited += len(el)
+                    stack.append((iter(el), childState, matcher.transitions(childState)))
+                    break
+            else:
+                stack.pop()
+
+        if not foundMatch and not filterValues:
+            print('Warning: No matching elements found.', file=sys.stderr)
+        return visited
+
+    def _parseWithFindall(
+        self,
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        values: list[tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        filters: dict[str, tuple[t.Callable[[t.Any, Element], int], t.Any]],
+        filterValues: list[tuple[t.Callable[[t.Any, Element], int], t.Any]],
+        stats: Stats | None
+    ) -> int:
+        # returns the number of elements visited
+        if t.TYPE_CHECKING:
+            assert self.element is not None
+
         # scan the XML creating a set of all the elements that will require a callback
+        # (or a filter)
+        start: float = 0.
+        if stats is not None:
+            start = time.perf_counter()
         elementsToCallback: dict[Element, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {}
-        for key, value in callbacks.items():
+        for key, value in zip(callbacks, values):
             elements: list[Element] = self.element.findall(key)
             for el in elements:
                 elementsToCallback[el] = value
+        elementsToFilter: dict[Element, tuple[t.Callable[[t.Any, Element], int], t.Any]] = {}
+        for key, filterValue in zip(filters, filterValues):
+            for el in self.element.findall(key):
+                elementsToFilter[el] = filterValue
+        if stats is not None:
+            stats.addPhaseTime('findall', time.perf_counter() - start)
 
         if not elementsToCallback:
             print('Warning: No matching elements found.', file=sys.stderr)
-            return True
+            return 0
 
         # walk through every element in document order, calling back if appropriate
         callback: t.Callable[[t.Any, Element], bool]
         refcon: t.Any
+        skipped: set[Element] = set()
+        visited: int = 0
         for el in self.element.iter('*'):
+            visited += 1
+            if el in skipped:
+                continue
+            if el in elementsToFilter:
+                filterCallback, filterRefcon = elementsToFilter[el]
+                verdict: int = filterCallback(filterRefcon, el)
+                if verdict == XMLParser.STOP:
+                    print('Filter requested early termination.', file=sys.stderr)
+                    return visited
+                if verdict == XMLParser.SKIP:
+                    skipped.update(el.iter('*'))
+                    continue
             if el in elementsToCallback:
                 callback, refcon = elementsToCallback[el]
                 if not callback(refcon, el):
                     print('Callback requested early termination.', file=sys.stderr)
-                    return True
+                    return visited
 
-        return True
+        return visited
+
+    def _parseStreaming(
+        self,
+        source: _XMLSource,
+        callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        values: list[tuple[t.Callable[[t.Any, Element], bool], t.Any]],
+        filters: dict[str, tuple[t.Callable[[t.Any, Element], int], t.Any]],
+        filterValues: list[tuple[t.Callable[[t.Any, Element], int], t.Any]]
+    ) -> int | None:
+        # returns the number of elements visited, or None if parsing failed
+        matcher = _PathMatcher(callbacks.keys(), filters.keys())
+        if not matcher.isValid:
+            print('ERROR: Streaming parse only supports simple paths (e.g. "./a/b", ".//tag").',
+                file=sys.stderr)
+            return None
+
+        # A skipped element's state is the empty state, so nothing inside it matches,
+        # and (if it isn't inside a matched element) each of its children is removed
+        # from the tree as soon as it ends, just like any other unmatched element.
+        skippedState: _MatcherState = frozenset()
+        # stack of currently open elements, with their matcher state and matched path index
+        stack: list[tuple[Element, _MatcherState, int]] = []
+        # number of open elements that matched a path (we can't discard anything inside them)
+        numOpenMatches: int = 0
+        foundMatch: bool = False
+        visited: int = 0
+
+        try:
+            for event, el in source.iterparse():
+                state: _MatcherState
+                matched: int
+                filtered: int
+                if event == 'start':
+                    visited += 1
+                    if stack:
+                        state, matched, filtered = matcher.transition(stack[-1][1], el.tag)
+                    else:
+                        state, matched = matcher.rootState, matcher.rootMatch
+                        filtered = matcher.rootFilter
+                    if filtered >= 0:
+                        verdict: int = self._filter(filterValues, filtered, el)
+                        if verdict == XMLParser.STOP:
+                            return visited
+                        if verdict == XMLParser.SKIP:
+                            state, matched = skippedState, -1
+                    stack.append((el, state, matched))
+                    if matched >= 0:
+                        numOpenMatches += 1
+                    continue
+
+                # event == 'end'
+                _, state, matched = stack.pop()
+                if matched >= 0:
+                    numOpenMatches -= 1
+                    foundMatch = True
+                    callback, refcon = values[matched]
+                    if not callback(refcon, el):
+                        print('Callback requested early termination.', file=sys.stderr)
+                        return visited
+
+                if numOpenMatches == 0 and stack:
+                    # Nobody needs this element any more, remove it from the tree.
+                    # It is always the last child of its parent at this point.
+                    del stack[-1][0][-1]
+
+        except ParseError as parseErr:
+            print(f'ERROR: Parsing the XML failed with "{parseErr}".', file=sys.stderr)
+            return None
+        except OSError as osErr:
+            print(f'ERROR: failed to read from XML file: {source.xml} ({osErr}).',
+                file=sys.stderr)
+            return None
+
+        if not foundMatch and not filterValues:
+            print('Warning: No matching elements found.', file=sys.stderr)
+        return visited
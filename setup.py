@@ -17,4 +17,7 @@ if __name__ == '__main__':
         description='Final Cut Pro XML Utilities',
         packages=setuptools.find_packages(),
         python_requires='>=3.10',
+        entry_points={
+            'console_scripts': ['fcpxml=fcpxml.__main__:main'],
+        },
     )
@@ -0,0 +1,13 @@
+# ------------------------------------------------------------------------------
+# Purpose:       pytest configuration for the fcpxml tests: lets them import fcpxml
+#                from this checkout, however pytest is run.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,92 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Small, deterministic libraries for the tests, with a bit of everything
+#                the outputs have to deal with: shared and missing assets, the different
+#                ways assets give their media, date keywords, notes with punctuation,
+#                asset-clips without keywords, and asset-clips with the same name.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import random
+from xml.sax.saxutils import quoteattr
+
+KEYWORDS: tuple[str, ...] = (
+    '1998', '2001', '2001-2003', 'March', 'June', 'December', 'beach', 'Grandma',
+    'Café Lumière', '"the" man', 'dog, cat',
+)
+NOTES: tuple[str, ...] = (
+    '', '', 'short note', 'a note, with a comma', 'she said "hi"',
+    'a much longer note that goes on and on, well past the point where the report has'
+    ' to wrap it onto another line (or two)',
+)
+
+def _asset(i: int, rand: random.Random) -> str:
+    # Asset i gives its media in one of the ways FCPXML does: an original-media
+    # media-rep (maybe after a proxy), only a proxy, or (older versions) a src.
+    duration: str = f'{rand.randint(300, 9000) * 1001}/30000s'
+    attributes: str = (
+        f'id="r{i + 3}" name="Asset {i}" start="0s" duration="{duration}"'
+        f' format="{"r1" if i % 3 else "r2"}" hasVideo="1"'
+    )
+    src: str = f'file:///Volumes/Media/clip%20{i}.mov'
+    kind: int = i % 4
+    if kind == 1:
+        return (
+            f'<asset {attributes}>'
+            f'<media-rep kind="proxy-media" src="file:///Volumes/Proxies/clip{i}.mov"/>'
+            f'<media-rep kind="original-media" src="{src}"/></asset>'
+        )
+    if kind == 2:
+        return (
+            f'<asset {attributes}>'
+            f'<media-rep kind="proxy-media" src="file:///Volumes/Proxies/clip{i}.mov"/></asset>'
+        )
+    if kind == 3:
+        return f'<asset {attributes} src="{src}"/>'
+    return f'<asset {attributes}><media-rep kind="original-media" src="{src}"/></asset>'
+
+def _keyword(rand: random.Random) -> str:
+    start: int = rand.randint(0, 3000) * 1001
+    duration: int = rand.choice((0, rand.randint(1, 600) * 1001))
+    value: str = ', '.join(rand.sample(KEYWORDS, rand.randint(1, 3)))
+    keyword: str = (
+        f'<keyword start="{start}/30000s" duration="{duration}/30000s" value={quoteattr(value)}'
+    )
+    note: str = rand.choice(NOTES)
+    if note:
+        keyword += f' note={quoteattr(note)}'
+    return keyword + '/>'
+
+def makeLibrary(numEvents: int = 3, clipsPerEvent: int = 6, seed: int = 1) -> str:
+    # Each pair of asset-clips shares an asset, the last asset-clip of each event has
+    # no asset, every fifth asset-clip has no keywords, and the first two asset-clips
+    # of each event have the same name.
+    rand = random.Random(seed)
+    numClips: int = numEvents * clipsPerEvent
+    numAssets: int = (numClips + 1) // 2
+    parts: list[str] = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE fcpxml>\n<fcpxml version="1.10">\n'
+        '<resources>\n'
+        '<format id="r1" name="FFVideoFormat1080p2997" frameDuration="1001/30000s"'
+        ' width="1920" height="1080"/>\n'
+        '<format id="r2" name="FFVideoFormat720p25" frameDuration="1/25s"'
+        ' width="1280" height="720"/>\n'
+    ]
+    parts.extend(_asset(i, rand) + '\n' for i in range(numAssets))
+    parts.append('</resources>\n<library>\n')
+    for e in range(numEvents):
+        parts.append(f'<event name="Event {e}">\n')
+        for c in range(clipsPerEvent):
+            i: int = e * clipsPerEvent + c
+            ref: str = f'r{i // 2 + 3}' if c < clipsPerEvent - 1 else 'r999'
+            name: str = f'Clip {e}-{max(c, 1)}'
+            parts.append(f'<asset-clip ref="{ref}" name="{name}" offset="0s" duration="100s">')
+            if i % 5 != 4:
+                parts.extend(_keyword(rand) for _ in range(rand.randint(1, 5)))
+            parts.append('</asset-clip>\n')
+        parts.append('</event>\n')
+    parts.append('</library>\n</fcpxml>\n')
+    return ''.join(parts)
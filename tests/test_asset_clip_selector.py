@@ -0,0 +1,126 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that AssetClipSelector picks the asset-clips and keyword ranges
+#                it says it does (parsing, streaming or not, and from AssetClipRecords),
+#                and that it stops parsing once it has everything.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import fnmatch
+import re
+import typing as t
+
+import pytest
+
+from fcpxml import AssetClip, AssetClipSelector, AssetClipsSource, ClipTable
+
+from libraries import makeLibrary
+
+LIBRARY: str = makeLibrary(numEvents=4, clipsPerEvent=6)
+
+def _summary(assetClips: t.Iterable[AssetClip]) -> list[tuple]:
+    return [
+        (assetClip.name, [(kr.start, kr.keywords, kr.note) for kr in assetClip.keywordRanges])
+        for assetClip in assetClips
+    ]
+
+def _event(assetClip: AssetClip) -> str:
+    # (makeLibrary names asset-clips 'Clip event-n')
+    return 'Event ' + assetClip.name.split(' ')[1].split('-')[0]
+
+def _inYear(keyword: str, year: int) -> bool:
+    match: re.Match | None = re.fullmatch(r'(\d{4})(?:-(\d{4}))?', keyword)
+    if match is None:
+        return False
+    return int(match.group(1)) <= year <= int(match.group(2) or match.group(1))
+
+def _expected(
+    eventNames: set[str] | None = None,
+    assetNamePattern: str | None = None,
+    year: int | None = None,
+    month: str | None = None,
+    withNotes: bool = False,
+    limit: int | None = None
+) -> list[tuple]:
+    # what the selector should select, worked out the long way
+    assetClips: list[AssetClip] | None = AssetClipsSource(LIBRARY).assetClips()
+    assert assetClips is not None
+    selected: list[tuple] = []
+    for name, keywordRanges in _summary(assetClips):
+        assetClip: AssetClip = next(ac for ac in assetClips if ac.name == name)
+        if eventNames is not None and _event(assetClip) not in eventNames:
+            continue
+        if assetNamePattern is not None and not fnmatch.fnmatchcase(name, assetNamePattern):
+            continue
+        keywordRanges = [
+            (start, keywords, note) for start, keywords, note in keywordRanges
+            if (year is None or any(_inYear(keyword, year) for keyword in keywords))
+            and (month is None or month in keywords)
+            and (note or not withNotes)
+        ]
+        if (year is not None or month is not None or withNotes) and not keywordRanges:
+            continue
+        selected.append((name, keywordRanges))
+    return selected[:limit]
+
+SELECTIONS: list[dict[str, t.Any]] = [
+    {},
+    {'eventNames': {'Event 1'}},
+    {'eventNames': {'Event 2', 'Event 0'}},
+    {'eventNames': {'No Such Event'}},
+    {'assetNamePattern': 'Clip *-1'},
+    {'assetNamePattern': 'clip *'},  # (case-sensitive)
+    {'year': 2002},  # only in the '2001-2003' range
+    {'year': 2001},
+    {'year': '2002', 'month': 'June'},
+    {'month': 'June'},
+    {'withNotes': True},
+    {'limit': 3},
+    {'limit': 0},
+    {'eventNames': {'Event 1', 'Event 3'}, 'year': 2001, 'withNotes': True, 'limit': 2},
+    {'assetNamePattern': 'Clip [23]-*', 'month': 'December', 'limit': 4},
+]
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('selection', SELECTIONS)
+def testSelections(selection: dict[str, t.Any], streaming: bool):
+    expected: list[tuple] = _expected(
+        **{key: int(value) if key == 'year' else value for key, value in selection.items()}
+    )
+    selector = AssetClipSelector(**selection)
+    assetClips: list[AssetClip] | None = AssetClipsSource(
+        LIBRARY, streaming=streaming, selector=selector
+    ).assetClips()
+    assert assetClips is not None
+    assert _summary(assetClips) == expected
+    assert selector.numSelected == len(expected)
+
+def testSelectingRecords():
+    # from AssetClipRecords (and again, since the selector is reset for each pass);
+    # eventNames need the XML, so they are ignored
+    table: ClipTable | None = ClipTable.fromXML(LIBRARY)
+    assert table is not None
+    selector = AssetClipSelector(eventNames={'Event 1'}, assetNamePattern='Clip 2-*', limit=2)
+    source = AssetClipsSource(table, selector=selector)
+    for _ in range(2):
+        assetClips: list[AssetClip] | None = source.assetClips()
+        assert assetClips is not None
+        assert _summary(assetClips) == _expected(assetNamePattern='Clip 2-*', limit=2)
+
+def testStopsParsingWhenDone():
+    # Everything after the start of the event after the last selected one (or after
+    # the limit is reached) is never parsed, so it can be anything.
+    cut: int = LIBRARY.index('<event name="Event 2">') + len('<event name="Event 2">')
+    truncated: str = LIBRARY[:cut] + '<not xml'
+    for selection in ({'eventNames': {'Event 0', 'Event 1'}}, {'limit': 7}):
+        assetClips: list[AssetClip] | None = AssetClipsSource(
+            truncated, streaming=True, selector=AssetClipSelector(**selection)
+        ).assetClips()
+        assert assetClips is not None
+        assert _summary(assetClips) == _expected(**selection)
+
+    # (whereas without the selector, it's an error)
+    assert AssetClipsSource(truncated, streaming=True).assetClips() is None
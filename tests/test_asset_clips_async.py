@@ -0,0 +1,85 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests AssetClipsAsync's progress counts, and which jobs need a large
+#                parse slot.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import asyncio
+import gzip
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element, fromstring
+
+from fcpxml import AssetClipsAsync, ParseProgress
+
+NUM_ASSETS: int = 5
+NUM_ASSET_CLIPS: int = 12
+
+def _library() -> str:
+    assets: str = ''.join(
+        f'<asset id="r{i + 2}" name="Clip {i}" start="0s" duration="100s" format="r1">'
+        f'<media-rep kind="original-media" src="file:///clip{i}.mov"/></asset>'
+        for i in range(NUM_ASSETS)
+    )
+    assetClips: str = ''.join(
+        f'<asset-clip ref="r{i % NUM_ASSETS + 2}" name="Clip {i % NUM_ASSETS}"'
+        f' duration="100s"><keyword start="0s" duration="5s" value="k{i}"/></asset-clip>'
+        for i in range(NUM_ASSET_CLIPS)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><fcpxml version="1.10"><resources>'
+        f'<format id="r1" frameDuration="1/30s"/>{assets}</resources>'
+        f'<library><event name="E">{assetClips}</event></library></fcpxml>'
+    )
+
+def _lastProgress(run: t.Callable[[AssetClipsAsync, t.Callable], t.Awaitable]) -> ParseProgress:
+    progresses: list[ParseProgress] = []
+
+    async def main():
+        async with AssetClipsAsync(progressInterval=0.) as runner:
+            await run(runner, progresses.append)
+
+    asyncio.run(main())
+    assert progresses and progresses[-1].done
+    return progresses[-1]
+
+def testWritersCountAssetClips(tmp_path: Path):
+    # (the resources are called back too, but they aren't asset-clips)
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_text(_library(), encoding='utf-8')
+    progress: ParseProgress = _lastProgress(
+        lambda runner, onProgress: runner.writeCSV(xmlPath, tmp_path / 'Info.csv', onProgress)
+    )
+    assert progress.elementsProcessed == NUM_ASSET_CLIPS
+    assert progress.bytesRead == progress.totalBytes == xmlPath.stat().st_size
+    progress = _lastProgress(lambda runner, onProgress: runner.assetClips(xmlPath, onProgress))
+    assert progress.elementsProcessed == NUM_ASSET_CLIPS
+
+def testParseCountsEveryCallback():
+    callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+        './resources/asset': (lambda _refcon, _el: True, None),
+        './/keyword': (lambda _refcon, _el: True, None),
+    }
+    progress: ParseProgress = _lastProgress(
+        lambda runner, onProgress: runner.parse(_library().encode('utf-8'), callbacks,
+            onProgress=onProgress)
+    )
+    assert progress.elementsProcessed == NUM_ASSETS + NUM_ASSET_CLIPS
+
+def testLargeParses(tmp_path: Path):
+    runner = AssetClipsAsync(largeFileBytes=1000)
+    data: bytes = _library().encode('utf-8')
+    assert len(data) >= 1000
+    gzipPath: Path = tmp_path / 'Info.fcpxml.gz'
+    gzipPath.write_bytes(gzip.compress(data))
+    assert runner._isLarge(data, runner._size(data))
+    assert not runner._isLarge(data[:999], runner._size(data[:999]))
+    # the size of a gzip file's document isn't known
+    assert runner._size(gzipPath) is None and runner._isLarge(gzipPath, None)
+    # an Element has nothing left to parse
+    assert not runner._isLarge(fromstring(data), None)
+    runner.close()
@@ -0,0 +1,61 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests AssetClipsCSV's output, and that a failed write leaves the CSV
+#                that was already there alone.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+from pathlib import Path
+
+from fcpxml import AssetClipsCSV, AssetClipsOutputs, AssetClipsSource, CSVRowWriter, Stats
+
+from libraries import makeLibrary
+
+def _writeLibrary(path: Path, text: str) -> Path:
+    path.write_text(text, encoding='utf-8')
+    return path
+
+def testWriteCSV(tmp_path: Path):
+    library: str = makeLibrary()
+    xmlPath: Path = _writeLibrary(tmp_path / 'Info.fcpxml', library)
+    csvPath: Path = tmp_path / 'Info.csv'
+    stats = Stats()
+    assert AssetClipsCSV(xmlPath, stats=stats).writeCSV(csvPath)
+
+    lines: list[str] = csvPath.read_text(encoding='utf-8').splitlines()
+    assert lines[0] == CSVRowWriter.HEADER
+    assetClips = AssetClipsSource(library).assetClips()
+    assert assetClips is not None
+    numRows: int = sum(len(assetClip.keywordRanges) for assetClip in assetClips)
+    assert len(lines) == numRows + 1
+    assert stats.rowsWritten == numRows
+    assert lines[1].startswith('Clip 0-1,/Volumes/Media/clip 0.mov,')
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['Info.csv', 'Info.fcpxml']
+
+def testFailedWriteKeepsOldCSV(tmp_path: Path):
+    library: str = makeLibrary()
+    csvPath: Path = tmp_path / 'Info.csv'
+    assert AssetClipsCSV(_writeLibrary(tmp_path / 'Info.fcpxml', library)).writeCSV(csvPath)
+    old: bytes = csvPath.read_bytes()
+
+    # the library is cut off in the last event, long after the first rows are written
+    truncatedPath: Path = _writeLibrary(
+        tmp_path / 'Truncated.fcpxml', library[:library.rindex('<event')]
+    )
+    assert not AssetClipsCSV(truncatedPath).writeCSV(csvPath)
+    assert csvPath.read_bytes() == old
+    assert not (tmp_path / 'Info.csv.tmp').exists()
+
+    outputs = AssetClipsOutputs(truncatedPath, threaded=True)
+    outputs.addCSV(csvPath)
+    assert not outputs.write()
+    assert csvPath.read_bytes() == old
+    assert not (tmp_path / 'Info.csv.tmp').exists()
+
+    # and a new CSV isn't created at all
+    assert not AssetClipsCSV(truncatedPath).writeCSV(tmp_path / 'New.csv')
+    assert not (tmp_path / 'New.csv').exists()
+    assert not (tmp_path / 'New.csv.tmp').exists()
@@ -0,0 +1,155 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests AssetClipsDiff: how asset-clips and keyword ranges are matched
+#                up, which asset-clips it extracts, and writeDiff's output.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import typing as t
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+import pytest
+
+from fcpxml import AssetClip, AssetClipExtractor, AssetClipsDiff, KeywordRangeChange
+
+def _library(assetClips: list[tuple[str, list[str]]]) -> str:
+    # assetClips is a list of (name, keyword elements' attributes)
+    clips: str = ''.join(
+        f'<asset-clip name="{name}" duration="100s">'
+        + ''.join(f'<keyword {keyword}/>' for keyword in keywords)
+        + '</asset-clip>'
+        for name, keywords in assetClips
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><fcpxml version="1.10"><resources/>'
+        f'<library><event name="E">{clips}</event></library></fcpxml>'
+    )
+
+OLD: str = _library([
+    ('A', ['start="0s" duration="5s" value="one"']),
+    ('B', ['start="0s" duration="5s" value="two"']),
+    ('A', ['start="0s" duration="5s" value="three" note="old note"']),
+    ('C', ['start="10s" duration="5s" value="gone"', 'start="20s" duration="5s" value="gone"']),
+    ('E', ['start="1s" duration="2s" value="same"']),
+])
+NEW: str = _library([
+    # the first A is unchanged; the second one's note changed (so it's matched up with
+    # the second A, not the first)
+    ('A', ['start="0s" duration="5s" value="one"']),
+    ('D', ['start="0s" duration="1s" value="new"']),
+    ('B', ['start="0s" duration="5s" value="two"', 'start="5s" duration="5s" value="more"']),
+    ('A', ['start="0s" duration="5s" value="three" note="new note"']),
+    # the same times, written differently: not a change
+    ('E', ['start="30/30s" duration="60/30s" value="same"']),
+    # C was removed
+])
+
+def _changes(changes: list[KeywordRangeChange]) -> list[tuple]:
+    return [
+        (
+            change.kind, change.assetName,
+            change.oldRange.keywords if change.oldRange is not None else None,
+            change.oldRange.note if change.oldRange is not None else None,
+            change.newRange.keywords if change.newRange is not None else None,
+            change.newRange.note if change.newRange is not None else None,
+        )
+        for change in changes
+    ]
+
+def testDiff():
+    # in new document order, with the removed asset-clips last
+    changes: list[KeywordRangeChange] | None = AssetClipsDiff(OLD, NEW).diff()
+    assert changes is not None
+    assert _changes(changes) == [
+        ('added', 'D', None, None, ('new',), ''),
+        ('added', 'B', None, None, ('more',), ''),
+        ('modified', 'A', ('three',), 'old note', ('three',), 'new note'),
+        ('removed', 'C', ('gone',), '', None, None),
+        ('removed', 'C', ('gone',), '', None, None),
+    ]
+
+    # and the other way around
+    changes = AssetClipsDiff(NEW, OLD).diff()
+    assert changes is not None
+    assert _changes(changes) == [
+        ('removed', 'B', ('more',), '', None, None),
+        ('modified', 'A', ('three',), 'new note', ('three',), 'old note'),
+        ('added', 'C', None, None, ('gone',), ''),
+        ('added', 'C', None, None, ('gone',), ''),
+        ('removed', 'D', ('new',), '', None, None),
+    ]
+
+def testSameTimesMatchByOccurrence():
+    # keyword ranges with the same start and duration are matched up in order
+    old: str = _library([('A', ['start="0s" duration="5s" value="x"'] * 2)])
+    new: str = _library([('A', ['start="0s" duration="5s" value="x"'] * 2
+        + ['start="0s" duration="5s" value="y"'])])
+    changes: list[KeywordRangeChange] | None = AssetClipsDiff(old, new).diff()
+    assert changes is not None
+    assert _changes(changes) == [('added', 'A', None, None, ('y',), '')]
+
+def testExtractsOnlyTheChanges(monkeypatch: pytest.MonkeyPatch):
+    # Only the asset-clips that changed (new and old versions) or were removed are
+    # extracted, and the old export is only parsed a second time if anything changed.
+    extracted: list[str] = []
+    assetClip: t.Callable[[AssetClipExtractor, Element], AssetClip] = (
+        AssetClipExtractor.assetClip
+    )
+
+    def countingAssetClip(extractor: AssetClipExtractor, assetClipEl: Element) -> AssetClip:
+        extracted.append(assetClipEl.get('name', ''))
+        return assetClip(extractor, assetClipEl)
+
+    monkeypatch.setattr(AssetClipExtractor, 'assetClip', countingAssetClip)
+
+    def countParses(differ: AssetClipsDiff) -> list[int]:
+        parses: list[int] = [0]
+        parse = differ.oldParser.parse
+
+        def countingParse(*args: t.Any, **kwargs: t.Any) -> bool:
+            parses[0] += 1
+            return parse(*args, **kwargs)
+
+        monkeypatch.setattr(differ.oldParser, 'parse', countingParse)
+        return parses
+
+    differ = AssetClipsDiff(OLD, NEW)
+    oldParses: list[int] = countParses(differ)
+    assert differ.diff() is not None
+    # new: D, B, A (the second), E; then old: B, A (the second), C, E
+    assert extracted == ['D', 'B', 'A', 'E', 'B', 'A', 'C', 'E']
+    assert oldParses == [2]
+
+    extracted.clear()
+    differ = AssetClipsDiff(OLD, OLD)
+    oldParses = countParses(differ)
+    assert differ.diff() == []
+    assert extracted == []
+    assert oldParses == [1]
+
+def testWriteDiff(tmp_path: Path):
+    diffPath: Path = tmp_path / 'diff.txt'
+    assert AssetClipsDiff(OLD, NEW).writeDiff(diffPath)
+    assert diffPath.read_text(encoding='utf-8') == (
+        'D:\n'
+        '  + 0:00:00 - 0:00:02: new:\n'
+        'B:\n'
+        '  + 0:00:05 - 0:00:11: more:\n'
+        'A:\n'
+        '  ~ 0:00:00 - 0:00:06: three: old note\n'
+        '    0:00:00 - 0:00:06: three: new note\n'
+        'C:\n'
+        '  - 0:00:10 - 0:00:16: gone:\n'
+        '  - 0:00:20 - 0:00:26: gone:\n'
+    )
+
+    assert AssetClipsDiff(OLD, OLD).writeDiff(diffPath)
+    assert diffPath.read_text(encoding='utf-8') == ''
+
+    # (nothing is written if either export can't be parsed)
+    assert not AssetClipsDiff(OLD, NEW[:-20]).writeDiff(tmp_path / 'failed.txt')
+    assert not (tmp_path / 'failed.txt').exists()
@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests AssetClipsReport's output (rendered here, or by worker processes),
+#                and that a failed write leaves the report that was already there alone.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+from pathlib import Path
+
+import pytest
+
+from fcpxml import AssetClipsOutputs, AssetClipsReport, Stats
+
+from libraries import makeLibrary
+
+def _writeLibrary(path: Path, text: str) -> Path:
+    path.write_text(text, encoding='utf-8')
+    return path
+
+def testFailedWriteKeepsOldReport(tmp_path: Path):
+    library: str = makeLibrary()
+    reportPath: Path = tmp_path / 'Info.txt'
+    assert AssetClipsReport(_writeLibrary(tmp_path / 'Info.fcpxml', library)).writeReport(
+        reportPath
+    )
+    old: bytes = reportPath.read_bytes()
+    assert old.startswith(b'Clip 0-1: /Volumes/Media/clip 0.mov (')
+
+    truncatedPath: Path = _writeLibrary(
+        tmp_path / 'Truncated.fcpxml', library[:library.rindex('<event')]
+    )
+    for workers in (1, 2):
+        assert not AssetClipsReport(truncatedPath).writeReport(
+            reportPath, workers=workers, chunkSize=2
+        )
+        assert reportPath.read_bytes() == old
+        assert not (tmp_path / 'Info.txt.tmp').exists()
+
+@pytest.mark.parametrize('workers, chunkSize', [(2, 1), (2, 5), (3, 4), (4, 64)])
+def testWorkersMatchSerial(tmp_path: Path, workers: int, chunkSize: int):
+    # the report (and its line count) is exactly the same however it is rendered
+    xmlPath: Path = _writeLibrary(
+        tmp_path / 'Info.fcpxml', makeLibrary(numEvents=5, clipsPerEvent=7)
+    )
+    serialStats = Stats()
+    assert AssetClipsReport(xmlPath, stats=serialStats).writeReport(tmp_path / 'serial.txt')
+    serial: bytes = (tmp_path / 'serial.txt').read_bytes()
+    assert serialStats.linesWritten == serial.count(b'\n')
+
+    stats = Stats()
+    assert AssetClipsReport(xmlPath, stats=stats).writeReport(
+        tmp_path / 'workers.txt', workers=workers, chunkSize=chunkSize
+    )
+    assert (tmp_path / 'workers.txt').read_bytes() == serial
+    assert stats.linesWritten == serialStats.linesWritten
+
+    # (and alongside another sink, on its own thread)
+    outputs = AssetClipsOutputs(xmlPath, threaded=True)
+    outputs.addReport(tmp_path / 'threaded.txt', workers=workers, chunkSize=chunkSize)
+    outputs.addCSV(tmp_path / 'threaded.csv')
+    assert outputs.write()
+    assert (tmp_path / 'threaded.txt').read_bytes() == serial
@@ -0,0 +1,155 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests AssetClipsSQLite's database (its schema, and that it has what the
+#                CSV has), and that a failed write leaves the database that was already
+#                there alone.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import csv
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from fcpxml import AssetClip, AssetClipsCSV, AssetClipsSQLite, AssetClipsSource, SQLiteRowWriter
+
+from libraries import makeLibrary
+
+def _writeLibrary(path: Path, text: str) -> Path:
+    path.write_text(text, encoding='utf-8')
+    return path
+
+def _count(dbPath: Path, table: str) -> int:
+    db = sqlite3.connect(dbPath)
+    try:
+        return db.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+    finally:
+        db.close()
+
+def testFailedWriteKeepsOldDatabase(tmp_path: Path):
+    library: str = makeLibrary()
+    dbPath: Path = tmp_path / 'Info.db'
+    assert AssetClipsSQLite(_writeLibrary(tmp_path / 'Info.fcpxml', library)).writeSQLite(dbPath)
+    numRanges: int = _count(dbPath, 'keywordRanges')
+    assert numRanges > 0
+
+    truncatedPath: Path = _writeLibrary(
+        tmp_path / 'Truncated.fcpxml', library[:library.rindex('<event')]
+    )
+    assert not AssetClipsSQLite(truncatedPath).writeSQLite(dbPath)
+    assert _count(dbPath, 'keywordRanges') == numRanges
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'Info.db', 'Info.fcpxml', 'Truncated.fcpxml'
+    ]
+
+    # a temporary database left behind by a crash doesn't get in the way
+    (tmp_path / 'Info.db.tmp').write_bytes(b'not a database')
+    assert AssetClipsSQLite(tmp_path / 'Info.fcpxml').writeSQLite(dbPath)
+    assert _count(dbPath, 'keywordRanges') == numRanges
+    assert not (tmp_path / 'Info.db.tmp').exists()
+
+def _query(dbPath: Path, sql: str) -> list[tuple]:
+    db = sqlite3.connect(dbPath)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+def testSchema(tmp_path: Path):
+    dbPath: Path = tmp_path / 'Info.db'
+    assert AssetClipsSQLite(makeLibrary()).writeSQLite(dbPath)
+    assert _query(
+        dbPath, "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+        ' ORDER BY type, name'
+    ) == [
+        ('index', 'assetsName'),
+        ('index', 'keywordRangeKeywordsKeyword'),
+        ('index', 'keywordRangeKeywordsRange'),
+        ('index', 'keywordRangesAsset'),
+        ('index', 'keywordRangesYearMonth'),
+        ('index', 'keywordsKeyword'),
+        ('table', 'assets'),
+        ('table', 'keywordRangeKeywords'),
+        ('table', 'keywordRanges'),
+        ('table', 'keywords'),
+        ('view', 'keywordRangeDetails'),
+    ]
+    columns: dict[str, list[str]] = {
+        table: [row[1] for row in _query(dbPath, f'PRAGMA table_info({table})')]
+        for table in ('assets', 'keywords', 'keywordRanges', 'keywordRangeKeywords',
+            'keywordRangeDetails')
+    }
+    assert columns == {
+        'assets': ['id', 'name', 'ref', 'mediaPath', 'mediaDuration'],
+        'keywords': ['id', 'keyword'],
+        'keywordRanges': ['id', 'assetId', 'start', 'duration', 'timescale', 'startSeconds',
+            'endSeconds', 'year', 'month', 'note'],
+        'keywordRangeKeywords': ['keywordRangeId', 'keywordId', 'position'],
+        'keywordRangeDetails': ['id', 'assetName', 'mediaPath', 'timeRange', 'startSeconds',
+            'endSeconds', 'year', 'month', 'note', 'keywords'],
+    }
+    # the indexes are used
+    plan: list[tuple] = _query(
+        dbPath, "EXPLAIN QUERY PLAN SELECT * FROM keywordRanges WHERE year = '2001'"
+    )
+    assert 'keywordRangesYearMonth' in ' '.join(str(row[-1]) for row in plan)
+
+# times the generated libraries don't have: over an hour, exactly on a second, and
+# less than a frame
+TIMES_LIBRARY: str = (
+    '<fcpxml version="1.10"><resources><asset id="r1" name="A" start="0s"'
+    ' duration="36000s" src="file:///a.mov"/></resources><library><event name="E">'
+    '<asset-clip ref="r1" name="Long" duration="36000s">'
+    '<keyword start="3599s" duration="1s" value="1998, June"/>'
+    '<keyword start="7325s" duration="0s" value="x"/>'
+    '<keyword start="1/30000s" duration="1001/30000s" value="y" note="tiny"/>'
+    '<keyword start="35999s" duration="3s" value="z"/>'
+    '</asset-clip></event></library></fcpxml>'
+)
+
+def _compareWithCSV(tmp_path: Path, library: str):
+    # every keywordRangeDetails row is its CSV row (and keyword range)
+    dbPath: Path = tmp_path / 'Info.db'
+    csvPath: Path = tmp_path / 'Info.csv'
+    assert AssetClipsSQLite(library).writeSQLite(dbPath)
+    assert AssetClipsCSV(library).writeCSV(csvPath)
+    with open(csvPath, newline='', encoding='utf-8') as f:
+        csvRows: list[list[str]] = list(csv.reader(f))[1:]
+    assetClips: list[AssetClip] | None = AssetClipsSource(library).assetClips()
+    assert assetClips is not None
+    keywordRanges = [kr for assetClip in assetClips for kr in assetClip.keywordRanges]
+
+    details: list[tuple] = _query(
+        dbPath, 'SELECT assetName, mediaPath, timeRange, note, year, month, keywords,'
+        ' startSeconds, endSeconds FROM keywordRangeDetails ORDER BY id'
+    )
+    assert len(details) == len(csvRows) == len(keywordRanges)
+    for row, csvRow, kr in zip(details, csvRows, keywordRanges):
+        name, mediaPath, timeRange, note, year, month, keywords, startSeconds, endSeconds = row
+        csvRow += [''] * (7 - len(csvRow))
+        assert [name, mediaPath or '', timeRange, note, year or '', month or ''] == [
+            csvRow[0], csvRow[1], csvRow[3], csvRow[4], csvRow[5], csvRow[6]
+        ]
+        assert timeRange == kr.timeRange
+        assert (keywords or '') == ', '.join(kr.keywords)
+        assert startSeconds == kr.start / kr.timescale
+        assert endSeconds == (kr.start + kr.duration) / kr.timescale
+
+def testDetailsMatchCSV(tmp_path: Path):
+    _compareWithCSV(tmp_path, makeLibrary())
+    _compareWithCSV(tmp_path, TIMES_LIBRARY)
+
+def testBatches(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # tiny batches and transactions give the same database
+    library: str = makeLibrary()
+    assert AssetClipsSQLite(library).writeSQLite(tmp_path / 'one.db')
+    monkeypatch.setattr(SQLiteRowWriter, 'BATCH_SIZE', 3)
+    monkeypatch.setattr(SQLiteRowWriter, 'TRANSACTION_SIZE', 5)
+    assert AssetClipsSQLite(library).writeSQLite(tmp_path / 'many.db')
+    for table in ('assets', 'keywords', 'keywordRanges', 'keywordRangeKeywords'):
+        sql: str = f'SELECT * FROM {table} ORDER BY rowid'
+        assert _query(tmp_path / 'many.db', sql) == _query(tmp_path / 'one.db', sql)
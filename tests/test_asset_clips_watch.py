@@ -0,0 +1,123 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that AssetClipsWatcher writes exactly what AssetClipsCSV and
+#                AssetClipsReport write, and re-renders only the asset-clips (and the
+#                users of the assets) that changed.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+from pathlib import Path
+
+from fcpxml import AssetClipsCSV, AssetClipsReport, AssetClipsWatcher
+
+from libraries import makeLibrary
+
+def _assertSameAsWriters(tmp_path: Path, watcher: AssetClipsWatcher):
+    csvPath: Path = tmp_path / 'expected.csv'
+    reportPath: Path = tmp_path / 'expected.txt'
+    assert AssetClipsCSV(watcher.xmlPath).writeCSV(csvPath)
+    assert AssetClipsReport(watcher.xmlPath).writeReport(reportPath)
+    assert watcher.csvPath.read_bytes() == csvPath.read_bytes()
+    assert watcher.reportPath.read_bytes() == reportPath.read_bytes()
+
+def _watcher(tmp_path: Path, library: str) -> AssetClipsWatcher:
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_text(library, encoding='utf-8')
+    return AssetClipsWatcher(
+        xmlPath, csvPath=tmp_path / 'Info.csv', reportPath=tmp_path / 'Info.txt'
+    )
+
+def _edit(watcher: AssetClipsWatcher, old: str, new: str):
+    # replaces the first old in the library with new
+    library: str = watcher.xmlPath.read_text(encoding='utf-8')
+    assert old in library
+    watcher.xmlPath.write_text(library.replace(old, new, 1), encoding='utf-8')
+
+def testRegenerate(tmp_path: Path):
+    library: str = makeLibrary()
+    numAssetClips: int = library.count('<asset-clip ')
+    watcher: AssetClipsWatcher = _watcher(tmp_path, library)
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (numAssetClips, 0)
+    _assertSameAsWriters(tmp_path, watcher)
+
+    # nothing changed: everything is reused
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (0, numAssetClips)
+    _assertSameAsWriters(tmp_path, watcher)
+
+    # a note changed: just that asset-clip
+    _edit(watcher, 'note="short note"', 'note="a new, longer, note"')
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (1, numAssetClips - 1)
+    _assertSameAsWriters(tmp_path, watcher)
+
+    # an asset-clip was removed (and nothing needs rendering)
+    library = watcher.xmlPath.read_text(encoding='utf-8')
+    start: int = library.index('<asset-clip ref="r4"')
+    end: int = library.index('</asset-clip>', start) + len('</asset-clip>')
+    _edit(watcher, library[start:end], '')
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (0, numAssetClips - 1)
+    _assertSameAsWriters(tmp_path, watcher)
+
+def testAssetChanges(tmp_path: Path):
+    # An asset-clip is re-rendered when what its output uses of its asset changes,
+    # even though its own element hasn't.  (The first two asset-clips share r3, the
+    # next two r4.)
+    library: str = makeLibrary()
+    numAssetClips: int = library.count('<asset-clip ')
+    watcher: AssetClipsWatcher = _watcher(tmp_path, library)
+    assert watcher.regenerate()
+
+    # media path
+    _edit(watcher, 'file:///Volumes/Media/clip%200.mov', 'file:///Volumes/Moved/clip%200.mov')
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (2, numAssetClips - 2)
+    _assertSameAsWriters(tmp_path, watcher)
+
+    # duration
+    start: int = library.index('<asset id="r4"')
+    duration: str = library[start:].split('duration="', 1)[1].split('"', 1)[0]
+    _edit(watcher, f'<asset id="r4" name="Asset 1" start="0s" duration="{duration}"',
+        '<asset id="r4" name="Asset 1" start="0s" duration="3600s"')
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (2, numAssetClips - 2)
+    _assertSameAsWriters(tmp_path, watcher)
+
+    # the name (which the outputs don't use) changes nothing
+    _edit(watcher, 'name="Asset 2"', 'name="Renamed"')
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (0, numAssetClips)
+
+def testIdenticalAssetClips(tmp_path: Path):
+    # asset-clips with identical elements (and assets) are rendered once
+    library: str = makeLibrary()
+    start: int = library.index('<asset-clip ')
+    end: int = library.index('</asset-clip>', start) + len('</asset-clip>')
+    library = library[:end] + library[start:end] * 2 + library[end:]
+    numAssetClips: int = library.count('<asset-clip ')
+    watcher: AssetClipsWatcher = _watcher(tmp_path, library)
+    assert watcher.regenerate()
+    assert (watcher.numRendered, watcher.numReused) == (numAssetClips - 2, 2)
+    _assertSameAsWriters(tmp_path, watcher)
+
+def testPollWaitsForTheExportToSettle(tmp_path: Path):
+    watcher: AssetClipsWatcher = _watcher(tmp_path, makeLibrary())
+    watcher.debounce = 0.
+    assert not watcher.poll()  # changed: waiting to see that it has settled
+    assert watcher.poll()
+    assert watcher.lastSuccess
+    _assertSameAsWriters(tmp_path, watcher)
+    assert not watcher.poll()  # not changed since
+
+    # a failed regeneration isn't retried until there is a new export
+    watcher.xmlPath.write_text('<fcpxml><library>', encoding='utf-8')
+    assert not watcher.poll()
+    assert watcher.poll()
+    assert not watcher.lastSuccess
+    assert not watcher.poll()
+    assert not watcher.poll()
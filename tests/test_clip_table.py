@@ -0,0 +1,116 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that a ClipTable (and its views) give back the asset-clips that
+#                went into it.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import typing as t
+
+from fcpxml import AssetClip, AssetClipSelector, AssetClipsSource, ClipTable, KeywordRange
+from fcpxml.resource_index import AssetResource, FormatResource
+
+from libraries import makeLibrary
+
+def _summary(assetClips: t.Iterable[AssetClip]) -> list[tuple]:
+    # everything the outputs use, as plain values
+    output: list[tuple] = []
+    for assetClip in assetClips:
+        asset: AssetResource | None = assetClip.asset
+        assetFields: tuple | None = None
+        if asset is not None:
+            formatFields: tuple | None = None
+            if asset.format is not None:
+                formatFields = (
+                    asset.format.id, asset.format.name, asset.format.frameDuration,
+                    asset.format.timescale, asset.format.width, asset.format.height
+                )
+            assetFields = (
+                asset.id, asset.name, asset.src, asset.start, asset.duration, asset.timescale,
+                formatFields
+            )
+        output.append((
+            assetClip.name,
+            assetClip.ref,
+            assetFields,
+            [(kr.start, kr.duration, kr.timescale, kr.keywords, kr.note)
+                for kr in assetClip.keywordRanges],
+        ))
+    return output
+
+def _parsed() -> list[AssetClip]:
+    assetClips: list[AssetClip] | None = AssetClipsSource(makeLibrary()).assetClips()
+    assert assetClips is not None
+    return assetClips
+
+def testFromXML():
+    assetClips: list[AssetClip] = _parsed()
+    table: ClipTable | None = ClipTable.fromXML(makeLibrary())
+    assert table is not None
+    assert _summary(table.assetClips()) == _summary(assetClips)
+    assert len(table) == sum(len(assetClip.keywordRanges) for assetClip in assetClips)
+    # the assets (and formats) shared by asset-clips are stored once
+    assert len(table.assetIds) == len({id(ac.asset) for ac in assetClips if ac.asset})
+    assert len(table.formats) == 2
+
+def testNewAssetRecordsForEachAssetClip():
+    # Records that don't outlive their asset-clip (so their ids get reused) must not
+    # be mixed up.
+    def assetClips() -> t.Iterator[AssetClip]:
+        for i in range(20):
+            fmt = FormatResource(f'f{i % 3}', 'Format', 1001 * (i % 3 + 1), 30000, 1920, 1080)
+            asset = AssetResource(f'r{i}', f'A{i}', f'/m{i}.mov', 0, 100 * i, 25, fmt)
+            keywordRange = KeywordRange(i, 10, 25, (f'k{i}',), '')
+            yield AssetClip(f'C{i}', [keywordRange], None, f'r{i}', asset)
+
+    table: ClipTable = ClipTable.fromAssetClips(assetClips())
+    assert [(ac.name, ac.mediaPath) for ac in table.assetClips()] == [
+        (f'C{i}', f'/m{i}.mov') for i in range(20)
+    ]
+    assert _summary(table.assetClips()) == _summary(assetClips())
+    assert len(table.assetIds) == 20
+    assert len(table.formats) == 3
+
+def testRoundTrips():
+    assetClips: list[AssetClip] = _parsed()
+    table: ClipTable = ClipTable.fromAssetClips(assetClips)
+    assert _summary(table.assetClips()) == _summary(assetClips)
+
+    # from a table's (new, short-lived) records, and from a view of it
+    copy: ClipTable = ClipTable.fromAssetClips(table.assetClips())
+    assert _summary(copy.assetClips()) == _summary(assetClips)
+    viewCopy: ClipTable | None = ClipTable.fromXML(table.view())
+    assert viewCopy is not None
+    # (a view only has the asset-clips that have rows)
+    assert _summary(viewCopy.assetClips()) == _summary(
+        assetClip for assetClip in assetClips if assetClip.keywordRanges
+    )
+
+    # appending after compact() still works
+    copy.append(assetClips[0])
+    assert _summary(copy.assetClips()) == _summary(assetClips + assetClips[:1])
+
+def testViews():
+    assetClips: list[AssetClip] = _parsed()
+    table: ClipTable = ClipTable.fromAssetClips(assetClips)
+    rows: list[tuple[str, KeywordRange]] = [
+        (assetClip.name, kr) for assetClip in assetClips for kr in assetClip.keywordRanges
+    ]
+    assert [table.assetName(row) for row in table[3:9]] == [name for name, _ in rows[3:9]]
+    assert [table.keywords(row) for row in table[3:9][1:4]] == [
+        kr.keywords for _, kr in rows[4:7]
+    ]
+    withNotes = table.filter(lambda row: table.note(row) != '')
+    assert [table.note(row) for row in withNotes] == [kr.note for _, kr in rows if kr.note]
+
+    selector = AssetClipSelector(assetNamePattern='Clip 1-*', year=2002, limit=2)
+    expected: list[AssetClip] = []
+    for assetClip in assetClips:
+        selected: AssetClip | None = selector.select(assetClip)
+        if selected is not None:
+            expected.append(selected)
+    assert expected
+    assert _summary(table.select(selector).assetClips()) == _summary(expected)
@@ -0,0 +1,192 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests KeywordIndex's postings lists and interval trees against brute
+#                force searches of the same asset-clips.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import random
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+from fcpxml import AssetClip, KeywordIndex, KeywordRange, Utils
+
+NAMES: list[str] = ['A.mov', 'B.mov', 'C.mov']
+KEYWORDS: list[str] = [
+    'Alice', 'Bob', 'Beach', '1999', '2000', '1998-2001', 'January', 'July', 'December'
+]
+TIMESCALES: list[int] = [1, 25, 30000, 600]
+
+def _assetClips(seed: int, numAssetClips: int = 60) -> list[AssetClip]:
+    # Asset-clips with the same names (so each name's keyword ranges come from several
+    # asset-clips, in different timescales), including zero-length keyword ranges, and
+    # keyword ranges that touch or share their start or end.
+    rng = random.Random(seed)
+    assetClips: list[AssetClip] = []
+    for _ in range(numAssetClips):
+        keywordRanges: list[KeywordRange] = []
+        for _ in range(rng.randrange(0, 6)):
+            timescale: int = rng.choice(TIMESCALES)
+            start: int = rng.randrange(0, 20) * timescale // rng.choice((1, 2))
+            duration: int = rng.choice((0, 0, timescale, 2 * timescale, rng.randrange(100)))
+            keywords: tuple[str, ...] = tuple(rng.sample(KEYWORDS, rng.randrange(0, 4)))
+            keywordRanges.append(KeywordRange(start, duration, timescale, keywords, ''))
+        assetClips.append(AssetClip(rng.choice(NAMES), keywordRanges))
+    return assetClips
+
+def _queries(seed: int) -> list[tuple[Fraction, Fraction]]:
+    # random time ranges, plus ranges that start or end exactly where keyword ranges do
+    rng = random.Random(seed)
+    queries: list[tuple[Fraction, Fraction]] = []
+    for _ in range(200):
+        start = Fraction(rng.randrange(-2, 22), rng.choice((1, 2, 25)))
+        queries.append((start, start + Fraction(rng.randrange(0, 8), rng.choice((1, 2, 25)))))
+    for assetClip in _assetClips(seed):
+        for kr in assetClip.keywordRanges:
+            start = Fraction(kr.start, kr.timescale)
+            end = Fraction(kr.start + kr.duration, kr.timescale)
+            queries.extend([(start, end), (end, end + 1), (start - 1, start), (start, start)])
+    return queries
+
+def _overlapping(
+    assetClips: list[AssetClip],
+    assetName: str,
+    start: Fraction,
+    end: Fraction
+) -> list[KeywordRange]:
+    # brute force: starts before end, and ends after start, where zero-length keyword
+    # ranges and queries are instants (sorted by start, and then document order)
+    found: list[tuple[Fraction, int, KeywordRange]] = []
+    for assetClip in assetClips:
+        if assetClip.name != assetName:
+            continue
+        for kr in assetClip.keywordRanges:
+            krStart = Fraction(kr.start, kr.timescale)
+            krEnd = Fraction(kr.start + kr.duration, kr.timescale)
+            if krStart == krEnd:
+                overlaps = start <= krStart < end or start == end == krStart
+            elif start == end:
+                overlaps = krStart <= start < krEnd
+            else:
+                overlaps = krStart < end and krEnd > start
+            if overlaps:
+                found.append((krStart, len(found), kr))
+    found.sort(key=lambda item: item[:2])
+    return [kr for _, _, kr in found]
+
+def _inYear(kr: KeywordRange, year: int) -> bool:
+    for keyword in kr.keywords:
+        if Utils.isYear(keyword):
+            firstYear, _, lastYear = keyword.partition('-')
+            if int(firstYear) <= year <= int(lastYear or firstYear):
+                return True
+    return False
+
+def _find(
+    assetClips: list[AssetClip],
+    keyword: str | None,
+    year: int | None,
+    month: str | None
+) -> list[tuple[AssetClip, KeywordRange]]:
+    # brute force, in document order
+    return [
+        (assetClip, kr)
+        for assetClip in assetClips
+        for kr in assetClip.keywordRanges
+        if (keyword is None or keyword in kr.keywords)
+        and (year is None or _inYear(kr, year))
+        and (month is None or month in kr.keywords)
+    ]
+
+def _findQueries() -> list[tuple[str | None, int | None, str | None]]:
+    return [
+        (keyword, year, month)
+        for keyword in (None, 'Alice', 'Beach', '1999', 'July', 'Nobody')
+        for year in (None, 1998, 1999, 2000, 2001, 2024)
+        for month in (None, 'January', 'July', 'March')
+    ]
+
+def _summary(keywordRanges: list[KeywordRange]) -> list[tuple]:
+    # (keyword ranges loaded from a saved index are copies)
+    return [(kr.start, kr.duration, kr.timescale, kr.keywords, kr.note) for kr in keywordRanges]
+
+@pytest.mark.parametrize('seed', range(5))
+def testOverlappingMatchesBruteForce(seed: int):
+    assetClips: list[AssetClip] = _assetClips(seed)
+    index = KeywordIndex(assetClips)
+    for start, end in _queries(seed):
+        for name in NAMES + ['Missing.mov']:
+            expected: list[KeywordRange] = _overlapping(assetClips, name, start, end)
+            found: list[KeywordRange] = index.overlapping(name, start, end)
+            assert [id(kr) for kr in found] == [id(kr) for kr in expected], (name, start, end)
+
+def testOverlappingEdges():
+    # Touching ranges don't overlap; an instant (zero-length) overlaps a range it's in.
+    a = KeywordRange(0, 10, 1, ('a',), '')
+    b = KeywordRange(10, 10, 1, ('b',), '')
+    point = KeywordRange(5, 0, 1, ('point',), '')
+    edge = KeywordRange(10, 0, 1, ('edge',), '')
+    index = KeywordIndex([AssetClip('A.mov', [a, b, point, edge])])
+    assert index.overlapping('A.mov', 0, 10) == [a, point]
+    assert index.overlapping('A.mov', 10, 20) == [b, edge]
+    assert index.overlapping('A.mov', 9, 11) == [a, b, edge]
+    assert index.overlapping('A.mov', 20, 30) == []
+    assert index.overlapping('A.mov', 5, 5) == [a, point]
+    assert index.overlapping('A.mov', 10, 10) == [b, edge]
+    assert index.overlapping('A.mov', Fraction(19, 2), Fraction(19, 2)) == [a]
+    assert index.overlapping('A.mov', 20, 20) == []
+    assert index.overlapping('A.mov', 6, 5) == []
+    assert index.overlapping('A.mov', '0:00:04', '0:00:06') == [a, point]
+
+@pytest.mark.parametrize('seed', range(5))
+def testFindMatchesBruteForce(seed: int):
+    assetClips: list[AssetClip] = _assetClips(seed)
+    index = KeywordIndex(assetClips)
+    for keyword, year, month in _findQueries():
+        expected: list[tuple[AssetClip, KeywordRange]] = _find(assetClips, keyword, year, month)
+        found: list[tuple[AssetClip, KeywordRange]] = index.find(keyword, year, month)
+        assert [(id(ac), id(kr)) for ac, kr in found] == [
+            (id(ac), id(kr)) for ac, kr in expected
+        ], (keyword, year, month)
+
+def testFindBisectIntersection(monkeypatch: pytest.MonkeyPatch):
+    # (with a ratio of 1, every intersection looks ids up by binary search)
+    assetClips: list[AssetClip] = _assetClips(7, numAssetClips=300)
+    monkeypatch.setattr(KeywordIndex, 'BISECT_RATIO', 1)
+    index = KeywordIndex(assetClips)
+    for keyword, year, month in _findQueries():
+        assert [kr for _, kr in index.find(keyword, year, month)] == [
+            kr for _, kr in _find(assetClips, keyword, year, month)
+        ]
+
+def testSaveLoadRoundTrip(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    assetClips: list[AssetClip] = _assetClips(3)
+    index = KeywordIndex(assetClips)
+    indexPath: Path = tmp_path / 'keywords.index'
+    assert index.save(indexPath)
+
+    loaded: KeywordIndex | None = KeywordIndex.load(indexPath)
+    assert loaded is not None
+    assert loaded.keywords() == index.keywords()
+    assert loaded.years() == index.years()
+    assert loaded.months() == index.months()
+    assert [ac.name for ac in loaded.assetClips] == [ac.name for ac in assetClips]
+    for keyword, year, month in _findQueries():
+        assert _summary([kr for _, kr in loaded.find(keyword, year, month)]) == _summary(
+            [kr for _, kr in index.find(keyword, year, month)]
+        )
+    for start, end in _queries(3)[:100]:
+        for name in NAMES:
+            assert _summary(loaded.overlapping(name, start, end)) == _summary(
+                index.overlapping(name, start, end)
+            )
+
+    # an index saved by a different version isn't loaded
+    monkeypatch.setattr(KeywordIndex, 'FORMAT_VERSION', KeywordIndex.FORMAT_VERSION + 1)
+    assert KeywordIndex.load(indexPath) is None
+    assert KeywordIndex.load(tmp_path / 'missing.index') is None
@@ -0,0 +1,79 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that LibraryCache entries are keyed by the file as it was when
+#                it was parsed.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import os
+from pathlib import Path
+
+from fcpxml import AssetClip, AssetClipsSource, LibraryCache
+
+def _library(note: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><fcpxml version="1.10"><resources>'
+        '<asset id="r2" name="A" start="0s" duration="100s"/></resources>'
+        '<library><event name="E"><asset-clip ref="r2" name="A" duration="100s">'
+        f'<keyword start="0s" duration="5s" value="k" note="{note}"/>'
+        '</asset-clip></event></library></fcpxml>'
+    )
+
+def _notes(assetClips: list[AssetClip] | None) -> list[str] | None:
+    if assetClips is None:
+        return None
+    return [kr.note for assetClip in assetClips for kr in assetClip.keywordRanges]
+
+def testStoreAndLoad(tmp_path: Path):
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_text(_library('first'), encoding='utf-8')
+    cache = LibraryCache(tmp_path / 'cache.sqlite')
+
+    source = AssetClipsSource(xmlPath, cache)
+    assert source.cachedAssetClips is None and source.cacheKey is not None
+    assert _notes(source.assetClips()) == ['first']
+
+    source = AssetClipsSource(xmlPath, cache)
+    assert _notes(source.cachedAssetClips) == ['first']
+
+    # a new export (with the same contents, even) is found by its contents
+    os.utime(xmlPath, ns=(0, 0))
+    source = AssetClipsSource(xmlPath, cache)
+    assert _notes(source.cachedAssetClips) == ['first']
+
+    xmlPath.write_text(_library('second'), encoding='utf-8')
+    source = AssetClipsSource(xmlPath, cache)
+    assert source.cachedAssetClips is None
+    assert _notes(source.assetClips()) == ['second']
+    cache.close()
+
+def testFileChangedWhileParsing(tmp_path: Path):
+    # What was parsed from the old file must not be stored under the new file's hash,
+    # or under the old file's (the key's stat no longer matches the file).
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_text(_library('old'), encoding='utf-8')
+    cache = LibraryCache(tmp_path / 'cache.sqlite')
+
+    source = AssetClipsSource(xmlPath, cache)
+    oldKey = source.cacheKey
+    assert oldKey is not None
+    xmlPath.write_text(_library('newer'), encoding='utf-8')
+    assert _notes(source.assetClips()) == ['old']
+
+    assert cache.load(oldKey) is None
+    newKey = cache.key(xmlPath)
+    assert newKey is not None and newKey[3] != oldKey[3]
+    assert cache.load(newKey) is None
+    assert _notes(AssetClipsSource(xmlPath, cache).assetClips()) == ['newer']
+    assert _notes(cache.load(newKey)) == ['newer']
+    cache.close()
+
+def testMissingFile(tmp_path: Path):
+    cache = LibraryCache(tmp_path / 'cache.sqlite')
+    assert cache.key(tmp_path / 'missing.fcpxml') is None
+    source = AssetClipsSource(tmp_path / 'missing.fcpxml', cache)
+    assert source.cacheKey is None and not source.isValid
+    cache.close()
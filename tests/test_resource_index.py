@@ -0,0 +1,128 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests which media ResourceIndex picks for an asset, and the Media Path
+#                and Media Duration the outputs get from it.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import csv
+from pathlib import Path
+from xml.etree.ElementTree import fromstring
+
+import pytest
+
+from fcpxml import AssetClipsCSV, AssetClipsReport, AssetResource, ResourceIndex, XMLParser
+
+from libraries import makeLibrary
+
+ORIGINAL: str = '<media-rep kind="original-media" src="file:///Media/Original%20Clip.mov"/>'
+PROXY: str = '<media-rep kind="proxy-media" src="file:///Media/Proxy.mov"/>'
+
+@pytest.mark.parametrize('attributes, mediaReps, src', [
+    ('', ORIGINAL, 'file:///Media/Original%20Clip.mov'),
+    # the original media wins, wherever it is
+    ('', PROXY + ORIGINAL, 'file:///Media/Original%20Clip.mov'),
+    ('src="file:///Media/Old.mov"', ORIGINAL, 'file:///Media/Original%20Clip.mov'),
+    # a media-rep without a kind is the original media
+    ('', '<media-rep src="file:///Media/NoKind.mov"/>' + PROXY, 'file:///Media/NoKind.mov'),
+    # failing that, the asset's own src (older versions of FCPXML), or else the proxy
+    ('src="file:///Media/Old.mov"', PROXY, 'file:///Media/Old.mov'),
+    ('', PROXY, 'file:///Media/Proxy.mov'),
+    ('', '', ''),
+])
+def testMediaRepSelection(attributes: str, mediaReps: str, src: str):
+    resources = ResourceIndex()
+    asset: AssetResource = resources.addAsset(fromstring(
+        f'<asset id="r2" name="A" start="0s" duration="10s" {attributes}>{mediaReps}</asset>'
+    ))
+    assert asset.src == src
+    assert resources.asset('r2') is asset
+    assert resources.asset('r3') is None
+
+def testTimesAndFormats():
+    resources = ResourceIndex()
+    resources.addFormat(fromstring(
+        '<format id="r1" name="FFVideoFormat1080p2997" frameDuration="1001/30000s"'
+        ' width="1920" height="1080"/>'
+    ))
+    resources.addFormat(fromstring('<format id="r2" name="FFVideoFormatRateUndefined"/>'))
+    # start and duration in different units end up in the same (exact) units
+    asset: AssetResource = resources.addAsset(fromstring(
+        '<asset id="r3" start="1001/30000s" duration="3/2s" format="r1"/>'
+    ))
+    assert (asset.start, asset.duration, asset.timescale) == (1001, 45000, 30000)
+    assert asset.format is resources.format('r1')
+    assert (asset.format.frameDuration, asset.format.timescale) == (1001, 30000)
+    assert (asset.format.width, asset.format.height) == (1920, 1080)
+    assert (resources.format('r2').frameDuration, resources.format('r2').timescale) == (0, 0)
+    assert resources.addAsset(fromstring('<asset id="r4" format="r9"/>')).format is None
+
+@pytest.mark.parametrize('src, mediaPath', [
+    ('file:///Volumes/Media/Clip%20%231.mov', '/Volumes/Media/Clip #1.mov'),
+    ('file:///Users/me/Caf%C3%A9.mov', '/Users/me/Café.mov'),
+    ('file://localhost/Media/Clip.mov', '/Media/Clip.mov'),
+    ('https://example.com/clip.mov', 'https://example.com/clip.mov'),
+    ('', ''),
+])
+def testMediaPath(src: str, mediaPath: str):
+    assert AssetResource('r1', 'A', src, 0, 0, 1).mediaPath == mediaPath
+
+@pytest.mark.parametrize('duration, timescale, text', [
+    (0, 30000, '0:00:00'),
+    (30000, 30000, '0:00:01'),
+    (30001, 30000, '0:00:02'),  # (rounded up)
+    (1001 * 2398, 30000, '0:01:21'),
+    (3600 * 25 + 1, 25, '1:00:01'),
+    (100, 0, ''),  # (no time at all)
+])
+def testDurationText(duration: int, timescale: int, text: str):
+    assert AssetResource('r1', 'A', '', 0, duration, timescale).durationText == text
+
+def testFromParser():
+    library: str = makeLibrary()
+    resources: ResourceIndex | None = ResourceIndex.fromParser(XMLParser(library))
+    assert resources is not None
+    assert sorted(resources.formats) == ['r1', 'r2']
+    assert len(resources.assets) == library.count('<asset ')
+    assert ResourceIndex.fromParser(XMLParser(library[:-20], streaming=True)) is None
+
+def testOutputColumns(tmp_path: Path):
+    # Media Path and Media Duration in the CSV, and the report's asset-clip lines: the
+    # assets in makeLibrary take turns giving their media as an original media-rep, a
+    # proxy and then an original media-rep, just a proxy, and a src attribute, and the
+    # last asset-clip of each event has no asset (so no Media Path or Duration)
+    library: str = makeLibrary(numEvents=1, clipsPerEvent=9)
+    csvPath: Path = tmp_path / 'Info.csv'
+    assert AssetClipsCSV(library).writeCSV(csvPath)
+    with open(csvPath, newline='', encoding='utf-8') as f:
+        rows: list[list[str]] = list(csv.reader(f))
+    assert rows[0][:3] == ['Movie Name', 'Media Path', 'Media Duration']
+
+    resources: ResourceIndex | None = ResourceIndex.fromParser(XMLParser(library))
+    assert resources is not None
+    expected: dict[str, tuple[str, str]] = {}
+    for c in range(8):
+        asset: AssetResource | None = resources.asset(f'r{c // 2 + 3}')
+        assert asset is not None
+        expected[f'Clip 0-{max(c, 1)}'] = (asset.mediaPath, asset.durationText)
+    expected['Clip 0-8'] = ('', '')
+    # (Clip 0-4 has no keyword ranges, so no rows)
+    assert {row[0]: (row[1], row[2]) for row in rows[1:]} == {
+        name: columns for name, columns in expected.items() if name != 'Clip 0-4'
+    }
+    assert [expected[f'Clip 0-{c}'][0] for c in (2, 4, 6, 8)] == [
+        '/Volumes/Media/clip 1.mov', '/Volumes/Proxies/clip2.mov',
+        '/Volumes/Media/clip 3.mov', ''
+    ]
+
+    reportPath: Path = tmp_path / 'Info.txt'
+    assert AssetClipsReport(library).writeReport(reportPath)
+    headings: list[str] = [
+        line for line in reportPath.read_text(encoding='utf-8').splitlines()
+        if line.startswith('Clip ')
+    ]
+    assert headings[2] == f'Clip 0-2: /Volumes/Media/clip 1.mov ({expected["Clip 0-2"][1]})'
+    assert headings[-1] == 'Clip 0-8:'
@@ -0,0 +1,159 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests Utils.TextWrapper against textwrap.wrap, which it used to call
+#                for every write.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import io
+import random
+import textwrap
+
+import pytest
+
+from fcpxml import Utils
+
+class _TextwrapWrapper:
+    # What TextWrapper used to do (textwrap.wrap, with the current line passed in as
+    # initial_indent), except for the column after a write, which it used to get wrong
+    # when the text wrapped onto several lines, or was white-space with newlines in it.
+    def __init__(self, f: io.StringIO, wrapAt: int, wrapIndent: int, tab: int = 4):
+        self.f: io.StringIO = f
+        self.wrapAt: int = wrapAt
+        self.wrapIndent: int = wrapIndent
+        self.tab: int = tab
+        self.column: int = 0
+
+    def write(self, text: str):
+        if not text:
+            return
+        lines: list[str] = textwrap.wrap(
+            text,
+            width=self.wrapAt,
+            initial_indent=' ' * self.column,
+            subsequent_indent=' ' * self.wrapIndent,
+            tabsize=self.tab,
+            break_long_words=False,
+        )
+        if not lines:
+            self.f.write(text)
+            newline: int = text.rfind('\n')
+            if newline == -1:
+                self.column += len(text)
+            else:
+                self.column = len(text) - newline - 1
+            return
+        lines[0] = lines[0][self.column:]
+        self.f.write('\n'.join(lines))
+        if len(lines) == 1:
+            self.column += len(lines[0])
+        else:
+            self.column = len(lines[-1])
+
+    def writeLine(self, text: str):
+        self.write(text)
+        self.f.write('\n')
+        self.column = 0
+
+WORDS: list[str] = [
+    'a', 'bb', 'word', '-', '--', ' ', '  ', '\t', '\n', '\r', 'x-y', 'longword' * 6,
+    '\xa0', 'é', ',', ':'
+]
+
+@pytest.mark.parametrize('seed', range(4))
+def testMatchesTextwrap(seed: int):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        wrapAt: int = rng.randint(5, 60)
+        wrapIndent: int = rng.randint(0, min(wrapAt - 1, 30))
+        expected = io.StringIO()
+        output = io.StringIO()
+        reference = _TextwrapWrapper(expected, wrapAt, wrapIndent)
+        wrapper = Utils.TextWrapper(output, wrapAt, wrapIndent)
+        for _ in range(rng.randint(1, 8)):
+            text: str
+            if rng.random() < 0.2:
+                text = ''.join(
+                    rng.choice([' ', '\t', '\n', '  ']) for _ in range(rng.randint(1, 4))
+                )
+            else:
+                text = ''.join(rng.choice(WORDS) for _ in range(rng.randint(0, 15)))
+            if rng.random() < 0.3:
+                reference.writeLine(text)
+                wrapper.writeLine(text)
+            else:
+                reference.write(text)
+                wrapper.write(text)
+        wrapper.flush()
+        assert output.getvalue() == expected.getvalue()
+        assert output.getvalue().count('\n') == wrapper.linesWritten
+
+def testWhiteSpaceWithNewlines():
+    # white-space is written as it is, and the column is what follows the last newline
+    output = io.StringIO()
+    wrapper = Utils.TextWrapper(output, wrapAt=12, wrapIndent=2)
+    wrapper.write('abc')
+    wrapper.write(' \n   ')
+    wrapper.write('defgh ijklm')
+    wrapper.flush()
+    assert output.getvalue() == 'abc \n   defgh\n  ijklm'
+    assert wrapper.linesWritten == 2
+
+def testColumnAfterWrapping():
+    output = io.StringIO()
+    wrapper = Utils.TextWrapper(output, wrapAt=10, wrapIndent=4)
+    wrapper.write('one two three')
+    assert wrapper._currLinePos == 9
+    wrapper.write('!')
+    wrapper.flush()
+    assert output.getvalue() == 'one two\n    three!'
+
+def testDryRun():
+    output = io.StringIO()
+    wrapper = Utils.TextWrapper(output, wrapAt=10, wrapIndent=4, dryRun=True)
+    wrapper.write('one two three')
+    wrapper.writeLine('')
+    wrapper.write('four')
+    wrapper.flush()
+    assert output.getvalue() == ''
+    assert wrapper.linesWritten == 2
+    assert wrapper._currLinePos == 4
+
+def testFlushing(tmp_path):
+    # output is buffered until it is flushed: by flush(), close(), the end of a with
+    # block, or (as a last resort) garbage collection
+    output = io.StringIO()
+    wrapper = Utils.TextWrapper(output)
+    wrapper.writeLine('one')
+    assert output.getvalue() == ''
+    wrapper.close()
+    assert output.getvalue() == 'one\n'
+
+    output = io.StringIO()
+    with Utils.TextWrapper(output) as wrapper:
+        wrapper.writeLine('two')
+    assert output.getvalue() == 'two\n'
+
+    output = io.StringIO()
+    with pytest.raises(RuntimeError):
+        with Utils.TextWrapper(output) as wrapper:
+            wrapper.writeLine('three')
+            raise RuntimeError()
+    assert output.getvalue() == 'three\n'
+
+    reportPath = tmp_path / 'report.txt'
+    with open(reportPath, 'wt', encoding='utf-8') as f:
+        wrapper = Utils.TextWrapper(f)
+        wrapper.write('four')
+        del wrapper
+    assert reportPath.read_text(encoding='utf-8') == 'four'
+
+    # (too late: the file is already closed, but that's not an error)
+    with open(reportPath, 'wt', encoding='utf-8') as f:
+        wrapper = Utils.TextWrapper(f)
+        wrapper.write('five')
+    del wrapper
+    assert reportPath.read_text(encoding='utf-8') == ''
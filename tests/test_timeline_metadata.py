@@ -0,0 +1,222 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests TimelineExtractor's timeline positions (and trimming) on small
+#                hand-made libraries.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+from fractions import Fraction
+
+import pytest
+
+from fcpxml import TimelineExtractor, TimelineItem, XMLParser
+
+# (project, kind, value, start, duration, clipName, compounds)
+_Item = tuple[str, str, str, Fraction, Fraction, str, tuple[str, ...]]
+
+def _library(resources: str, projects: str) -> str:
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<fcpxml version="1.10">
+ <resources>
+  <format id="r1" name="FFVideoFormat1080p30" frameDuration="1/30s"/>
+  <asset id="r2" name="A" start="0s" duration="1000s" format="r1"/>
+  {resources}
+ </resources>
+ <library>
+  <event name="E">
+   {projects}
+  </event>
+ </library>
+</fcpxml>'''
+
+def _items(xml: str, streaming: bool) -> list[_Item]:
+    parser = XMLParser(xml.encode('utf-8'), streaming=streaming)
+    items: list[TimelineItem] | None = TimelineExtractor().extract(parser)
+    assert items is not None
+    return [
+        (item.project, item.kind, item.value, item.start, item.duration, item.clipName,
+            item.compounds)
+        for item in items
+    ]
+
+def _s(seconds: str) -> Fraction:
+    return Fraction(seconds)
+
+@pytest.mark.parametrize('streaming', [False, True])
+def testConnectedSpines(streaming: bool):
+    # A connected spine's offset is in its parent clip's time.  A spine with no start
+    # has its parent's time; one with a start maps its start to its offset.
+    xml: str = _library('', '''
+   <project name="P">
+    <sequence format="r1" duration="60s" tcStart="0s">
+     <spine>
+      <asset-clip ref="r2" name="A1" offset="10s" start="100s" duration="20s">
+       <spine lane="1" offset="105s">
+        <asset-clip ref="r2" name="S1" offset="105s" start="50s" duration="4s">
+         <marker start="51s" duration="1/30s" value="in S1"/>
+         <marker start="54s" duration="1/30s" value="after S1"/>
+        </asset-clip>
+       </spine>
+       <spine lane="2" offset="110s" start="5s">
+        <asset-clip ref="r2" name="S2" offset="5s" start="0s" duration="2s">
+         <chapter-marker start="1s" duration="1/30s" value="in S2"/>
+        </asset-clip>
+       </spine>
+      </asset-clip>
+     </spine>
+    </sequence>
+   </project>''')
+    assert _items(xml, streaming) == [
+        ('P', 'marker', 'in S1', _s('16'), _s('1/30'), 'S1', ()),
+        ('P', 'chapter-marker', 'in S2', _s('21'), _s('1/30'), 'S2', ()),
+    ]
+
+@pytest.mark.parametrize('streaming', [False, True])
+def testTrimmedClipEdges(streaming: bool):
+    # Items crossing a clip's start or end are trimmed to it, items outside it are
+    # dropped; a zero-duration marker at the clip's start is visible, one at its end
+    # isn't.  sourceStart stays the item's start in the clip.
+    xml: str = _library('', '''
+   <project name="P">
+    <sequence format="r1" duration="60s" tcStart="0s">
+     <spine>
+      <asset-clip ref="r2" name="A1" offset="0s" start="100s" duration="10s">
+       <keyword start="95s" duration="10s" value="crosses start"/>
+       <marker start="99s" duration="1/30s" value="before start"/>
+       <marker start="100s" value="zero at start"/>
+       <marker start="109s" duration="2s" value="crosses end"/>
+       <marker start="110s" value="zero at end"/>
+       <marker start="110s" duration="1s" value="after end"/>
+      </asset-clip>
+      <asset-clip ref="r2" name="A2" offset="10s" start="0s" duration="5s">
+       <marker start="0s" value="zero at next start"/>
+      </asset-clip>
+     </spine>
+    </sequence>
+   </project>''')
+    assert _items(xml, streaming) == [
+        ('P', 'keyword', 'crosses start', _s('0'), _s('5'), 'A1', ()),
+        ('P', 'marker', 'zero at start', _s('0'), _s('0'), 'A1', ()),
+        ('P', 'marker', 'crosses end', _s('9'), _s('1'), 'A1', ()),
+        ('P', 'marker', 'zero at next start', _s('10'), _s('0'), 'A2', ()),
+    ]
+    parser = XMLParser(xml.encode('utf-8'), streaming=streaming)
+    items: list[TimelineItem] | None = TimelineExtractor().extract(parser)
+    assert items is not None
+    assert [item.sourceStart for item in items] == [_s('95'), _s('100'), _s('109'), _s('0')]
+    assert items[0].keywords == ('crosses start',)
+
+# Inner is used by Middle, which is used by Outer (each in a connected ref-clip), and
+# Outer is used by two projects (trimmed differently).
+NESTED_COMPOUNDS: str = '''
+  <media id="r3" name="Inner">
+   <sequence format="r1" duration="5s" tcStart="0s">
+    <spine>
+     <title name="TI" offset="0s" start="0s" duration="5s">
+      <marker start="1s" duration="1s" value="inner"/>
+      <marker start="4s" duration="1s" value="inner late"/>
+     </title>
+    </spine>
+   </sequence>
+  </media>
+  <media id="r4" name="Middle">
+   <sequence format="r1" duration="10s" tcStart="0s">
+    <spine>
+     <gap name="GM" offset="0s" start="0s" duration="10s">
+      <marker start="2s" duration="1s" value="middle"/>
+      <ref-clip ref="r3" lane="1" name="I" offset="3s" start="0s" duration="5s"/>
+     </gap>
+    </spine>
+   </sequence>
+  </media>
+  <media id="r5" name="Outer">
+   <sequence format="r1" duration="20s" tcStart="0s">
+    <spine>
+     <gap name="GO" offset="0s" start="0s" duration="20s">
+      <marker start="1s" duration="1s" value="outer"/>
+      <ref-clip ref="r4" lane="1" name="M" offset="10s" start="2s" duration="6s"/>
+     </gap>
+    </spine>
+   </sequence>
+  </media>'''
+
+@pytest.mark.parametrize('streaming', [False, True])
+def testNestedCompoundsInTwoProjects(streaming: bool):
+    xml: str = _library(NESTED_COMPOUNDS, '''
+   <project name="P1">
+    <sequence format="r1" duration="20s" tcStart="0s">
+     <spine>
+      <ref-clip ref="r5" name="O1" offset="0s" start="0s" duration="20s"/>
+     </spine>
+    </sequence>
+   </project>
+   <project name="P2">
+    <sequence format="r1" duration="40s" tcStart="0s">
+     <spine>
+      <gap name="G" offset="0s" start="0s" duration="30s"/>
+      <ref-clip ref="r5" name="O2" offset="30s" start="11s" duration="5s"/>
+     </spine>
+    </sequence>
+   </project>''')
+    outerMiddle: tuple[str, ...] = ('Outer', 'Middle')
+    outerMiddleInner: tuple[str, ...] = ('Outer', 'Middle', 'Inner')
+    assert _items(xml, streaming) == [
+        ('P1', 'marker', 'outer', _s('1'), _s('1'), 'GO', ('Outer',)),
+        ('P1', 'marker', 'middle', _s('10'), _s('1'), 'GM', outerMiddle),
+        ('P1', 'marker', 'inner', _s('12'), _s('1'), 'TI', outerMiddleInner),
+        ('P1', 'marker', 'inner late', _s('15'), _s('1'), 'TI', outerMiddleInner),
+        ('P2', 'marker', 'inner', _s('31'), _s('1'), 'TI', outerMiddleInner),
+        ('P2', 'marker', 'inner late', _s('34'), _s('1'), 'TI', outerMiddleInner),
+    ]
+
+@pytest.mark.parametrize('streaming', [False, True])
+def testSelfReferencingCompounds(streaming: bool):
+    # A compound clip that contains itself (directly, or through another one) is only
+    # expanded once.
+    xml: str = _library('''
+  <media id="r6" name="Loop">
+   <sequence format="r1" duration="10s" tcStart="0s">
+    <spine>
+     <gap name="GL" offset="0s" start="0s" duration="10s">
+      <marker start="1s" duration="1s" value="loop"/>
+      <ref-clip ref="r6" lane="1" name="Self" offset="0s" start="0s" duration="10s"/>
+     </gap>
+    </spine>
+   </sequence>
+  </media>
+  <media id="r7" name="Ping">
+   <sequence format="r1" duration="10s" tcStart="0s">
+    <spine>
+     <gap name="GPing" offset="0s" start="0s" duration="10s">
+      <marker start="2s" duration="1s" value="ping"/>
+      <ref-clip ref="r8" lane="1" name="ToPong" offset="0s" start="0s" duration="10s"/>
+     </gap>
+    </spine>
+   </sequence>
+  </media>
+  <media id="r8" name="Pong">
+   <sequence format="r1" duration="10s" tcStart="0s">
+    <spine>
+     <gap name="GPong" offset="0s" start="0s" duration="10s">
+      <marker start="3s" duration="1s" value="pong"/>
+      <ref-clip ref="r7" lane="1" name="ToPing" offset="0s" start="0s" duration="10s"/>
+     </gap>
+    </spine>
+   </sequence>
+  </media>''', '''
+   <project name="P">
+    <sequence format="r1" duration="20s" tcStart="0s">
+     <spine>
+      <ref-clip ref="r6" name="L" offset="0s" start="0s" duration="10s"/>
+      <ref-clip ref="r7" name="PP" offset="10s" start="0s" duration="10s"/>
+     </spine>
+    </sequence>
+   </project>''')
+    assert _items(xml, streaming) == [
+        ('P', 'marker', 'loop', _s('1'), _s('1'), 'GL', ('Loop',)),
+        ('P', 'marker', 'ping', _s('12'), _s('1'), 'GPing', ('Ping',)),
+        ('P', 'marker', 'pong', _s('13'), _s('1'), 'GPong', ('Ping', 'Pong')),
+    ]
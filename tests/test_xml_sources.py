@@ -0,0 +1,189 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that XMLParser reads documents in any encoding, and from gzip
+#                files, zip archives and .fcpxmld bundles, the same way (tree and
+#                streaming).
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import gzip
+import typing as t
+import zipfile
+from pathlib import Path
+from xml.etree.ElementTree import Element
+
+import pytest
+
+from fcpxml import AssetClipsCSV, XMLParser
+
+from libraries import makeLibrary
+
+NAMES: list[str] = ['Café', 'Ünïcödé', 'plain']
+
+def _document(encoding: str | None) -> str:
+    # (no XML declaration if encoding is None)
+    declaration: str = ''
+    if encoding is not None:
+        declaration = f'<?xml version="1.0" encoding="{encoding}"?>\n'
+    clips: str = ''.join(f'<asset-clip name="{name}"/>' for name in NAMES)
+    return f'{declaration}<fcpxml><library><event>{clips}</event></library></fcpxml>'
+
+def _names(xml: str | bytes | Path, streaming: bool) -> list[str] | None:
+    # the names of the asset-clips in xml (None if parsing failed)
+    names: list[str] = []
+
+    def callback(_refcon: t.Any, el: Element) -> bool:
+        names.append(el.get('name', ''))
+        return True
+
+    parser = XMLParser(xml, streaming=streaming)
+    if not parser.isValid or not parser.parse({'.//asset-clip': (callback, None)}):
+        return None
+    return names
+
+# (declared encoding, how to encode the document)
+ENCODINGS: list[tuple[str | None, t.Callable[[str], bytes]]] = [
+    (None, lambda doc: doc.encode('utf-8')),
+    ('UTF-8', lambda doc: doc.encode('utf-8')),
+    ('UTF-8', lambda doc: doc.encode('utf-8-sig')),
+    ('UTF-16', lambda doc: doc.encode('utf-16')),
+    ('UTF-16', lambda doc: doc.encode('utf-16-le')),
+    ('UTF-16', lambda doc: doc.encode('utf-16-be')),
+    ('ISO-8859-1', lambda doc: doc.encode('latin-1')),
+    # latin-1 that doesn't say so (not valid UTF-8)
+    (None, lambda doc: doc.encode('latin-1')),
+]
+ENCODING_IDS: list[str] = [
+    'undeclared-utf-8', 'utf-8', 'utf-8-bom', 'utf-16-bom', 'utf-16-le-no-bom',
+    'utf-16-be-no-bom', 'iso-8859-1', 'undeclared-latin-1',
+]
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('encoding, encode', ENCODINGS, ids=ENCODING_IDS)
+def testEncodings(
+    tmp_path: Path,
+    streaming: bool,
+    encoding: str | None,
+    encode: t.Callable[[str], bytes]
+):
+    data: bytes = encode(_document(encoding))
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_bytes(data)
+    assert _names(data, streaming) == NAMES
+    assert _names(xmlPath, streaming) == NAMES
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('chunkSize', [32, 33, 34, 35])
+def testLatin1Retry(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    streaming: bool,
+    chunkSize: int
+):
+    # The first chunks are valid UTF-8, a later one isn't: everything from there on is
+    # read as latin-1 (whichever side of a chunk boundary the first non-UTF-8 byte is).
+    monkeypatch.setattr('fcpxml.xmlparser._XMLSource.CHUNK_SIZE', chunkSize)
+    document: str = _document(None)
+    assert document.index('é') > chunkSize
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_bytes(document.encode('latin-1'))
+    assert _names(xmlPath, streaming) == NAMES
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('chunkSize', [1, 2, 3, 64])
+def testSplitUTF8Characters(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    streaming: bool,
+    chunkSize: int
+):
+    # undeclared UTF-8 whose characters are split between chunks is still UTF-8
+    monkeypatch.setattr('fcpxml.xmlparser._XMLSource.CHUNK_SIZE', chunkSize)
+    xmlPath: Path = tmp_path / 'Info.fcpxml'
+    xmlPath.write_bytes(_document(None).replace('plain', 'plain 🎬').encode('utf-8'))
+    assert _names(xmlPath, streaming) == NAMES[:2] + ['plain 🎬']
+
+def testLatin1CSV(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # an undeclared latin-1 library, whose first non-UTF-8 byte is well past the first
+    # chunk, gives the same CSV as the UTF-8 one
+    monkeypatch.setattr('fcpxml.xmlparser._XMLSource.CHUNK_SIZE', 64)
+    library: str = makeLibrary().replace('<?xml version="1.0" encoding="UTF-8"?>\n', '')
+    assert library.index('é') > 64
+    csvs: list[bytes] = []
+    for encoding in ('utf-8', 'latin-1'):
+        xmlPath: Path = tmp_path / f'{encoding}.fcpxml'
+        xmlPath.write_bytes(library.encode(encoding))
+        csvPath: Path = tmp_path / f'{encoding}.csv'
+        assert AssetClipsCSV(xmlPath).writeCSV(csvPath)
+        csvs.append(csvPath.read_bytes())
+    assert csvs[1] == csvs[0]
+    assert 'Café Lumière'.encode('utf-8') in csvs[0]
+
+def _gzip(tmp_path: Path, data: bytes) -> Path:
+    path: Path = tmp_path / 'Library.fcpxml.gz'
+    path.write_bytes(gzip.compress(data))
+    return path
+
+def _zip(tmp_path: Path, data: bytes) -> Path:
+    # a plain .fcpxml, in a folder
+    path: Path = tmp_path / 'Library.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('Export/Library.fcpxml', data)
+    return path
+
+def _zippedBundle(tmp_path: Path, data: bytes) -> Path:
+    # a bundle's Info.fcpxml wins over other .fcpxml files (and Finder's __MACOSX files)
+    path: Path = tmp_path / 'Library.fcpxmld.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('__MACOSX/Library.fcpxmld/._Info.fcpxml', b'\x00\x05\x16\x07')
+        archive.writestr('Other.fcpxml', b'<fcpxml/>')
+        archive.writestr('Library.fcpxmld/Nested.fcpxmld/Info.fcpxml', b'<fcpxml/>')
+        archive.writestr('Library.fcpxmld/Info.fcpxml', data)
+        archive.writestr('Library.fcpxmld/Transcoded Media/', b'')
+    return path
+
+def _bundle(tmp_path: Path, data: bytes) -> Path:
+    path: Path = tmp_path / 'Library.fcpxmld'
+    path.mkdir()
+    (path / 'Info.fcpxml').write_bytes(data)
+    return path
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('container', [_gzip, _zip, _zippedBundle, _bundle])
+@pytest.mark.parametrize('encoding, encode', [ENCODINGS[1], ENCODINGS[3]], ids=['utf-8', 'utf-16'])
+def testContainers(
+    tmp_path: Path,
+    streaming: bool,
+    container: t.Callable[[Path, bytes], Path],
+    encoding: str | None,
+    encode: t.Callable[[str], bytes]
+):
+    data: bytes = encode(_document(encoding))
+    path: Path = container(tmp_path, data)
+    assert _names(path, streaming) == NAMES
+    assert _names(str(path), streaming) == NAMES
+
+def testDocumentSize(tmp_path: Path):
+    data: bytes = _document('UTF-8').encode('utf-8')
+    assert XMLParser.documentSize(_gzip(tmp_path, data)) is None
+    assert XMLParser.documentSize(_zip(tmp_path, data)) == len(data)
+    assert XMLParser.documentSize(_zippedBundle(tmp_path, data)) == len(data)
+    bundlePath: Path = _bundle(tmp_path, data)
+    assert XMLParser.documentSize(bundlePath) == len(data)
+    assert XMLParser.documentPath(bundlePath) == bundlePath / 'Info.fcpxml'
+    assert XMLParser.documentSize(tmp_path / 'missing.fcpxml') is None
+
+@pytest.mark.parametrize('streaming', [False, True])
+def testCorruptArchives(tmp_path: Path, streaming: bool):
+    data: bytes = _document('UTF-8').encode('utf-8')
+    truncatedPath: Path = tmp_path / 'truncated.fcpxml.gz'
+    truncatedPath.write_bytes(gzip.compress(data)[:-20])
+    assert _names(truncatedPath, streaming) is None
+
+    emptyPath: Path = tmp_path / 'empty.zip'
+    with zipfile.ZipFile(emptyPath, 'w') as archive:
+        archive.writestr('readme.txt', b'no fcpxml here')
+    assert _names(emptyPath, streaming) is None
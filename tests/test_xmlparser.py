@@ -0,0 +1,265 @@
+# ------------------------------------------------------------------------------
+# Purpose:       fcpxml is a utilities package for Final Cut Pro XML files (.fcpxml files)
+#                Tests that XMLParser's path matching walk (tree and streaming) calls
+#                back the same elements, in the same order, as the findall path does.
+#
+# Authors:       Greg Chapman <gregc@mac.com>
+#
+# Copyright:     (c) 2024 Greg Chapman
+# License:       MIT, see LICENSE
+# ------------------------------------------------------------------------------
+import typing as t
+from xml.etree.ElementTree import Element, fromstring, tostring
+
+import pytest
+
+from fcpxml import XMLParser
+
+# Every element has a unique id, so that calls can be compared across parses (streaming
+# parses build their own elements).  clips are nested in clips, and in gaps, so some
+# matches are inside other matches.
+XML: str = '''<library id="lib">
+  <event id="e1">
+    <clip id="c1"><clip id="c2"><note id="n1"/></clip><note id="n2"/></clip>
+    <project id="p1">
+      <sequence id="s1">
+        <spine id="sp1">
+          <clip id="c3"><clip id="c4"/><note id="n3"/></clip>
+          <gap id="g1"><clip id="c5"><clip id="c6"/></clip></gap>
+        </spine>
+      </sequence>
+    </project>
+  </event>
+  <event id="e2"><clip id="c7"/><note id="n4"/></event>
+</library>'''
+
+# (no element matches more than one key in any of these)
+KEY_SETS: list[tuple[str, ...]] = [
+    ('.//clip',),
+    ('./event/clip', './/note'),
+    ('.//clip', './/note'),
+    ('./event/project/sequence/spine/clip', 'event/*/sequence'),
+    ('.//spine//clip', './event', './/gap'),
+    ('event/*/*/*', 'clip'),
+    ('.',),
+]
+
+# (key index, id, the element as it was when called back)
+_Call = tuple[int, str, bytes]
+
+def _expectedOrder(keys: tuple[str, ...], postOrder: bool) -> list[_Call]:
+    # each key's findall, merged in document order (or in the order elements end)
+    root: Element = fromstring(XML)
+    keyIndex: dict[str, int] = {}
+    for i, key in enumerate(keys):
+        for el in root.findall(key):
+            keyIndex[el.get('id', '')] = i
+
+    elements: list[Element] = list(root.iter())
+    if postOrder:
+        elements = []
+
+        def addPostOrder(el: Element):
+            for childEl in el:
+                addPostOrder(childEl)
+            elements.append(el)
+
+        addPostOrder(root)
+    return [
+        (keyIndex[el.get('id', '')], el.get('id', ''), tostring(el))
+        for el in elements
+        if el.get('id', '') in keyIndex
+    ]
+
+def _parse(
+    parser: XMLParser,
+    keys: tuple[str, ...],
+    stopAfter: int | None = None
+) -> tuple[bool, list[_Call]]:
+    # the calls made by parser.parse (the stopAfter'th callback returns False)
+    calls: list[_Call] = []
+
+    def callback(refcon: int, el: Element) -> bool:
+        calls.append((refcon, el.get('id', ''), tostring(el)))
+        return stopAfter is None or len(calls) < stopAfter
+
+    callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+        key: (callback, i) for i, key in enumerate(keys)
+    }
+    return parser.parse(callbacks), calls
+
+def _findallKeys(keys: tuple[str, ...]) -> tuple[str, ...]:
+    # the same paths, with a predicate (that every element passes), so that the parser
+    # has to use findall
+    return tuple(key + '[@id]' if key != '.' else '.[@id]' for key in keys)
+
+@pytest.mark.parametrize('keys', KEY_SETS)
+def testFindallPathMatchesDocumentOrder(keys: tuple[str, ...]):
+    # (sanity check for the reference the other tests use)
+    success, calls = _parse(XMLParser(XML), _findallKeys(keys))
+    assert success
+    assert calls == _expectedOrder(keys, postOrder=False)
+
+@pytest.mark.parametrize('keys', KEY_SETS)
+def testTreeWalkMatchesFindall(keys: tuple[str, ...]):
+    findallSuccess, findallCalls = _parse(XMLParser(XML), _findallKeys(keys))
+    success, calls = _parse(XMLParser(XML), keys)
+    assert success and findallSuccess
+    assert calls == findallCalls
+
+@pytest.mark.parametrize('keys', KEY_SETS)
+def testStreamingMatchesFindall(keys: tuple[str, ...]):
+    # Streaming calls back each element when it ends, so a match inside another match
+    # comes first, but each element is called back complete, and with the same key.
+    _, findallCalls = _parse(XMLParser(XML), _findallKeys(keys))
+    success, calls = _parse(XMLParser(XML.encode('utf-8'), streaming=True), keys)
+    assert success
+    assert calls == _expectedOrder(keys, postOrder=True)
+    assert sorted(calls) == sorted(findallCalls)
+
+@pytest.mark.parametrize('keys', KEY_SETS)
+def testCallbackReturningFalseStops(keys: tuple[str, ...]):
+    # Parsing stops right after the callback that returns False (and that's a success).
+    numMatches: int = len(_expectedOrder(keys, postOrder=False))
+    for stopAfter in range(1, numMatches + 1):
+        success, findallCalls = _parse(XMLParser(XML), _findallKeys(keys), stopAfter)
+        assert success
+        assert findallCalls == _expectedOrder(keys, postOrder=False)[:stopAfter]
+
+        success, calls = _parse(XMLParser(XML), keys, stopAfter)
+        assert success
+        assert calls == findallCalls
+
+        success, calls = _parse(XMLParser(XML.encode('utf-8'), streaming=True), keys, stopAfter)
+        assert success
+        assert calls == _expectedOrder(keys, postOrder=True)[:stopAfter]
+
+def testStreamingKeepsMatchesInsideMatches():
+    # Matches inside a matched element (called back or not) are still in it when it is
+    # called back.
+    calls: dict[str, list[str]] = {}
+
+    def callback(_refcon: t.Any, el: Element) -> bool:
+        calls[el.get('id', '')] = [childEl.get('id', '') for childEl in el.iter()][1:]
+        return True
+
+    parser = XMLParser(XML.encode('utf-8'), streaming=True)
+    assert parser.parse({'.//clip': (callback, None), './event': (callback, None)})
+    assert calls['c1'] == ['c2', 'n1', 'n2']
+    assert calls['c5'] == ['c6']
+    assert calls['e1'] == ['c1', 'c2', 'n1', 'n2', 'p1', 's1', 'sp1', 'c3', 'c4', 'n3',
+        'g1', 'c5', 'c6']
+
+def testStreamingRejectsComplexPaths():
+    parser = XMLParser(XML.encode('utf-8'), streaming=True)
+    assert not parser.parse({'.//clip[@id]': (lambda _refcon, _el: True, None)})
+
+# filters: (filter key, {id: verdict} (DESCEND for any other element it matches))
+FILTER_CASES: list[tuple[str, dict[str, int]]] = [
+    ('./event', {'e1': XMLParser.SKIP}),
+    ('./event', {'e1': XMLParser.STOP}),
+    ('./event', {'e2': XMLParser.STOP}),
+    ('.//sequence', {'s1': XMLParser.SKIP}),
+    # a filter on elements that are also called back
+    ('.//clip', {'c1': XMLParser.SKIP, 'c5': XMLParser.SKIP}),
+    ('.//clip', {'c4': XMLParser.STOP}),
+    ('.//clip', {}),
+    # the root
+    ('.', {'lib': XMLParser.SKIP}),
+    ('.', {'lib': XMLParser.STOP}),
+    ('.', {}),
+]
+FILTER_KEYS: tuple[str, ...] = ('.//clip', './/note')
+
+def _expectedFiltered(
+    keys: tuple[str, ...],
+    filterKey: str,
+    verdicts: dict[str, int],
+    postOrder: bool
+) -> tuple[list[_Call], list[str]]:
+    # the calls _expectedOrder would make, minus the ones in skipped subtrees, and the
+    # ones that come after (that don't end before, when streaming) a STOP; and the
+    # filter calls, in document order
+    root: Element = fromstring(XML)
+    filtered: set[str] = {el.get('id', '') for el in root.findall(filterKey)}
+    if filterKey == '.':
+        filtered = {root.get('id', '')}
+    excluded: set[str] = set()
+    filterCalls: list[str] = []
+    preOrder: list[Element] = list(root.iter())
+    for i, el in enumerate(preOrder):
+        id: str = el.get('id', '')
+        if id in excluded:
+            continue
+        if id in filtered:
+            filterCalls.append(id)
+        verdict: int = verdicts.get(id, XMLParser.DESCEND)
+        if verdict == XMLParser.SKIP:
+            excluded.update(childEl.get('id', '') for childEl in el.iter())
+        elif verdict == XMLParser.STOP:
+            excluded.update(otherEl.get('id', '') for otherEl in preOrder[i:])
+            if postOrder:
+                # (the elements still open haven't been called back yet)
+                excluded.update(
+                    otherEl.get('id', '') for otherEl in preOrder[:i] if el in otherEl.iter()
+                )
+            break
+    calls: list[_Call] = [
+        call for call in _expectedOrder(keys, postOrder) if call[1] not in excluded
+    ]
+    return calls, filterCalls
+
+def _parseFiltered(
+    parser: XMLParser,
+    keys: tuple[str, ...],
+    filterKey: str,
+    verdicts: dict[str, int]
+) -> tuple[bool, list[_Call], list[str]]:
+    # the calls made by parser.parse, and the ids of the elements the filter was called
+    # for
+    calls: list[_Call] = []
+    filterCalls: list[str] = []
+
+    def callback(refcon: int, el: Element) -> bool:
+        calls.append((refcon, el.get('id', ''), tostring(el)))
+        return True
+
+    def filterCallback(_refcon: t.Any, el: Element) -> int:
+        filterCalls.append(el.get('id', ''))
+        return verdicts.get(el.get('id', ''), XMLParser.DESCEND)
+
+    callbacks: dict[str, tuple[t.Callable[[t.Any, Element], bool], t.Any]] = {
+        key: (callback, i) for i, key in enumerate(keys)
+    }
+    success: bool = parser.parse(callbacks, filters={filterKey: (filterCallback, None)})
+    return success, calls, filterCalls
+
+@pytest.mark.parametrize('filterKey, verdicts', FILTER_CASES)
+def testFilters(filterKey: str, verdicts: dict[str, int]):
+    # SKIP leaves out an element's whole subtree (including the element itself, if a
+    # callback matches it), STOP ends the parse (successfully) as soon as the element
+    # starts, and the tree walk, findall and streaming parses all agree on it
+    keys: tuple[str, ...] = FILTER_KEYS
+    expectedCalls, expectedFilterCalls = _expectedFiltered(
+        keys, filterKey, verdicts, postOrder=False
+    )
+
+    success, calls, filterCalls = _parseFiltered(XMLParser(XML), keys, filterKey, verdicts)
+    assert success
+    assert calls == expectedCalls
+    assert filterCalls == expectedFilterCalls
+
+    success, calls, filterCalls = _parseFiltered(
+        XMLParser(XML), _findallKeys(keys), filterKey, verdicts
+    )
+    assert success
+    assert calls == expectedCalls
+    assert filterCalls == expectedFilterCalls
+
+    expectedCalls, _ = _expectedFiltered(keys, filterKey, verdicts, postOrder=True)
+    success, calls, filterCalls = _parseFiltered(
+        XMLParser(XML.encode('utf-8'), streaming=True), keys, filterKey, verdicts
+    )
+    assert success
+    assert calls == expectedCalls
+    assert filterCalls == expectedFilterCalls